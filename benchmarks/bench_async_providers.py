@@ -0,0 +1,83 @@
+"""
+Compares serial sync calls with concurrent async calls through one pooled
+OpenAIProvider against the local stub server.
+
+    python benchmarks/bench_async_providers.py --requests 8 --token-delay 0.01
+
+Reports wall time and how many TCP connections the server saw. Non-streaming
+calls reuse pooled keep-alive connections; the openai SDK stops reading a
+stream at [DONE], so over plain HTTP/1.1 (the stub) each stream still ends
+its connection. Against api.openai.com the pooled clients negotiate HTTP/2
+when 'h2' is installed, and streams then share one connection.
+"""
+import argparse
+import asyncio
+import time
+
+from stub_server import StubServer
+from ultra.providers import OpenAIProvider
+
+MESSAGES = [{"role": "user", "content": "Say something."}]
+
+
+def run_serial(provider: OpenAIProvider, count: int):
+    for _ in range(count):
+        "".join(provider.stream_completion("stub-model", MESSAGES))
+
+
+def run_serial_completions(provider: OpenAIProvider, count: int):
+    for _ in range(count):
+        provider.get_completion("stub-model", "Summarize.")
+
+
+async def run_concurrent(provider: OpenAIProvider, count: int):
+    async def one():
+        return "".join([token async for token in provider.astream_completion("stub-model", MESSAGES)])
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    # Compaction-style and formatting-style calls overlap with streaming too
+    await asyncio.gather(
+        provider.aget_completion("stub-model", "Summarize."),
+        provider.asend_non_streaming_request(MESSAGES),
+        one(),
+    )
+    await provider.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async provider benchmark")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--max-connections", type=int, default=20)
+    args = parser.parse_args()
+
+    with StubServer(token_delay=args.token_delay) as server:
+        provider = OpenAIProvider("stub-key", base_url=server.base_url,
+                                  max_connections=args.max_connections)
+
+        start = time.perf_counter()
+        run_serial(provider, args.requests)
+        serial = time.perf_counter() - start
+        serial_connections = server.connections
+
+        start = time.perf_counter()
+        run_serial_completions(provider, args.requests)
+        completions = time.perf_counter() - start
+        completion_connections = server.connections - serial_connections
+
+        start = time.perf_counter()
+        asyncio.run(run_concurrent(provider, args.requests))
+        concurrent = time.perf_counter() - start
+        concurrent_connections = server.connections - serial_connections - completion_connections
+        provider.close()
+
+        print(f"serial sync streams        {args.requests:3d} calls  {serial:6.2f} s  "
+              f"{serial_connections} connection(s)")
+        print(f"serial sync completions    {args.requests:3d} calls  {completions:6.2f} s  "
+              f"{completion_connections} connection(s)")
+        print(f"concurrent async mixed     {args.requests + 3:3d} calls  {concurrent:6.2f} s  "
+              f"{concurrent_connections} connection(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Formats a long synthetic transcript through transcript_format against the
+local stub server, comparing one whole-transcript request with chunked
+requests at several concurrency levels.
+
+    python benchmarks/bench_chunked_format.py --minutes 60 --token-delay 0.002 --concurrency 1 4 8
+
+The stub "formats" a chunk by echoing it behind a speaker label and takes
+token_delay seconds per word, like a model generating the reply. Each run
+checks that the merged text has every sentence exactly once, in order, and
+that the repeated speaker labels were dropped. A final run makes the first
+--failures requests fail with 429 to check that the chunks are retried.
+"""
+import time
+import argparse
+
+from stub_server import StubServer
+from bench_transcript_format import build_transcript
+from ultra.providers import OpenAIProvider
+from ultra.text_templates import TRANSCRIPT_CONTEXT_HEADER, TRANSCRIPT_CONTINUE_HEADER
+from ultra.transcript_format import format_transcript
+
+LABEL = "Speaker 1: "
+
+
+def echo_chunk(request: dict) -> str:
+    """Replies with the chunk's transcript parts (not its context or the prompt) behind a label."""
+    parts = [part["text"] for part in request["messages"][-1]["content"][:-1]]
+    parts = [part for part in parts if not part.startswith(TRANSCRIPT_CONTEXT_HEADER)
+             and part != TRANSCRIPT_CONTINUE_HEADER]
+    return LABEL + "".join(parts)
+
+
+def check(transcript: str, merged: str):
+    expected = LABEL + transcript
+    if merged != expected:
+        for index, (want, got) in enumerate(zip(expected.splitlines(), merged.splitlines())):
+            if want != got:
+                raise AssertionError(f"line {index}: expected {want!r}, got {got!r}")
+        raise AssertionError("merged transcript has the wrong number of lines")
+
+
+def run(server, transcript: str, provider_settings: dict = None, **settings) -> float:
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **(provider_settings or {}))
+    start = time.perf_counter()
+    merged = format_transcript(provider, transcript, **settings)
+    elapsed = time.perf_counter() - start
+    provider.close()
+    check(transcript, merged)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Stub seconds per generated word")
+    parser.add_argument("--chunk-tokens", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--failures", type=int, default=12,
+                        help="Failed requests to inject (the provider retries each one; with Retry-After: 0 "
+                             "one chunk can meet several in a row)")
+    args = parser.parse_args()
+
+    transcript = build_transcript(args.minutes)
+    words = len(transcript.split())
+    print(f"Transcript: {args.minutes:.0f} min, {words} words, {len(transcript.splitlines())} sentences\n")
+    print(f"{'mode':>22} {'requests':>9} {'wall s':>8}")
+
+    with StubServer(reply=echo_chunk, token_delay=args.token_delay) as server:
+        requests = server.requests
+        elapsed = run(server, transcript, chunk_tokens=10 ** 9, concurrency=1)
+        print(f"{'single request':>22} {server.requests - requests:9d} {elapsed:8.2f}")
+
+        for concurrency in args.concurrency:
+            requests = server.requests
+            elapsed = run(server, transcript, chunk_tokens=args.chunk_tokens, concurrency=concurrency)
+            print(f"{f'chunked, {concurrency} at once':>22} {server.requests - requests:9d} {elapsed:8.2f}")
+
+        server.fail_requests = args.failures
+        server.retry_after = 0
+        requests = server.requests
+        elapsed = run(server, transcript, chunk_tokens=args.chunk_tokens, concurrency=max(args.concurrency),
+                      provider_settings={"backoff_seconds": 0.05, "max_retries": args.failures})
+        print(f"{f'with {server.failed} failures':>22} {server.requests - requests:9d} {elapsed:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Measures how long the Live Context Window takes to apply context updates,
+headless on Qt's offscreen platform.
+
+    python benchmarks/bench_context_window.py --sizes 100 1000 5000
+
+For each context size the window is loaded with that many messages, then
+timed while it applies an append, an in-place edit of one message in the
+middle, and a snapshot that differs in one message. "rebuild" is the old
+clear-and-rebuild QTextEdit rendering; "incremental" is ContextWindow.
+A final row loads a multi-MB context made of a few large messages.
+
+Before timing, check_edits() types into the window the way a user would and
+checks which message each edit is read back into, and that terminal updates
+never overwrite unsaved edits.
+"""
+import os
+import argparse
+import statistics
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+from ultra.context_window import ContextWindow
+
+
+class FakeChannel(QtCore.QObject):
+    """Stands in for ContextChannel: events are emitted directly, sends are kept in sent."""
+    received = QtCore.pyqtSignal(object)
+    disconnected = QtCore.pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def start(self):
+        pass
+
+    def send(self, event):
+        self.sent.append(event)
+
+
+def make_messages(count: int, content_chars: int = 400):
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": f"Message {i}. " + "lorem ipsum " * (content_chars // 12)}
+            for i in range(count)]
+
+
+def legacy_render(widget: QtWidgets.QTextEdit, messages):
+    """The previous update_text: clear and rebuild with new formats per message."""
+    widget.clear()
+    cursor = widget.textCursor()
+    for msg in messages:
+        role_format = QtGui.QTextCharFormat()
+        role_format.setFontWeight(QtGui.QFont.Weight.Bold)
+        cursor.insertText(msg["role"].upper() + ": ", role_format)
+        content_format = QtGui.QTextCharFormat()
+        content_format.setFontWeight(QtGui.QFont.Weight.Normal)
+        cursor.insertText(msg["content"] + "\n\n", content_format)
+    widget.setTextCursor(cursor)
+
+
+def check_edits(app):
+    """
+    Edits at message boundaries must land in the message that starts there,
+    and terminal updates to edited messages wait for the user to save.
+    """
+    # Message boxes would block offscreen; answer them instead
+    boxes = []
+    QtWidgets.QMessageBox.warning = lambda parent, title, text: boxes.append(title)
+    QtWidgets.QMessageBox.information = lambda parent, title, text: boxes.append(title)
+    QtWidgets.QMessageBox.question = lambda parent, title, text: \
+        boxes.append(title) or QtWidgets.QMessageBox.StandardButton.Yes
+
+    channel = FakeChannel()
+    window = ContextWindow(channel)
+    channel.received.emit({"op": "snapshot", "seq": 1, "messages": [
+        {"role": "system", "content": "sys"}, {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"}]})
+
+    def type_at(position, text):
+        cursor = window.text_widget.textCursor()
+        cursor.setPosition(position)
+        cursor.insertText(text)
+        app.processEvents()
+
+    # In front of the "USER: " header
+    type_at(window.blocks[1].position(), "Z")
+    assert window.parse_message(0)["content"] == "sys", window.parse_message(0)
+    assert window._region_text(1, 2) == "ZUSER: hi\n\n", window._region_text(1, 2)
+    assert window.dirty == {1}, window.dirty
+
+    # A terminal update in front of an anchor must not take the anchor's place
+    channel.received.emit({"op": "replace", "seq": 2, "start": 0, "end": 1,
+                           "messages": [{"role": "system", "content": "new system prompt"}]})
+    assert window.parse_message(0)["content"] == "new system prompt", window.parse_message(0)
+    assert window.parse_message(2)["content"] == "hello", window.parse_message(2)
+
+    # A compaction over the edited message is held, and so is everything after it
+    type_at(window.blocks[2].position() + len("ASSISTANT: hello"), " there")
+    channel.received.emit({"op": "replace", "seq": 3, "start": 1, "end": 2,
+                           "messages": [{"role": "user", "content": "summary"}]})
+    channel.received.emit({"op": "append", "seq": 4, "message": {"role": "user", "content": "next"}})
+    assert window._region_text(1, 2) == "ZUSER: hi\n\n", window._region_text(1, 2)
+    assert len(window.held) == 2 and window.dirty == {1, 2}, (window.held, window.dirty)
+    assert boxes == ["Unsaved Edits"], boxes
+
+    # Saving drops the clashing edit, catches up, then sends the other edit against the new base
+    window.save_changes()
+    assert [msg["content"] for msg in window.context_data] == ["new system prompt", "summary", "hello", "next"]
+    assert window._region_text(1, 2) == "USER: summary\n\n", window._region_text(1, 2)
+    assert not window.held and window.last_seq == 4
+    assert channel.sent == [{"op": "update", "base": 4, "changes": [
+        {"start": 2, "end": 3, "messages": [{"role": "assistant", "content": "hello there"}]}]}], channel.sent
+
+    # The saved edit coming back is not held
+    channel.received.emit({"op": "replace", "seq": 5, "start": 2, "end": 3,
+                           "messages": [{"role": "assistant", "content": "hello there"}]})
+    assert not window.held and not window.dirty and window.last_seq == 5, (window.held, window.dirty)
+    window.close()
+    print("edit checks passed")
+
+
+def timed(app, fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        app.processEvents()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_legacy(app, messages, repeat):
+    widget = QtWidgets.QTextEdit()
+    widget.resize(800, 600)
+    widget.show()
+    current = list(messages)
+    load = timed(app, lambda: legacy_render(widget, current), 1)
+
+    def append():
+        current.append({"role": "user", "content": "One more message."})
+        legacy_render(widget, current)
+
+    def edit():
+        current[len(current) // 2] = {"role": "user", "content": f"Edited at {time.perf_counter()}"}
+        legacy_render(widget, current)
+
+    result = (load, timed(app, append, repeat), timed(app, edit, repeat), timed(app, edit, repeat))
+    widget.close()
+    return result
+
+
+def bench_incremental(app, messages, repeat):
+    channel = FakeChannel()
+    window = ContextWindow(channel)
+    seq = iter(range(1, 10 ** 9))
+    load = timed(app, lambda: channel.received.emit(
+        {"op": "snapshot", "seq": next(seq), "messages": list(messages)}), 1)
+
+    def append():
+        channel.received.emit({"op": "append", "seq": next(seq),
+                               "message": {"role": "user", "content": "One more message."}})
+
+    def edit():
+        middle = len(window.context_data) // 2
+        channel.received.emit({"op": "replace", "seq": next(seq), "start": middle, "end": middle + 1,
+                               "messages": [{"role": "user", "content": f"Edited at {time.perf_counter()}"}]})
+
+    def snapshot():
+        changed = list(window.context_data)
+        changed[len(changed) // 2] = {"role": "user", "content": f"Edited at {time.perf_counter()}"}
+        channel.received.emit({"op": "snapshot", "seq": next(seq), "messages": changed})
+
+    result = (load, timed(app, append, repeat), timed(app, edit, repeat), timed(app, snapshot, repeat))
+    window.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--large-mb", type=float, default=4.0, help="Size of the multi-MB context")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    check_edits(app)
+    cases = [(f"{size} msgs", make_messages(size)) for size in args.sizes]
+    large_chars = int(args.large_mb * 1024 * 1024 / 20)
+    cases.append((f"{args.large_mb:g} MB", make_messages(20, large_chars)))
+
+    print(f"{'context':>10} {'renderer':>12} {'load ms':>9} {'append ms':>10} {'edit ms':>9} {'snapshot ms':>12}")
+    for label, messages in cases:
+        for name, bench in (("rebuild", bench_legacy), ("incremental", bench_incremental)):
+            load, append, edit, snapshot = bench(app, messages, args.repeat)
+            print(f"{label:>10} {name:>12} {load:9.1f} {append:10.2f} {edit:9.2f} {snapshot:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Fans one conversation out to several models on the local stub server and
+compares the wall time with streaming the same models one after another.
+
+    python benchmarks/bench_fanout.py --models 4 --token-ms 10
+
+Expected: the fan-out takes about as long as the slowest model, not the sum
+of all of them, and every model's answer, TTFT and token count is reported.
+The run is also rendered through run_fanout() in both layouts, to an
+in-memory console, to check the display path.
+"""
+import io
+import time
+import asyncio
+import argparse
+
+from rich.console import Console
+from stub_server import StubServer
+from ultra.providers import OpenAIProvider
+from ultra.fanout import fanout, run_fanout, print_fanout_summary
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def reply_for(request: dict) -> str:
+    return f"This is {request['model']} answering. " * 10
+
+
+async def sequential(provider, models: list) -> float:
+    start = time.perf_counter()
+    for model in models:
+        async for _ in provider.astream_completion(model, MESSAGES):
+            pass
+    return time.perf_counter() - start
+
+
+async def concurrent(provider, models: list):
+    start = time.perf_counter()
+    results = await fanout(provider, models, MESSAGES)
+    return time.perf_counter() - start, results
+
+
+async def render(provider, models: list, layout: str) -> str:
+    console = Console(file=io.StringIO(), width=160, height=40, force_terminal=False)
+    await run_fanout(provider, models, MESSAGES, console, layout)
+    return console.file.getvalue()
+
+
+async def run(args):
+    models = [f"stub-model-{i}" for i in range(args.models)]
+    with StubServer(reply=reply_for, first_token_delay=args.first_token_ms / 1000,
+                    token_delay=args.token_ms / 1000) as server:
+        provider = OpenAIProvider("stub-key", base_url=server.base_url)
+        one_by_one = await sequential(provider, models)
+        elapsed, results = await concurrent(provider, models)
+        print_fanout_summary(results, Console())
+        print(f"sequential {one_by_one:.2f}s, fan-out {elapsed:.2f}s ({one_by_one / elapsed:.1f}x)")
+
+        for result in results:
+            assert result.error is None and result.text == reply_for({"model": result.model}), result.model
+            assert result.ttft is not None and result.tokens > 0, result.model
+        assert elapsed < one_by_one / args.models * 2, "fan-out should take about as long as one model"
+
+        for layout in ("columns", "sequential"):
+            output = await render(provider, models, layout)
+            assert all(model in output for model in models), f"{layout}: a model is missing from the output"
+        await provider.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--first-token-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
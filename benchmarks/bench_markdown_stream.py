@@ -0,0 +1,126 @@
+"""
+Replays a token stream through the old and new chat renderers and reports
+per-token render latency.
+
+    python benchmarks/bench_markdown_stream.py
+    python benchmarks/bench_markdown_stream.py --stream recorded.json
+    python benchmarks/bench_markdown_stream.py --record gpt-4o-mini --stream recorded.json
+
+A recorded stream is a JSON list of the chunks yielded by
+``stream_completion``. Without ``--stream`` a deterministic ~20k-token
+markdown reply (paragraphs, lists, headings and code blocks) is synthesized.
+"""
+import argparse
+import io
+import json
+import random
+import re
+import statistics
+import time
+
+from rich.console import Console
+from rich.markdown import Markdown
+
+from ultra.markdown_stream import StreamingMarkdown
+
+
+def synthesize_stream(tokens: int = 20000, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    words = ("stream render token buffer markdown block parse latency context "
+             "model reply cache frozen paragraph terminal python code").split()
+    parts = []
+    while sum(len(p) for p in parts) < tokens * 4:
+        kind = rng.random()
+        if kind < 0.15:
+            parts.append(f"## {' '.join(rng.choices(words, k=4)).title()}\n\n")
+        elif kind < 0.45:
+            body = "\n".join(
+                f"    {rng.choice(words)}_{i} = {rng.randint(0, 999)}  # {' '.join(rng.choices(words, k=5))}"
+                for i in range(rng.randint(5, 40))
+            )
+            parts.append(f"```python\ndef {rng.choice(words)}():\n{body}\n```\n\n")
+        elif kind < 0.6:
+            items = "\n".join(f"- {' '.join(rng.choices(words, k=8))}" for _ in range(rng.randint(2, 8)))
+            parts.append(items + "\n\n")
+        else:
+            parts.append(" ".join(rng.choices(words, k=rng.randint(30, 120))) + ".\n\n")
+    # Split into ~4 character chunks the way the API streams them
+    return re.findall(r"\s*\S{1,4}|\s+", "".join(parts))
+
+
+def record_stream(model: str, path: str):
+    from ultra.config import get_api_key
+    from ultra.providers import OpenAIProvider
+
+    provider = OpenAIProvider(get_api_key("openai"))
+    prompt = ("Write a long, detailed technical guide in markdown with many headings, "
+              "bullet lists and large python code blocks.")
+    chunks = list(provider.stream_completion(model, [{"role": "user", "content": prompt}]))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    return chunks
+
+
+def replay_legacy(chunks: list, console: Console) -> list:
+    """The pre-incremental chat loop: re-split and re-parse everything per token."""
+    timings = []
+    full_response = ""
+    for token in chunks:
+        start = time.perf_counter()
+        full_response += "".join(token)
+        display_text = "\n".join(full_response.splitlines()[-100:])
+        Markdown(display_text)
+        timings.append(time.perf_counter() - start)
+    console.print(Markdown("\n".join(full_response.splitlines()[-100:])))
+    return timings
+
+
+def replay_incremental(chunks: list, console: Console, parse_tail_every_token: bool) -> list:
+    timings = []
+    stream = StreamingMarkdown(console)
+    for token in chunks:
+        start = time.perf_counter()
+        stream.feed(token)
+        if parse_tail_every_token:
+            # Worst case: as if Live refreshed after every single token
+            stream._view.markdown()
+        timings.append(time.perf_counter() - start)
+    stream.finish()
+    return timings
+
+
+def report(name: str, timings: list):
+    ordered = sorted(timings)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{name:<38} mean {statistics.mean(timings) * 1e6:9.1f} us   "
+          f"p50 {statistics.median(timings) * 1e6:9.1f} us   "
+          f"p99 {p99 * 1e6:9.1f} us   max {ordered[-1] * 1e3:8.2f} ms   "
+          f"total {sum(timings):7.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stream", help="JSON list of recorded chunks")
+    parser.add_argument("--record", metavar="MODEL", help="Record a fresh stream from MODEL into --stream")
+    parser.add_argument("--tokens", type=int, default=20000, help="Size of the synthesized stream")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.stream:
+            parser.error("--record needs --stream to know where to save")
+        chunks = record_stream(args.record, args.stream)
+    elif args.stream:
+        with open(args.stream, encoding="utf-8") as f:
+            chunks = json.load(f)
+    else:
+        chunks = synthesize_stream(args.tokens)
+
+    print(f"Replaying {len(chunks)} chunks ({sum(len(c) for c in chunks)} chars)\n")
+    console = Console(file=io.StringIO(), width=100)
+    report("before (re-parse last 100 lines)", replay_legacy(chunks, console))
+    report("after (incremental, live refresh)", replay_incremental(chunks, console, False))
+    report("after (tail parsed every token)", replay_incremental(chunks, console, True))
+
+
+if __name__ == "__main__":
+    main()
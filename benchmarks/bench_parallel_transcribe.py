@@ -0,0 +1,82 @@
+"""
+Reports the real-time factor (transcription time / audio length) of serial
+Whisper transcription against parallel chunked transcription at several
+worker counts.
+
+    python benchmarks/bench_parallel_transcribe.py --audio sample.mp3 --minutes 20 --workers 1 2 4 8
+
+The clip given with --audio is repeated to --minutes, so a short speech sample
+stands in for a long podcast. Without --audio a clip of noise bursts and
+pauses is synthesized; Whisper's output on it is meaningless, but the timing
+still shows how the work spreads across cores. Needs openai-whisper and ffmpeg.
+"""
+import os
+import time
+import wave
+import argparse
+import tempfile
+
+import numpy as np
+import whisper
+
+from ultra.parallel_transcribe import SAMPLE_RATE, default_workers, transcribe_parallel
+
+
+def build_clip(audio_path: str, minutes: float, out_path: str) -> float:
+    """Writes a mono 16 kHz WAV of the requested length and returns its length in seconds."""
+    target = int(minutes * 60 * SAMPLE_RATE)
+    if audio_path:
+        sample = whisper.load_audio(audio_path)
+        pause = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        sample = np.concatenate([sample, pause])
+        audio = np.tile(sample, target // len(sample) + 1)[:target]
+    else:
+        rng = np.random.default_rng(0)
+        burst, pause = 6 * SAMPLE_RATE, SAMPLE_RATE
+        pattern = np.concatenate([rng.normal(0, 0.2, burst), np.zeros(pause)]).astype(np.float32)
+        audio = np.tile(pattern, target // len(pattern) + 1)[:target]
+
+    with wave.open(out_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    return len(audio) / SAMPLE_RATE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", help="Speech sample to repeat (any format ffmpeg reads)")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the benchmark clip")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, default_workers()}))
+    parser.add_argument("--skip-serial", action="store_true", help="Skip the single-process baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "clip.wav")
+        duration = build_clip(args.audio, args.minutes, clip)
+        print(f"Clip: {duration / 60:.1f} min, model {args.model}, {default_workers()} cores\n")
+        print(f"{'mode':>12} {'wall s':>9} {'RTF':>7} {'speedup':>8}")
+
+        baseline = None
+        if not args.skip_serial:
+            model = whisper.load_model(args.model, "cpu")
+            start = time.perf_counter()
+            model.transcribe(clip, fp16=False, verbose=None)
+            baseline = time.perf_counter() - start
+            print(f"{'serial':>12} {baseline:9.1f} {baseline / duration:7.3f} {1.0:8.2f}")
+            del model
+
+        for workers in args.workers:
+            # Includes starting the pool and loading the model in each worker
+            start = time.perf_counter()
+            transcribe_parallel(clip, workers, args.model, "cpu", fp16=False)
+            elapsed = time.perf_counter() - start
+            speedup = f"{baseline / elapsed:8.2f}" if baseline else f"{'-':>8}"
+            print(f"{f'{workers} workers':>12} {elapsed:9.1f} {elapsed / duration:7.3f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
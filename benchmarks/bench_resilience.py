@@ -0,0 +1,191 @@
+"""
+Fault injection against the local stub server, checking the provider's
+timeouts, retries and shared rate limiter (see ultra/resilience.py).
+
+    python benchmarks/bench_resilience.py
+
+Each scenario sets the stub up to fail in one way, runs a request through
+OpenAIProvider and checks how many requests were sent, how long it took and
+what the caller saw. Exits with status 1 if any scenario fails.
+"""
+import sys
+import time
+import threading
+
+from stub_server import StubServer
+from ultra.providers import OpenAIProvider
+from ultra.resilience import StreamTimeout
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+# Short timeouts and backoff so the whole run takes a few seconds
+SETTINGS = {"first_token_timeout": 1.0, "token_timeout": 0.5, "backoff_seconds": 0.05, "max_retries": 3}
+
+
+def stream(provider) -> str:
+    return "".join(provider.stream_completion("stub-model", MESSAGES))
+
+
+SCENARIOS = []
+
+
+def scenario(name):
+    def register(function):
+        SCENARIOS.append((name, function))
+        return function
+    return register
+
+
+@scenario("429 with Retry-After is retried after the requested wait")
+def rate_limited(server):
+    server.fail_requests, server.retry_after = 2, 0.5
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    start = time.perf_counter()
+    reply = stream(provider)
+    elapsed = time.perf_counter() - start
+    assert reply and server.requests == 3, f"{server.requests} requests"
+    assert elapsed >= 1.0, f"retried after {elapsed:.2f}s, before Retry-After"
+
+
+@scenario("a Retry-After longer than max_backoff_seconds is not waited out")
+def retry_after_too_long(server):
+    server.fail_requests, server.retry_after = 1, 600
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    try:
+        stream(provider)
+    except Exception as e:
+        assert getattr(e, "status_code", None) == 429, repr(e)
+    else:
+        raise AssertionError("expected the 429 to be raised")
+    assert server.requests == 1
+
+
+@scenario("503s are retried with backoff")
+def server_errors(server):
+    server.fail_requests, server.fail_status = 2, 503
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    assert stream(provider) and server.requests == 3, f"{server.requests} requests"
+
+
+@scenario("retries stop after max_retries")
+def retries_exhausted(server):
+    server.fail_requests, server.fail_status = 100, 503
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    try:
+        stream(provider)
+    except Exception as e:
+        assert getattr(e, "status_code", None) == 503, repr(e)
+    else:
+        raise AssertionError("expected the 503 to be raised")
+    assert server.requests == SETTINGS["max_retries"] + 1, f"{server.requests} requests"
+
+
+@scenario("400 is not retried")
+def bad_request(server):
+    server.fail_requests, server.fail_status = 1, 400
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    try:
+        stream(provider)
+    except Exception:
+        pass
+    assert server.requests == 1, f"{server.requests} requests"
+
+
+@scenario("a stream with no first token times out and is retried")
+def first_token_stall(server):
+    server.stall_requests, server.stall_after = 1, 0
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    start = time.perf_counter()
+    reply = stream(provider)
+    elapsed = time.perf_counter() - start
+    assert reply and server.requests == 2, f"{server.requests} requests"
+    assert elapsed < SETTINGS["first_token_timeout"] + 1.0, f"took {elapsed:.2f}s"
+
+
+@scenario("a stream stalling mid-reply raises StreamTimeout with the partial reply kept")
+def mid_stream_stall(server):
+    server.stall_requests, server.stall_after = 1, 5
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, **SETTINGS)
+    tokens = []
+    start = time.perf_counter()
+    try:
+        for token in provider.stream_completion("stub-model", MESSAGES):
+            tokens.append(token)
+    except StreamTimeout:
+        pass
+    else:
+        raise AssertionError("expected StreamTimeout")
+    elapsed = time.perf_counter() - start
+    assert len(tokens) == 5 and server.requests == 1, f"{len(tokens)} tokens, {server.requests} requests"
+    assert elapsed < SETTINGS["token_timeout"] + 1.0, f"took {elapsed:.2f}s"
+
+
+@scenario("a stalled non-streaming request times out")
+def request_timeout(server):
+    server.first_token_delay = 2.0
+    provider = OpenAIProvider("stub-key", base_url=server.base_url, request_timeout=0.5,
+                              **dict(SETTINGS, max_retries=0))
+    start = time.perf_counter()
+    try:
+        provider.send_non_streaming_request(MESSAGES)
+    except Exception as e:
+        assert "Timeout" in type(e).__name__, repr(e)
+    else:
+        raise AssertionError("expected a timeout")
+    assert time.perf_counter() - start < 1.5
+
+
+@scenario("providers for the same endpoint share one rate limit")
+def shared_rate_limit(server):
+    settings = dict(SETTINGS, requests_per_minute=600)  # 10 per second, bursts of 10
+    chat = OpenAIProvider("stub-key", base_url=server.base_url, **settings)
+    compaction = OpenAIProvider("stub-key", base_url=server.base_url, **settings)
+    assert chat.rate_limiter is compaction.rate_limiter
+    start = time.perf_counter()
+    threads = [threading.Thread(target=provider.send_non_streaming_request, args=(MESSAGES,))
+               for provider in (chat, compaction) for _ in range(15)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # 30 requests: 10 at once, then 20 more at 10 per second
+    assert server.requests == 30 and elapsed >= 1.8, f"{server.requests} requests in {elapsed:.2f}s"
+
+
+@scenario("a 429 with Retry-After holds every caller of the endpoint")
+def shared_pause(server):
+    settings = dict(SETTINGS, requests_per_minute=6000)
+    first = OpenAIProvider("stub-key", base_url=server.base_url, **settings)
+    second = OpenAIProvider("stub-key", base_url=server.base_url, **settings)
+    server.fail_requests, server.retry_after = 1, 1.0
+    thread = threading.Thread(target=first.send_non_streaming_request, args=(MESSAGES,))
+    thread.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    second.send_non_streaming_request(MESSAGES)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    assert elapsed >= 0.6, f"second caller went ahead after {elapsed:.2f}s"
+
+
+def main():
+    failed = 0
+    for name, function in SCENARIOS:
+        # A fresh server per scenario, so request counts and injected faults don't leak.
+        # The rate limiter is keyed by endpoint, so each scenario gets its own too.
+        with StubServer() as server:
+            start = time.perf_counter()
+            try:
+                function(server)
+            except Exception as e:
+                failed += 1
+                print(f"FAIL {name}: {type(e).__name__}: {e}")
+                continue
+            print(f"ok   {name} ({time.perf_counter() - start:.2f}s)")
+    print(f"\n{len(SCENARIOS) - failed}/{len(SCENARIOS)} scenarios passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
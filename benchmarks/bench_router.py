@@ -0,0 +1,98 @@
+"""
+Routes streamed chat requests across two local stub servers with different
+first-token latencies, then stops the fast one mid-session to check failover.
+
+    python benchmarks/bench_router.py --requests 40 --fast-ms 20 --slow-ms 150
+
+Expected: after each backend is measured once, nearly all traffic goes to the
+fast server. Once it is stopped, requests fail over to the slow server
+without an error reaching the caller while the fast one is in cooldown.
+When it is restarted traffic moves back, and a final phase makes it answer
+503 to check that server errors move traffic as well.
+"""
+import time
+import argparse
+import statistics
+
+from stub_server import StubServer
+from ultra.providers import LocalProvider
+from ultra.router import Backend, RoutingProvider
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def run(router: RoutingProvider, requests: int) -> dict:
+    """Sends requests streamed chats; returns backend name -> count and the TTFTs seen by the caller."""
+    counts = {backend.name: 0 for backend in router.backends}
+    ttfts = []
+    for _ in range(requests):
+        before = {backend.name: backend.requests - backend.failures for backend in router.backends}
+        start = time.perf_counter()
+        stream = router.stream_completion("stub-model", MESSAGES)
+        next(stream)
+        ttfts.append(time.perf_counter() - start)
+        "".join(stream)
+        for backend in router.backends:
+            if backend.requests - backend.failures > before[backend.name]:
+                counts[backend.name] += 1
+    return {"counts": counts, "median_ttft": statistics.median(ttfts)}
+
+
+def report(label: str, result: dict):
+    counts = ", ".join(f"{name} {count}" for name, count in result["counts"].items())
+    print(f"{label:>28}: {counts}; caller median TTFT {result['median_ttft'] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--fast-ms", type=float, default=20)
+    parser.add_argument("--slow-ms", type=float, default=150)
+    parser.add_argument("--cooldown", type=float, default=5.0)
+    args = parser.parse_args()
+
+    slow = StubServer(first_token_delay=args.slow_ms / 1000).start()
+    fast = StubServer(first_token_delay=args.fast_ms / 1000).start()
+    fast_port = fast.port
+    router = RoutingProvider([
+        Backend("slow", LocalProvider(base_url=slow.base_url, model="stub-model"), cooldown_seconds=args.cooldown),
+        Backend("fast", LocalProvider(base_url=fast.base_url, model="stub-model"), cooldown_seconds=args.cooldown),
+    ])
+    fast_backend = router.backends[1]
+
+    result = run(router, args.requests)
+    report("both up", result)
+    assert result["counts"]["fast"] >= args.requests - 1, "traffic should settle on the fast backend"
+
+    fast.stop()
+    failures = fast_backend.failures
+    result = run(router, args.requests)
+    report("fast stopped", result)
+    assert result["counts"]["slow"] == args.requests and fast_backend.failures > failures, \
+        "the fast backend should fail and every request complete on the slow one"
+
+    # Restart the fast server on the same port and let its cooldown lapse
+    fast = StubServer(first_token_delay=args.fast_ms / 1000).start(port=fast_port)
+    fast_backend.cooldown_until = 0.0
+    result = run(router, args.requests)
+    report("fast restarted", result)
+    assert result["counts"]["fast"] == args.requests, "traffic should return to the fast backend"
+
+    fast.fail_requests = 10 ** 6
+    fast.fail_status = 503
+    result = run(router, args.requests)
+    report("fast answering 503", result)
+    assert result["counts"]["slow"] == args.requests
+
+    for row in router.stats():
+        ttft = f"{row['median_ttft'] * 1000:.0f} ms" if row["median_ttft"] is not None else "-"
+        print(f"  {row['name']}: {row['requests']} requests, {row['failures']} failures, "
+              f"median TTFT {ttft}, error rate {row['error_rate']:.0%}")
+    router.close()
+    slow.stop()
+    fast.stop()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
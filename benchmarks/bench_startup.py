@@ -0,0 +1,47 @@
+"""
+Startup regression check: time from launching `ultra` to its first prompt.
+
+    python benchmarks/bench_startup.py --runs 10 --threshold-ms 200
+
+Each run starts a fresh interpreter with the startup probe set (see
+ultra/startup.py), so the chat loop exits once the prompt is printed.
+Exits with status 1 if the median time is over the threshold, or if any
+module that should load in the background (openai, rich.markdown, ...)
+was imported before the prompt.
+"""
+import sys
+import argparse
+import statistics
+
+from ultra.startup import DEFERRED_MODULES, measure_startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--threshold-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    measure_startup()  # Warm the OS file cache and __pycache__
+    times = sorted(measure_startup()["seconds"] * 1000 for _ in range(args.runs))
+    median = statistics.median(times)
+    print(f"time to first prompt: median {median:.0f} ms, min {times[0]:.0f} ms, max {times[-1]:.0f} ms "
+          f"({args.runs} runs)")
+
+    loaded = {name for name, _, _, _ in measure_startup(importtime=True)["imports"]}
+    early = [name for name in DEFERRED_MODULES if name in loaded]
+
+    failed = False
+    if median > args.threshold_ms:
+        print(f"FAIL: median is over the {args.threshold_ms:.0f} ms threshold")
+        failed = True
+    if early:
+        print(f"FAIL: imported before the first prompt: {', '.join(early)}")
+        failed = True
+    if not failed:
+        print(f"OK: under {args.threshold_ms:.0f} ms, deferred modules not loaded before the prompt")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Compares the two ways a transcript reaches the LLM for formatting, against
+the local stub server:
+
+- pdf:  write the sentences to disk, render a PDF with fpdf, upload it
+        through /v1/files, then reference it from the chat request
+- text: send the sentences inline as chunked message content
+
+    python benchmarks/bench_transcript_format.py --minutes 10 30 60 --runs 3
+
+Reports end-to-end latency (file writes, rendering and requests) and the
+request bytes the server received. The stub answers instantly, so the
+latency is the client-side cost; a real server also has to parse the PDF.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from stub_server import StubServer
+from ultra.providers import OpenAIProvider
+from ultra.stage_cache import StageCache
+from ultra.transcribe import format_sentences
+
+WORDS_PER_MINUTE = 150
+VOCABULARY = ("the of and to a in that is was he for it with as his on be at by i this had not are but "
+              "from or have an they which one you were her all she there would their we him been has "
+              "when who will more no if out so said what up its about into than them can only other "
+              "new some could time these two may then do first any my now such like our over man me "
+              "even most made after also did many before must through back years where much your way "
+              "well down should because each just those people how too little state good very make").split()
+
+
+def build_transcript(minutes: float, seed: int = 0) -> str:
+    """Sentence-per-line text of roughly the length of a talk of the given duration."""
+    rng = random.Random(seed)
+    words_left = int(minutes * WORDS_PER_MINUTE)
+    sentences = []
+    while words_left > 0:
+        length = min(words_left, rng.randint(6, 24))
+        words = [rng.choice(VOCABULARY) for _ in range(length)]
+        sentences.append(" ".join(words).capitalize() + ".")
+        words_left -= length
+    return "\n".join(sentences)
+
+
+def measure(server: StubServer, provider: OpenAIProvider, cache: StageCache, transcript: str,
+            format_input: str, run: int):
+    before = server.bytes_received
+    start = time.perf_counter()
+    # A new video id per run, so nothing is served from the stage cache
+    format_sentences(f"bench-{format_input}-{run}", transcript, cache, provider, format_input)
+    return time.perf_counter() - start, server.bytes_received - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 30, 60],
+                        help="Talk lengths to simulate")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer() as server:
+        os.chdir(tmp)
+        cache = StageCache(os.path.join(tmp, "cache"))
+        provider = OpenAIProvider("stub-key", base_url=server.base_url)
+        print(f"{'minutes':>8} {'text KB':>8} {'mode':>5} {'latency ms':>11} {'sent KB':>8}")
+        for minutes in args.minutes:
+            transcript = build_transcript(minutes)
+            for format_input in ("pdf", "text"):
+                results = [measure(server, provider, cache, transcript, format_input, f"{minutes}-{run}")
+                           for run in range(args.runs)]
+                latency = min(elapsed for elapsed, _ in results)
+                sent = results[-1][1]
+                print(f"{minutes:8.0f} {len(transcript.encode()) / 1024:8.1f} {format_input:>5} "
+                      f"{latency * 1000:11.1f} {sent / 1024:8.1f}")
+        provider.close()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Stand-in for yt-dlp that needs no network, for exercising the fetch stage:
+
+    ULTRA_YT_DLP=benchmarks/fake_yt_dlp.py ultra transcribe ...
+
+Understands the options VideoFetch passes. It prints an info dict, and
+unless --skip-download is given it writes the files yt-dlp would: <id>.mp3
+(and <id>.mp4 with --keep-video) under the -o directory. The mp3 is a copy of
+$FAKE_YT_DLP_AUDIO if set, otherwise a few placeholder bytes. Every run is
+appended to $FAKE_YT_DLP_LOG (if set) so callers can count invocations.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+
+
+def main(argv):
+    url = argv[-1]
+    match = re.search(r"(?:v=|youtu\.be/|/live/)([A-Za-z0-9_-]+)", url)
+    video_id = match.group(1) if match else "fakevideo"
+
+    if os.environ.get("FAKE_YT_DLP_LOG"):
+        with open(os.environ["FAKE_YT_DLP_LOG"], "a") as log:
+            log.write(json.dumps(argv) + "\n")
+    # Pretend to talk to the network
+    time.sleep(float(os.environ.get("FAKE_YT_DLP_DELAY", "0")))
+
+    if "--skip-download" not in argv:
+        template = argv[argv.index("-o") + 1] if "-o" in argv else "%(id)s.%(ext)s"
+        directory = os.path.dirname(template) or "."
+        os.makedirs(directory, exist_ok=True)
+        audio_path = os.path.join(directory, f"{video_id}.mp3")
+        if os.environ.get("FAKE_YT_DLP_AUDIO"):
+            shutil.copyfile(os.environ["FAKE_YT_DLP_AUDIO"], audio_path)
+        else:
+            with open(audio_path, "wb") as f:
+                f.write(b"ID3fake-audio")
+        if "--keep-video" in argv:
+            with open(os.path.join(directory, f"{video_id}.mp4"), "wb") as f:
+                f.write(b"fake-video")
+
+    print(json.dumps({
+        "id": video_id,
+        "title": f"Fake video {video_id}",
+        "duration": 3723,
+        "description": "A video served by the fake yt-dlp.",
+        "thumbnail": f"https://example.invalid/{video_id}.jpg",
+        "upload_date": "20250402",
+        "view_count": 1234567,
+        "like_count": 8910,
+        "comment_count": 11,
+        "uploader": "Fake Uploader",
+        "uploader_id": "@fake",
+        "categories": ["Education"],
+        "tags": ["fake", "test"],
+    }))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
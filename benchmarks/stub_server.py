@@ -0,0 +1,214 @@
+"""
+A local stand-in for an OpenAI-compatible HTTP API, used by the benchmarks.
+
+Implements just enough of /v1/models, /v1/chat/completions (streaming and
+non-streaming) and /v1/files for OpenAIProvider to run against it:
+
+    with StubServer(token_delay=0.01) as server:
+        provider = OpenAIProvider("stub-key", base_url=server.base_url)
+        print("".join(provider.stream_completion("stub-model", messages)))
+
+The server counts requests, TCP connections and request bytes so callers
+can check connection reuse and upload size. fail_requests answers the next
+chat completions with an error status (429 by default) to exercise retries,
+and stall_requests makes the next streams go quiet for stall_seconds after
+stall_after tokens to exercise timeouts.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "This is a stubbed reply from the local test server. It streams a few "
+    "words at a time so clients can be measured without a real backend."
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with self.server.stub.lock:
+            self.server.stub.requests += 1
+            self.server.stub.bytes_received += length + len(str(self.headers))
+        return body
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        self._read_body()
+        if self.path.rstrip("/").endswith("/models"):
+            models = [{"id": m, "object": "model", "created": 0, "owned_by": "stub"}
+                      for m in self.server.stub.models]
+            self._send_json({"object": "list", "data": models})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        body = self._read_body()
+        stub = self.server.stub
+        if self.path.rstrip("/").endswith("/files"):
+            with stub.lock:
+                stub.uploaded_bytes += len(body)
+            self._send_json({
+                "id": "file-stub", "object": "file", "bytes": len(body), "created_at": 0,
+                "filename": "upload", "purpose": "user_data", "status": "processed",
+            })
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, status=404)
+            return
+
+        with stub.lock:
+            fail = stub.fail_requests > 0
+            if fail:
+                stub.fail_requests -= 1
+                stub.failed += 1
+            stall = not fail and stub.stall_requests > 0
+            if stall:
+                stub.stall_requests -= 1
+                stub.stalled += 1
+        if fail:
+            self.send_response(stub.fail_status)
+            payload = json.dumps({"error": {"message": "stubbed failure", "type": "rate_limit_error"}}).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if stub.retry_after is not None:
+                self.send_header("Retry-After", str(stub.retry_after))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        request = json.loads(body or b"{}")
+        model = request.get("model", "stub-model")
+        reply = stub.reply_for(request)
+        time.sleep(stub.first_token_delay)
+
+        if not request.get("stream"):
+            time.sleep(stub.token_delay * len(stub.split(reply)))
+            self._send_json({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(reply) // 4,
+                          "total_tokens": (len(body) + len(reply)) // 4},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        for index, piece in enumerate(stub.split(reply)):
+            if stall and index == stub.stall_after:
+                time.sleep(stub.stall_seconds)
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(stub.token_delay)
+        # Send the terminating chunk in the same write as [DONE], like real servers
+        # do, so the client sees a complete body and can reuse the connection.
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "StubServer"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping connections (e.g. a stream closed at [DONE]) is expected
+        pass
+
+
+class StubServer:
+    def __init__(self, reply: str = DEFAULT_REPLY, first_token_delay: float = 0.0,
+                 token_delay: float = 0.0, models=("gpt-4o-mini", "gpt-4o", "stub-model"),
+                 fail_requests: int = 0, fail_status: int = 429, retry_after: float = None,
+                 stall_requests: int = 0, stall_after: int = 0, stall_seconds: float = 60.0):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.models = list(models)
+        # The next fail_requests chat completions are answered with fail_status
+        self.fail_requests = fail_requests
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.failed = 0
+        # The next stall_requests streams pause for stall_seconds before token stall_after
+        self.stall_requests = stall_requests
+        self.stall_after = stall_after
+        self.stall_seconds = stall_seconds
+        self.stalled = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.bytes_received = 0
+        self.uploaded_bytes = 0
+        self._server = None
+        self._thread = None
+
+    @staticmethod
+    def split(text: str) -> list:
+        words = text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def reply_for(self, request: dict) -> str:
+        """Override or replace to compute a reply from the request body."""
+        return self.reply(request) if callable(self.reply) else self.reply
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self, port: int = 0) -> "StubServer":
+        """Starts serving on port (any free port by default, e.g. port=old.port to restart a stopped server)."""
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -1,62 +1,67 @@
-import sys
 import time
 import os
 from typing import Optional
 
 # Only import essential modules at startup
-from ultra.config import get_api_key, APP_WORKING_DIR
+from ultra.config import get_default_provider, APP_WORKING_DIR
 from ultra.utils import console, color_text
 
 
 class UltraApp:
     def __init__(self):
-        # For demonstration, we only define an OpenAI provider. 
-        # You can expand with more providers as needed.
+        # Provider name (a section of config.json) -> provider, created on first use
         self.providers = {}
         self.current_provider = None
         self.current_model = None
         self.context_manager = None
+        # Where prompts asked by commands read their answer; set by the chat loop
+        # (see ultra.async_chat.LineReader), stdin when None
+        self.input_stream = None
 
-    def initialize_provider(self, provider_key: str):
+    def initialize_provider(self, provider_key: str = None):
         """
-        Creates or returns a provider object from an internal registry.
+        Creates or returns the provider configured under provider_key (the
+        configured default provider if not given). Provider classes come from
+        ultra.provider_registry, so plugins and the router work the same way.
         """
-        # Lazy import the provider only when needed
-        from ultra.providers import OpenAIProvider
-        
-        if provider_key == "openai":
-            if (provider_key not in self.providers):
-                api_key = get_api_key(provider_key)
-                self.providers[provider_key] = OpenAIProvider(api_key)
-            return self.providers[provider_key]
+        # Lazy import the registry only when needed
+        from ultra.provider_registry import create_provider
 
-        # Future: handle other providers
-        raise ValueError(f"Unknown provider: {provider_key}")
+        provider_key = provider_key or get_default_provider()
+        if provider_key not in self.providers:
+            self.providers[provider_key] = create_provider(provider_key)
+        return self.providers[provider_key]
 
-    def select_provider_and_model(self):
+    def select_provider_and_model(self, refresh_models: bool = False):
         """
         Asks user to pick a provider and model from a list of available providers.
-        For now, we'll do OpenAI only. You can extend to multiple providers easily.
+        The provider is the configured default (see ultra.provider_registry). The model list comes from the on-disk catalog unless refresh_models is set.
         """
         # Lazy import only when needed
         from rich.prompt import Prompt
+        from ultra.model_catalog import ModelCatalog
         
-        provider_key = "openai"  # if you had multiple providers, prompt for them
-        provider = self.initialize_provider(provider_key)
+        provider = self.initialize_provider()
 
         console.print("\nListing available models...")
-        models = provider.list_models()
+        models = ModelCatalog().get_models(provider, refresh=refresh_models)
 
         for i, m in enumerate(models):
             console.print(f"[bold cyan]{i + 1}[/bold cyan] - {m}")
-        choice = Prompt.ask("\nSelect a model number", choices=[str(i + 1) for i in range(len(models))], default="1")
+        choice = Prompt.ask("\nSelect a model number", choices=[str(i + 1) for i in range(len(models))], default="1",
+                            stream=self.input_stream)
         model_idx = int(choice) - 1
         self.current_provider = provider
         self.current_model = models[model_idx]
 
     def new_session(self, session_name: Optional[str] = None):
+        """
+        Starts a new session, or resumes session_name if it has a journal.
+        """
         # Lazy import only when needed
         from ultra.context_manager import ContextManager
+        if self.context_manager is not None:
+            self.context_manager.close()
         self.context_manager = ContextManager(session_name)
 
     def handle_commands(self, user_input: str) -> bool:
@@ -74,7 +79,17 @@ class UltraApp:
             # Only import Prompt for getting the URL
             from rich.prompt import Prompt
             
-            url = Prompt.ask("Please enter the video URL")
+            workers = None
+            parts = user_input.split()
+            if "--workers" in parts:
+                position = parts.index("--workers")
+                value = parts[position + 1] if position + 1 < len(parts) else ""
+                if not value.isdigit() or int(value) < 1:
+                    console.print("[bold yellow]Usage: /transcribe [--workers N] [--no-video][/bold yellow]")
+                    return True
+                workers = int(value)
+
+            url = Prompt.ask("Please enter the video URL", stream=self.input_stream)
             
             # Start the spinner immediately after getting the URL
             with console.status("I'm working on your video now", spinner="aesthetic"):
@@ -82,9 +97,15 @@ class UltraApp:
                 from ultra.transcribe import transcribe_video
                 from ultra.meta import download_video_info
                 from ultra.create_doc import write_styled_docx
+                from ultra.fetch import VideoFetch
                 
-                transcribe_video(url)
-                json_file = download_video_info(url)
+                # One yt-dlp run serves both the audio and the metadata
+                fetch = VideoFetch(url, download_video=False if "--no-video" in parts else None)
+                # Sentences are printed as they are transcribed
+                transcribe_video(url, workers=workers,
+                                 on_text=lambda sentence: console.print(sentence, style="dim", markup=False),
+                                 fetch=fetch)
+                json_file = download_video_info(url, fetch=fetch)
                 write_styled_docx(json_file)
                 
             console.print("[bold green]Transcription and document creation complete![/bold green]")
@@ -104,7 +125,16 @@ class UltraApp:
 
         if user_input.startswith("/save"):
             self.context_manager.save_session()
-            console.print("[bold yellow]Session saved![/bold yellow]")
+            console.print(f"[bold yellow]Session saved![/bold yellow] "
+                          f"[dim](resume with: ultra chat --resume {self.context_manager.session_name})[/dim]")
+            return True
+
+        if user_input.startswith("/search"):
+            query = user_input[len("/search"):].strip()
+            if not query:
+                console.print("[bold red]Usage: /search <query>[/bold red]")
+                return True
+            print_search_results(query)
             return True
 
         if user_input.startswith("/export"):
@@ -114,13 +144,41 @@ class UltraApp:
             return True
 
         if user_input.startswith("/compact"):
+            if "--background" in user_input or user_input.split()[1:2] == ["bg"]:
+                def on_done(error):
+                    if error:
+                        console.print(f"\n[bold red]Background compaction failed: {error}[/bold red]")
+                    else:
+                        console.print("\n[bold green]Background compaction finished![/bold green]")
+
+                if self.context_manager.compact_in_background(self.current_provider, on_done=on_done):
+                    console.print("[bold green]Compacting context in the background...[/bold green]")
+                else:
+                    console.print("[bold yellow]A compaction is already running.[/bold yellow]")
+                return True
+
             self.context_manager.compact_context(self.current_provider)
             console.print("[bold green]Context summarized/compacted![/bold green]")
             return True
 
         if user_input.startswith("/model"):
             console.print("[bold magenta]Switching model...[/bold magenta]")
-            self.select_provider_and_model()
+            self.select_provider_and_model(refresh_models="--refresh-models" in user_input)
+            return True
+
+        if user_input.startswith("/stats"):
+            from ultra.metrics import parse_days, print_stats
+            try:
+                days = parse_days(user_input.split())
+            except ValueError:
+                console.print("[bold yellow]Usage: /stats [--days N][/bold yellow]")
+                return True
+            print_stats(days=days)
+            return True
+
+        if user_input.startswith("/router"):
+            from ultra.router import print_router_stats
+            print_router_stats(self.current_provider)
             return True
 
         # New command: /progress - show a spinner for progress simulation.
@@ -130,50 +188,58 @@ class UltraApp:
             console.print("\n ✅ Done!\n")
             return True
 
-        if user_input in ("/quit", "/exit"):
-            console.print("[bold red]Goodbye![/bold red]")
-            sys.exit(0)
-
         return False
 
     def chat_loop(self):
         """
         Primary chat loop after a model is selected.
         """
-        # Lazy import rich modules
-        from rich.markdown import Markdown
-        from rich.live import Live
+        from ultra.startup import probe_requested, warm_up
         
         console.print(f"[bold #000000]Ultra CLI - Quick Chat with {self.current_model}[/bold #000000]\n")
-        while True:
-            user_prompt = console.input(color_text("John >>> ", "blue"))
-
-            # Check if input is a command
-            if user_prompt.startswith("/"):
-                handled = self.handle_commands(user_prompt)
-                if handled:
-                    continue
-
-            # Add user message to context
-            self.context_manager.add_message("user", user_prompt)
-            print()
-        
-            messages = self.context_manager.context
-            
-            full_response = ""
-            # Live display will continuously update the rendered markdown.
-            with Live(Markdown(""), refresh_per_second=20) as live:
-                for token in self.current_provider.stream_completion(self.current_model, messages):
-                    chunk = "".join(token)
-                    full_response += chunk
-                    # Restrict how much text you feed to live.update
-                    display_text = "\n".join(full_response.splitlines()[-100:])
-                    live.update(Markdown(display_text))
-               
-            console.print() # Add a newline after the streamed response
-            self.context_manager.add_message("assistant", full_response)
-
-def run_interactive_welcome():
+        if self.context_manager.context:
+            console.print(f"[dim]Resumed session {self.context_manager.session_name} "
+                          f"({len(self.context_manager.context)} messages)[/dim]\n")
+        console.print(color_text("John >>> ", "blue"), end="")
+        if probe_requested():
+            # Startup measurement: stop once the first prompt is on screen
+            console.print()
+            return
+        # The prompt is shown before asyncio, openai and rich.markdown are loaded; they load while the user types
+        warm_up(self.current_provider)
+
+        import asyncio
+        from ultra.async_chat import AsyncChatLoop
+        asyncio.run(AsyncChatLoop(self).run(prompt_shown=True))
+
+    def has_pending_message(self) -> bool:
+        """True if the last message is the user's and has no reply yet (its request failed)."""
+        context = self.context_manager.context
+        return bool(context) and context[-1]["role"] == "user"
+
+def print_search_results(query: str, limit: int = None, reindex: bool = False):
+    """
+    Prints ranked matches for query across all saved sessions.
+    """
+    # Lazy import only when needed
+    from ultra.context_manager import ContextManager, SESSION_DIR
+    from ultra.search_index import DEFAULT_SEARCH_LIMIT
+
+    index = ContextManager.search_index()
+    if reindex:
+        with console.status("Indexing saved sessions"):
+            count = index.reindex(SESSION_DIR)
+        console.print(f"[dim]Indexed {count} sessions[/dim]")
+
+    start = time.perf_counter()
+    hits = index.search(query, limit or DEFAULT_SEARCH_LIMIT)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for hit in hits:
+        console.print(index.format_hit(hit))
+    console.print(f"[dim]{len(hits)} results in {elapsed_ms:.1f} ms[/dim]")
+
+
+def run_interactive_welcome(refresh_models: bool = False):
     """
     Called when user types 'ultra models'.
     """
@@ -193,6 +259,6 @@ def run_interactive_welcome():
     console.print("Welcome to Ultra CLI. Type /quit at any time to exit.\n")
     
     app = UltraApp()
-    app.select_provider_and_model()
+    app.select_provider_and_model(refresh_models=refresh_models)
     app.new_session()
     app.chat_loop()
\ No newline at end of file
@@ -0,0 +1,348 @@
+"""
+The chat loop, run on asyncio so typing and streaming happen side by side.
+
+Lines are read from the terminal on a background thread. A prompt typed
+while a reply is streaming is queued, and queued prompts and commands run in
+order once the reply ends. /save, /stats, /router and /compact (moved to the
+background) run at once, even mid-reply.
+
+Ctrl-C during a reply stops only that reply. The part received so far is kept
+in the context. Ctrl-C at the prompt quits.
+
+/fanout sends the context to several models at once (see ultra/fanout.py).
+"""
+import os
+import sys
+import queue
+import select
+import signal
+import asyncio
+import threading
+import logging
+from rich.markup import escape
+from ultra.utils import console, color_text
+
+logger = logging.getLogger(__name__)
+
+PROMPT = color_text("John >>> ", "blue")
+
+# Run as soon as they are typed, even while a reply is streaming
+IMMEDIATE_COMMANDS = ("/save", "/compact", "/stats", "/router")
+QUIT_COMMANDS = ("/quit", "/exit")
+
+
+class LineReader:
+    """
+    Reads terminal lines on a daemon thread and hands them to the chat loop.
+    While a command is waiting in readline() (e.g. the model choice asked by
+    /model, given this object as its input stream), lines go to it instead.
+
+    A terminal is read with input(), for line editing. Piped input is read
+    from the file descriptor with select() so stop() can end the thread: a
+    daemon thread blocked inside sys.stdin aborts the interpreter at exit.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_line):
+        self.loop = loop
+        self.on_line = on_line
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._direct = queue.Queue()
+        self._stopping = threading.Event()
+        self._pending = b""
+        self._thread = threading.Thread(target=self._run, name="ultra-input", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _read_line(self):
+        """The next line without its newline, or None at end of input or once stopped."""
+        if os.name == "nt" or sys.stdin.isatty():
+            try:
+                return input()
+            except EOFError:
+                return None
+        fd = sys.stdin.fileno()
+        while b"\n" not in self._pending:
+            if self._stopping.is_set():
+                return None
+            if not select.select([fd], [], [], 0.1)[0]:
+                continue
+            data = os.read(fd, 4096)
+            if not data:
+                # End of input; a last line without a newline still counts
+                line, self._pending = self._pending, b""
+                return line.decode(sys.stdin.encoding or "utf-8", "replace").rstrip("\r") if line else None
+            self._pending += data
+        line, self._pending = self._pending.split(b"\n", 1)
+        return line.decode(sys.stdin.encoding or "utf-8", "replace").rstrip("\r")
+
+    def _run(self):
+        while True:
+            line = self._read_line()
+            if self._stopping.is_set():
+                return
+            with self._lock:
+                direct = self._waiting > 0
+            if direct:
+                self._direct.put(line)
+            else:
+                try:
+                    self.loop.call_soon_threadsafe(self.on_line, line)
+                except RuntimeError:
+                    return  # The loop has shut down
+            if line is None:
+                return
+
+    def readline(self) -> str:
+        """File-style readline for prompts run on another thread; "" at end of input."""
+        with self._lock:
+            self._waiting += 1
+        try:
+            line = self._direct.get()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        return "" if line is None else line + "\n"
+
+
+class AsyncChatLoop:
+    def __init__(self, app):
+        self.app = app
+        self.loop = None
+        self.lines = None
+        self.stream_task = None
+        self.busy = False
+        self.main_task = None
+
+    async def run(self, prompt_shown: bool = False):
+        """
+        Reads and dispatches lines until /quit, end of input or Ctrl-C at the
+        prompt. prompt_shown skips printing the first prompt (the caller did).
+        """
+        self.loop = asyncio.get_running_loop()
+        self.lines = asyncio.Queue()
+        self.main_task = asyncio.current_task()
+        self._install_interrupt()
+        reader = LineReader(self.loop, self.on_line)
+        self.app.input_stream = reader
+        reader.start()
+        try:
+            while True:
+                if self.lines.empty() and not prompt_shown:
+                    console.print(PROMPT, end="")
+                prompt_shown = False
+                line, queued = await self.lines.get()
+                if line is None:
+                    break
+                if queued:
+                    # Typed during the last reply; show it where it now takes effect
+                    console.print(PROMPT + escape(line))
+                self.busy = True
+                try:
+                    if not await self.dispatch(line):
+                        break
+                finally:
+                    self.busy = False
+        except asyncio.CancelledError:
+            console.print()
+        finally:
+            reader.stop()
+            self.app.input_stream = None
+            self._remove_interrupt()
+            await self._close()
+
+    def on_line(self, line):
+        """Called on the loop for each line read; None means end of input."""
+        if line is None:
+            self.lines.put_nowait((None, False))
+            return
+        command = line.strip().split(" ", 1)[0]
+        if self.busy and command in IMMEDIATE_COMMANDS:
+            self.run_immediate(line.strip())
+            return
+        self.lines.put_nowait((line, self.busy))
+        if self.busy:
+            console.print(f"[dim]Queued: {escape(line.strip())} ({self.lines.qsize()} waiting)[/dim]")
+
+    def run_immediate(self, command: str):
+        if command.startswith("/compact") and "bg" not in command.split()[1:] and "--background" not in command:
+            # A foreground compaction would rewrite the history under the reply being streamed
+            command = "/compact bg"
+        # On a thread, so a slow command doesn't stall the reply being streamed
+        future = self.in_thread(self.app.handle_commands, command)
+        future.add_done_callback(lambda future: self._report_failure(command, future))
+
+    @staticmethod
+    def _report_failure(command: str, future: asyncio.Future):
+        """Prints the error of a failed command; the session carries on."""
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            console.print(f"[bold red]{escape(command.split()[0])} failed: "
+                          f"{type(error).__name__}: {escape(str(error))}[/bold red]")
+
+    async def dispatch(self, line: str) -> bool:
+        """Runs one prompt or command; False to end the loop."""
+        text = line.strip()
+        if not text:
+            return True
+        if text.startswith("/"):
+            command = text.split()[0]
+            if command in QUIT_COMMANDS:
+                return False
+            if command == "/retry":
+                if self.app.has_pending_message():
+                    await self.respond()
+                else:
+                    console.print("[bold yellow]No unanswered message to retry.[/bold yellow]")
+                return True
+            if command == "/fanout":
+                await self.fanout(text[len(command):])
+                return True
+            future = self.in_thread(self.app.handle_commands, text)
+            await asyncio.wait({future})
+            if future.exception() is not None:
+                self._report_failure(text, future)
+                return True
+            if future.result():
+                return True
+
+        self.app.context_manager.add_message("user", line)
+        print()
+        await self.respond()
+        return True
+
+    async def respond(self) -> bool:
+        """
+        Streams a reply to the context and records it. If the request fails,
+        the user's message stays in the context as pending (see /retry). If it
+        is stopped with Ctrl-C, the partial reply is recorded.
+        """
+        from ultra.markdown_stream import StreamingMarkdown
+
+        app = self.app
+        # Trim or compact the history if this request would overflow the model
+        if await self.in_thread(app.context_manager.enforce_budget, app.current_model, app.current_provider):
+            console.print(f"[dim]Context trimmed to fit {app.current_model} "
+                          f"({app.context_manager.token_count(app.current_model)} tokens)[/dim]\n")
+        messages = list(app.context_manager.context)
+
+        # Completed blocks are printed once; only the open tail is re-rendered.
+        stream = StreamingMarkdown(console)
+        stream.start()
+        self.stream_task = self.loop.create_task(self._pump(stream, messages))
+        try:
+            await asyncio.wait({self.stream_task})
+        finally:
+            task, self.stream_task = self.stream_task, None
+            stream.finish()
+
+        text = stream.text
+        if task.cancelled():
+            console.print("[dim](stopped)[/dim]")
+            if not text:
+                console.print("[dim]Nothing was received; /retry sends your message again.[/dim]\n")
+                return False
+        elif task.exception() is not None:
+            error = task.exception()
+            console.print(f"\n[bold red]Request failed: {type(error).__name__}: {error}[/bold red]")
+            console.print("[dim]Your message is kept; /retry sends it again.[/dim]\n")
+            return False
+
+        console.print() # Add a newline after the streamed response
+        app.context_manager.add_message("assistant", text)
+        return True
+
+    async def fanout(self, args: str):
+        """
+        /fanout model1,model2,... [question]: streams the context (plus the
+        question, which is not added to the session) to every model at once.
+        Ctrl-C stops all of them.
+        """
+        from ultra.fanout import parse_fanout_args, run_fanout
+
+        try:
+            models, layout, question = parse_fanout_args(args)
+        except ValueError as e:
+            console.print(f"[bold yellow]{e}[/bold yellow]")
+            return
+        messages = list(self.app.context_manager.context)
+        if question:
+            messages.append({"role": "user", "content": question})
+        if not messages or messages[-1]["role"] != "user":
+            console.print("[bold yellow]Nothing to answer: add a question, e.g. "
+                          "/fanout gpt-4o,gpt-4o-mini What is a monad?[/bold yellow]")
+            return
+        self.stream_task = self.loop.create_task(
+            run_fanout(self.app.current_provider, models, messages, console, layout))
+        try:
+            await asyncio.wait({self.stream_task})
+        finally:
+            task, self.stream_task = self.stream_task, None
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            console.print(f"[bold red]Fan-out failed: {type(error).__name__}: {error}[/bold red]")
+        console.print()
+
+    async def _pump(self, stream, messages: list):
+        async for token in self.app.current_provider.astream_completion(self.app.current_model, messages):
+            stream.feed(token)
+
+    def in_thread(self, function, *args) -> asyncio.Future:
+        """
+        Runs a blocking call (a command, a compaction) on a daemon thread, so
+        quitting never waits for it the way the default executor would.
+        """
+        future = self.loop.create_future()
+
+        def settle(method, value):
+            if not future.done():
+                method(value)
+
+        def run():
+            try:
+                result = function(*args)
+            except BaseException as e:
+                outcome = (future.set_exception, e)
+            else:
+                outcome = (future.set_result, result)
+            try:
+                self.loop.call_soon_threadsafe(settle, *outcome)
+            except RuntimeError:
+                pass  # The loop has shut down
+
+        threading.Thread(target=run, name="ultra-command", daemon=True).start()
+        return future
+
+    def interrupt(self):
+        """Ctrl-C: stops the reply being streamed, or quits if there is none."""
+        if self.stream_task is not None and not self.stream_task.done():
+            self.stream_task.cancel()
+        elif self.main_task is not None:
+            self.main_task.cancel()
+
+    def _install_interrupt(self):
+        try:
+            self.loop.add_signal_handler(signal.SIGINT, self.interrupt)
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops have no signal handlers
+            signal.signal(signal.SIGINT, lambda *_: self.loop.call_soon_threadsafe(self.interrupt))
+
+    def _remove_interrupt(self):
+        try:
+            self.loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    async def _close(self):
+        self.app.context_manager.close()
+        aclose = getattr(self.app.current_provider, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception as e:
+                logger.debug(f"Closing the async client failed: {e}")
+        console.print("[bold red]Goodbye![/bold red]")
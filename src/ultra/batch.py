@@ -0,0 +1,350 @@
+"""
+Batch transcription: runs the /transcribe pipeline over a list of URLs.
+
+    ultra transcribe --batch urls.txt
+
+Jobs are kept in ~/.ultra/batch.db, so an interrupted batch picks up where it
+stopped when the same command is run again. Each stage runs in its own pool:
+
+- download: threads (yt-dlp is I/O bound), "download_concurrency" at once
+- transcribe: processes (Whisper is CPU bound), "cpu_workers" at once
+- format: threads calling the LLM, at most "format_per_minute" starts a minute
+
+All three are set in the "batch" section of config.json.
+"""
+import os
+import time
+import sqlite3
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ultra.config import CONFIG_DIR, ensure_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+BATCH_DB = os.path.join(CONFIG_DIR, "batch.db")
+
+# A job moves pending -> downloaded -> transcribed -> done, or to failed
+STAGES = ("download", "transcribe", "format")
+NEXT_STATUS = {"pending": "downloaded", "downloaded": "transcribed", "transcribed": "done"}
+STAGE_FOR_STATUS = dict(zip(NEXT_STATUS, STAGES))
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 4
+DEFAULT_FORMAT_CONCURRENCY = 4
+DEFAULT_FORMAT_PER_MINUTE = 20
+DEFAULT_MAX_ATTEMPTS = 2
+
+
+def default_cpu_workers() -> int:
+    # Whisper already uses several threads per process
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def read_url_list(path: str) -> list:
+    """URLs from a text file, one per line; blank lines and # comments are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line))
+
+
+class BatchQueue:
+    """
+    Persistent job queue for one batch (named after its URL list). Job status
+    only advances once a stage's output is saved, so after a crash every job
+    resumes from the last stage it completed.
+    """
+
+    def __init__(self, batch: str, path: str = BATCH_DB):
+        ensure_config_dir()
+        self.batch = batch
+        self.conn = sqlite3.connect(path, timeout=10)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                              "batch TEXT NOT NULL, url TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+                              "video_id TEXT, audio_path TEXT, json_file TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                              "error TEXT, error_status TEXT, download_seconds REAL, transcribe_seconds REAL, "
+                              "format_seconds REAL, updated_at REAL, PRIMARY KEY (batch, url))")
+
+    def add(self, urls) -> int:
+        """Queues urls not already in this batch and returns how many were new."""
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO jobs (batch, url, updated_at) VALUES (?, ?, ?)",
+                                  [(self.batch, url, time.time()) for url in urls])
+            return self.conn.total_changes - before
+
+    def retry_failed(self) -> int:
+        """Puts failed jobs back in the queue at the stage they failed in."""
+        with self.conn:
+            return self.conn.execute("UPDATE jobs SET status = COALESCE(error_status, 'pending'), attempts = 0 "
+                                     "WHERE batch = ? AND status = 'failed'", (self.batch,)).rowcount
+
+    def jobs(self, status: str = None) -> list:
+        query = "SELECT * FROM jobs WHERE batch = ?"
+        params = [self.batch]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        self.conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in self.conn.execute(query + " ORDER BY rowid", params)]
+        finally:
+            self.conn.row_factory = None
+
+    def counts(self) -> dict:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (self.batch,))
+        return dict(rows.fetchall())
+
+    def advance(self, url: str, status: str, seconds: float, **fields):
+        stage = STAGE_FOR_STATUS[status]
+        fields.update({"status": NEXT_STATUS[status], f"{stage}_seconds": seconds,
+                       "error": None, "attempts": 0, "updated_at": time.time()})
+        self._update(url, fields)
+
+    def fail(self, url: str, status: str, error: str, max_attempts: int) -> bool:
+        """Records a failed stage; returns True if the job will be retried."""
+        attempts = self.conn.execute("SELECT attempts FROM jobs WHERE batch = ? AND url = ?",
+                                     (self.batch, url)).fetchone()[0] + 1
+        retry = attempts < max_attempts
+        self._update(url, {"status": status if retry else "failed", "error_status": status,
+                           "error": error, "attempts": attempts, "updated_at": time.time()})
+        return retry
+
+    def _update(self, url: str, fields: dict):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.conn:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE batch = ? AND url = ?",
+                              [*fields.values(), self.batch, url])
+
+    def close(self):
+        self.conn.close()
+
+
+# ----------------------
+# Stage functions (the transcribe stage runs in a worker process)
+# ----------------------
+
+def _timed(fn, *args):
+    """
+    Runs a stage function in its worker and returns (fields, seconds), so time
+    spent queued in the pool is not counted as busy time. A failure carries
+    its seconds on the exception.
+    """
+    start = time.perf_counter()
+    try:
+        fields = fn(*args)
+    except Exception as e:
+        e.seconds = time.perf_counter() - start
+        raise
+    return fields, time.perf_counter() - start
+
+
+def _download_job(url: str, download_video: bool) -> dict:
+    from ultra.fetch import VideoFetch
+    from ultra.meta import download_video_info
+    from ultra.stage_cache import StageCache
+    from ultra.transcribe import video_id_for, cached_sentences, fetch_audio
+
+    cache = StageCache()
+    video_id = video_id_for(url)
+    fetch = VideoFetch(url, download_video=download_video)
+    audio_path = None
+    if cached_sentences(cache, video_id) is None:
+        audio_path = fetch_audio(url, video_id, cache, fetch)
+    json_file = download_video_info(url, fetch=fetch)
+    if json_file is None:
+        raise RuntimeError("could not fetch the video's metadata")
+    return {"video_id": video_id, "audio_path": audio_path, "json_file": json_file}
+
+
+def _transcribe_job(video_id: str, audio_path: str) -> dict:
+    from ultra.stage_cache import StageCache
+    from ultra.transcribe import cached_sentences, transcribe_audio
+
+    cache = StageCache()
+    if audio_path is not None and cached_sentences(cache, video_id) is None:
+        transcribe_audio(audio_path, video_id, cache)
+    return {}
+
+
+def _format_job(video_id: str, json_file: str, provider, bucket) -> dict:
+    from ultra.stage_cache import StageCache
+    from ultra.transcribe import cached_sentences, format_sentences
+    from ultra.create_doc import write_styled_docx
+
+    cache = StageCache()
+    sentences = cached_sentences(cache, video_id)
+    if sentences is None:
+        raise RuntimeError("transcript is missing from the stage cache (evicted?)")
+    bucket.acquire()
+    format_sentences(video_id, sentences, cache, provider)
+    write_styled_docx(json_file, open_output=False)
+    return {}
+
+
+class BatchRunner:
+    """
+    Moves every job in a BatchQueue through the three stage pools. Only this
+    (the scheduling) thread touches the queue's database.
+
+    Downloads are held back once `prefetch` jobs are waiting for a CPU
+    worker, so a slow transcribe stage does not fill the disk with audio.
+    """
+
+    def __init__(self, queue: BatchQueue, download_concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+                 cpu_workers: int = None, format_concurrency: int = DEFAULT_FORMAT_CONCURRENCY,
+                 format_per_minute: float = DEFAULT_FORMAT_PER_MINUTE, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 prefetch: int = None, download_video: bool = None, provider=None, on_event=None):
+        from ultra.rate_limit import TokenBucket
+
+        self.queue = queue
+        self.download_concurrency = download_concurrency
+        self.cpu_workers = cpu_workers or default_cpu_workers()
+        self.format_concurrency = format_concurrency
+        self.bucket = TokenBucket(format_per_minute, per=60.0, capacity=min(format_per_minute, format_concurrency))
+        self.max_attempts = max_attempts
+        self.prefetch = prefetch if prefetch is not None else 2 * self.cpu_workers
+        self.download_video = download_video
+        self.provider = provider
+        self.on_event = on_event or (lambda message: None)
+        self.stats = {stage: {"jobs": 0, "failed": 0, "busy": 0.0} for stage in STAGES}
+        self.wall_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, queue: BatchQueue, **overrides) -> "BatchRunner":
+        settings = dict(load_config().get("batch", {}))
+        settings.update({name: value for name, value in overrides.items() if value is not None})
+        return cls(queue, **settings)
+
+    def _provider(self):
+        if self.provider is None:
+            from ultra.config import get_default_provider
+            from ultra.provider_registry import create_provider
+            self.provider = create_provider(get_default_provider())
+        return self.provider
+
+    # Forking while the download threads hold SQLite connections and locks is unsafe
+    _mp_context = multiprocessing.get_context("spawn")
+
+    def run(self):
+        self._provider()  # Prompt for an API key before the pools start
+        start = time.perf_counter()
+        running = {}  # future -> (url, status)
+        with ThreadPoolExecutor(self.download_concurrency, thread_name_prefix="batch-download") as downloads, \
+                ProcessPoolExecutor(self.cpu_workers, mp_context=self._mp_context) as transcribers, \
+                ThreadPoolExecutor(self.format_concurrency, thread_name_prefix="batch-format") as formatters:
+            try:
+                while True:
+                    self._schedule(running, downloads, transcribers, formatters)
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(future, *running.pop(future))
+            except KeyboardInterrupt:
+                # Finished stages are already saved; the rest resume on the next run
+                for future in running:
+                    future.cancel()
+                raise
+            finally:
+                self.wall_seconds = time.perf_counter() - start
+
+    def _schedule(self, running, downloads, transcribers, formatters):
+        in_flight = set(running.values())
+        busy = {url for url, _ in in_flight}
+
+        def active(status):
+            return sum(1 for _, s in in_flight if s == status)
+
+        # Each submitted job counts at once, so no pool is handed more jobs than it has workers
+        for job in self.queue.jobs("transcribed"):
+            if job["url"] in busy or active("transcribed") >= self.format_concurrency:
+                continue
+            self._submit(running, formatters, job, _format_job, job["video_id"], job["json_file"],
+                         self._provider(), self.bucket)
+            in_flight.add((job["url"], "transcribed"))
+
+        waiting = self.queue.jobs("downloaded")
+        for job in waiting:
+            if job["url"] in busy or active("downloaded") >= self.cpu_workers:
+                continue
+            self._submit(running, transcribers, job, _transcribe_job, job["video_id"], job["audio_path"])
+            in_flight.add((job["url"], "downloaded"))
+
+        # Downloaded jobs not yet handed to a CPU worker
+        backlog = len(waiting) - active("downloaded")
+        for job in self.queue.jobs("pending"):
+            if job["url"] in busy or active("pending") >= self.download_concurrency:
+                continue
+            if backlog + active("pending") >= self.prefetch:
+                break
+            self._submit(running, downloads, job, _download_job, job["url"], self.download_video)
+            in_flight.add((job["url"], "pending"))
+
+    def _submit(self, running, pool, job, fn, *args):
+        future = pool.submit(_timed, fn, *args)
+        running[future] = (job["url"], job["status"])
+
+    def _finish(self, future, url: str, status: str):
+        stage = STAGE_FOR_STATUS[status]
+        try:
+            fields, elapsed = future.result()
+        except Exception as e:
+            self.stats[stage]["busy"] += getattr(e, "seconds", 0.0)
+            self.stats[stage]["failed"] += 1
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Batch {stage} failed for {url}: {error}")
+            retry = self.queue.fail(url, status, error, self.max_attempts)
+            self.on_event(f"[red]{stage} failed[/red] {url}: {error}" + (" (retrying)" if retry else ""))
+            return
+        self.stats[stage]["busy"] += elapsed
+        self.stats[stage]["jobs"] += 1
+        self.queue.advance(url, status, elapsed, **fields)
+        self.on_event(f"[green]{stage}[/green] {url} ({elapsed:.1f}s)")
+
+
+def print_summary(runner: BatchRunner):
+    from rich.table import Table
+    from ultra.utils import console
+
+    table = Table(title=f"Batch {os.path.basename(runner.queue.batch)} ({runner.wall_seconds:.1f}s wall)")
+    table.add_column("Stage")
+    table.add_column("Done", justify="right")
+    table.add_column("Failed", justify="right")
+    table.add_column("Busy s", justify="right")
+    table.add_column("Mean s/job", justify="right")
+    table.add_column("Jobs/min", justify="right")
+    for stage in STAGES:
+        stats = runner.stats[stage]
+        mean = stats["busy"] / stats["jobs"] if stats["jobs"] else 0.0
+        per_minute = stats["jobs"] * 60 / runner.wall_seconds if runner.wall_seconds else 0.0
+        table.add_row(stage, str(stats["jobs"]), str(stats["failed"]), f"{stats['busy']:.1f}",
+                      f"{mean:.1f}", f"{per_minute:.1f}")
+    console.print(table)
+
+    counts = runner.queue.counts()
+    console.print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+    for job in runner.queue.jobs("failed"):
+        console.print(f"[red]failed[/red] {job['url']}: {job['error']}")
+
+
+def run_batch(url_file: str, retry_failed: bool = False, **overrides) -> BatchRunner:
+    """Queues the URLs in url_file, runs the batch to completion and prints a per-stage summary."""
+    from ultra.utils import console
+
+    queue = BatchQueue(os.path.abspath(url_file))
+    try:
+        added = queue.add(read_url_list(url_file))
+        if retry_failed:
+            console.print(f"Retrying {queue.retry_failed()} failed jobs")
+        counts = queue.counts()
+        remaining = sum(counts.values()) - counts.get("done", 0) - counts.get("failed", 0)
+        console.print(f"Queued {added} new URLs ({remaining} to process)")
+        runner = BatchRunner.from_config(queue, on_event=console.print, **overrides)
+        try:
+            runner.run()
+        finally:
+            print_summary(runner)
+        return runner
+    finally:
+        queue.close()
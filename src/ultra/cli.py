@@ -26,7 +26,7 @@ def main():
         # Create app without initial message (will show in chat_loop with model)
         configure_logging()
         app = UltraApp()
-        provider = app.initialize_provider("openai")
+        provider = app.initialize_provider()
         app.current_provider = provider
         app.current_model = provider.get_cheapest_model()
         app.new_session()
@@ -34,10 +34,14 @@ def main():
         return
 
     subcommand = args[0]
-    if subcommand == "models":
+    if subcommand == "--profile-startup":
+        from ultra.startup import profile_startup
+        top = int(args[args.index("--top") + 1]) if "--top" in args else 20
+        profile_startup(top=top)
+    elif subcommand == "models":
         # Show welcome + model selection
         from ultra.app import run_interactive_welcome
-        run_interactive_welcome()
+        run_interactive_welcome(refresh_models="--refresh-models" in args[1:])
     elif subcommand == "chat":
         # Set terminal title (no newline)
         print("\033]0;⚡ Ultra Chat\007", end="")
@@ -46,14 +50,102 @@ def main():
         
         # Lazy load modules only when needed
         from ultra.app import UltraApp
+        from ultra.utils import console
+
+        session_name = None
+        if "--resume" in args[1:]:
+            from ultra.context_manager import ContextManager
+            resume_args = args[args.index("--resume") + 1:]
+            if resume_args and not resume_args[0].startswith("-"):
+                session_name = resume_args[0]
+                if not ContextManager.session_exists(session_name):
+                    console.print(f"[red]No saved session named {session_name}[/red]")
+                    return
+            else:
+                # No name given: pick up the most recent session
+                session_name = ContextManager.latest_session()
+                if session_name is None:
+                    console.print("[red]No saved sessions to resume[/red]")
+                    return
         
         # Create app without initial message (will show in chat_loop with model)
         app = UltraApp()
-        provider = app.initialize_provider("openai")
+        provider = app.initialize_provider()
         app.current_provider = provider
         app.current_model = provider.get_cheapest_model()
-        app.new_session()
+        app.new_session(session_name)
         app.chat_loop()
+    elif subcommand == "search":
+        from ultra.app import print_search_results
+        from ultra.utils import console
+
+        usage = "[red]Usage: ultra search <query> [--limit N] [--reindex][/red]"
+        search_args = args[1:]
+        reindex = "--reindex" in search_args
+        limit = None
+        if "--limit" in search_args:
+            position = search_args.index("--limit")
+            value = search_args[position + 1] if position + 1 < len(search_args) else ""
+            if not value.isdigit() or int(value) < 1:
+                console.print(usage)
+                return
+            limit = int(value)
+            del search_args[position:position + 2]
+        query = " ".join(arg for arg in search_args if arg != "--reindex")
+        if not query:
+            console.print(usage)
+            return
+        print_search_results(query, limit=limit, reindex=reindex)
+    elif subcommand == "transcribe":
+        import argparse
+        parser = argparse.ArgumentParser(prog="ultra transcribe", description="Transcribe YouTube videos")
+        parser.add_argument("url", nargs="?", help="YouTube video URL")
+        parser.add_argument("--batch", metavar="FILE", help="Transcribe every URL in FILE (one per line)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Processes per video, or with --batch, videos transcribed at once")
+        parser.add_argument("--no-video", action="store_true", help="Download only the audio")
+        parser.add_argument("--retry-failed", action="store_true", help="Re-queue the batch's failed jobs")
+        transcribe_args = parser.parse_args(args[1:])
+        if not transcribe_args.url and not transcribe_args.batch:
+            parser.error("give a URL or --batch FILE")
+
+        url_file = os.path.abspath(transcribe_args.batch) if transcribe_args.batch else None
+        # Switch to the configured working directory
+        os.chdir(APP_WORKING_DIR)
+        from ultra.logging_config import configure_logging
+        configure_logging()
+        download_video = False if transcribe_args.no_video else None
+        if url_file:
+            from ultra.batch import run_batch
+            try:
+                run_batch(url_file, retry_failed=transcribe_args.retry_failed,
+                          cpu_workers=transcribe_args.workers, download_video=download_video)
+            except KeyboardInterrupt:
+                print("\nInterrupted; run the same command again to resume the batch")
+        else:
+            from ultra.transcribe import transcribe_video
+            from ultra.meta import download_video_info
+            from ultra.create_doc import write_styled_docx
+            from ultra.fetch import VideoFetch
+            fetch = VideoFetch(transcribe_args.url, download_video=download_video)
+            transcribe_video(transcribe_args.url, workers=transcribe_args.workers,
+                             on_text=lambda sentence: print(sentence, flush=True), fetch=fetch)
+            write_styled_docx(download_video_info(transcribe_args.url, fetch=fetch))
+    elif subcommand == "cache":
+        from ultra.response_cache import print_cache_stats
+        print_cache_stats(clear="--clear" in args[1:])
+    elif subcommand == "stats":
+        from ultra.metrics import parse_days, print_stats
+        try:
+            days = parse_days(args[1:])
+        except ValueError:
+            from ultra.utils import console
+            console.print("[red]Usage: ultra stats [--days N][/red]")
+            return
+        print_stats(days=days)
+    elif subcommand == "whisper-server":
+        from ultra.whisper_server import main as whisper_server_main
+        whisper_server_main(args[1:])
     elif subcommand == "--help" or subcommand == "-h":
         # Import only the console for help display
         from ultra.utils import console
@@ -61,10 +153,26 @@ def main():
         console.print("Commands:")
         console.print("  [cyan]ultra[/cyan]             Start a quick chat session")
         console.print("  [cyan]ultra chat[/cyan]        Start a chat session")
+        console.print("      [cyan]--resume [session][/cyan]  Resume a session (the latest if none is named)")
         console.print("  [cyan]ultra models[/cyan]      Choose from available models")
+        console.print("      [cyan]--refresh-models[/cyan]  Re-fetch the cached model list first")
+        console.print("  [cyan]ultra search <query>[/cyan]  Search all saved sessions")
+        console.print("      [cyan]--limit N[/cyan]         Show at most N results")
+        console.print("      [cyan]--reindex[/cyan]         Index sessions saved before the index existed")
+        console.print("  [cyan]ultra transcribe <url>[/cyan]  Transcribe a YouTube video to a document")
+        console.print("      [cyan]--batch FILE[/cyan]      Transcribe every URL in FILE (resumable)")
+        console.print("      [cyan]--workers N[/cyan]       Processes per video (with --batch: videos at once)")
+        console.print("      [cyan]--retry-failed[/cyan]    Re-queue the batch's failed jobs")
+        console.print("  [cyan]ultra cache[/cyan]       Show response cache hit/miss statistics")
+        console.print("      [cyan]--clear[/cyan]           Delete every cached response")
+        console.print("  [cyan]ultra stats[/cyan]       Show p50/p95/p99 latency and throughput per model")
+        console.print("      [cyan]--days N[/cyan]          Only requests from the last N days")
+        console.print("  [cyan]ultra whisper-server[/cyan]  Keep Whisper models loaded for /transcribe")
+        console.print("      [cyan]--status[/cyan] / [cyan]--stop[/cyan]   Show or stop the running server")
+        console.print("  [cyan]ultra --profile-startup[/cyan]  Show per-module import times up to the first prompt")
         console.print("  [cyan]ultra --help[/cyan]      Show this help message\n")
     else:
         # Import only the console for error display
         from ultra.utils import console
         console.print(f"[red]Unknown command: {subcommand}[/red]")
-        console.print("Available commands: models / chat / --help")
\ No newline at end of file
+        console.print("Available commands: models / chat / search / transcribe / cache / stats / whisper-server / --profile-startup / --help")
\ No newline at end of file
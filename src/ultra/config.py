@@ -3,7 +3,31 @@ import json
 
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".ultra")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
-APP_WORKING_DIR = '/Users/johnshaff/Documents/dev'
+MODELS_CACHE_FILE = os.path.join(CONFIG_DIR, "models.json")
+# ULTRA_WORKING_DIR overrides it, e.g. for the startup benchmark
+APP_WORKING_DIR = os.environ.get("ULTRA_WORKING_DIR", '/Users/johnshaff/Documents/dev')
+
+# Provider used for chat unless config.json sets "provider" (a section name, e.g. "router")
+DEFAULT_PROVIDER = "openai"
+
+# Connection pool, response cache and resilience defaults for provider clients (overridable per provider in config.json)
+DEFAULT_PROVIDER_SETTINGS = {
+    "base_url": None,
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "http2": True,
+    "response_cache": False,
+    # Timeouts, retries and client-side rate limit (see ultra/resilience.py)
+    "connect_timeout": 10.0,
+    "first_token_timeout": 60.0,
+    "token_timeout": 30.0,
+    "request_timeout": 600.0,
+    "max_retries": 3,
+    "backoff_seconds": 1.0,
+    "max_backoff_seconds": 60.0,
+    "requests_per_minute": None,
+}
 
 def ensure_config_dir():
     os.makedirs(CONFIG_DIR, exist_ok=True)
@@ -39,4 +63,20 @@ def get_api_key(provider_name="openai"):
         config.setdefault(provider_name, {})["api_key"] = key
         save_config(config)
 
-    return key
\ No newline at end of file
+    return key
+
+def get_provider_settings(provider_name="openai"):
+    """
+    Returns the client settings (base_url, pool limits, response cache, timeouts and retries) for a provider,
+    merging the defaults with anything set under the provider in config.json.
+    """
+    settings = dict(DEFAULT_PROVIDER_SETTINGS)
+    provider_config = load_config().get(provider_name, {})
+    for key in DEFAULT_PROVIDER_SETTINGS:
+        if key in provider_config:
+            settings[key] = provider_config[key]
+    return settings
+
+def get_default_provider():
+    """Name of the provider chat starts with: "provider" in config.json, else DEFAULT_PROVIDER."""
+    return load_config().get("provider", DEFAULT_PROVIDER)
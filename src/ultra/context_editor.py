@@ -1,109 +1,164 @@
 import os
 import sys
+import queue
 import subprocess
-import pickle
-import tempfile
 import threading
-import time
+import logging
+from multiprocessing.connection import Listener
 
+logger = logging.getLogger(__name__)
 
-# Context manager wrapper that updates the pickle file on changes
+# Environment variable used to hand the connection authkey to the window process
+AUTHKEY_ENV = "ULTRA_CONTEXT_AUTHKEY"
+
+
+# Bridges a ContextManager and a Live Context Window over a local socket
 class ContextObserver:
-    def __init__(self, context_manager, pickle_path):
+    """
+    Pushes context changes to the window as deltas and applies the window's
+    edits back to the context manager.
+
+    Both directions use multiprocessing.connection (a Unix domain socket, or a
+    named pipe on Windows) and carry numbered events:
+        main -> window: snapshot / append / replace / clear, numbered by the
+                        context manager's seq
+        window -> main: snapshot / replace / update edits with the window's own seq and
+                        the last main seq it had seen ("base"), or "resync"
+    Nothing is read or written while the conversation is idle.
+    """
+
+    def __init__(self, context_manager):
         self.context_manager = context_manager
-        self.pickle_path = pickle_path
-        self.original_add_message = context_manager.add_message
-        self.original_clear_context = context_manager.clear_context
-        
-        # Replace methods on this specific instance only
-        context_manager.add_message = self.add_message
-        context_manager.clear_context = self.clear_context
-    
-    def add_message(self, role, content):
-        # Call original method first
-        self.original_add_message(role, content)
-        # Then update the pickle file
-        self.update_pickle()
-        
-    def clear_context(self):
-        # Call original method first
-        self.original_clear_context()
-        # Then update the pickle file
-        self.update_pickle()
-        
-    def update_pickle(self):
-        try:
-            with open(self.pickle_path, "wb") as f:
-                pickle.dump(self.context_manager.context, f)
-        except Exception:
-            pass  # Silently ignore errors
+        self.authkey = os.urandom(32)
+        self.listener = Listener(authkey=self.authkey)
+        self.address = self.listener.address
+        self.conn = None
+        self.last_window_seq = 0
+        self._outbox = queue.Queue()
+        self._closed = False
+
+        threading.Thread(target=self._serve, daemon=True).start()
 
-    def check_for_external_updates(self):
-        """Check if the editor has modified the pickle file and update if needed."""
+    def on_event(self, event: dict):
+        # Called under the context manager's lock: hand off, never block the chat
+        self._outbox.put(event)
+
+    def _serve(self):
         try:
-            with open(self.pickle_path, "rb") as f:
-                new_context = pickle.load(f)
-                
-            # Check if the context has changed
-            if new_context != self.context_manager.context:
-                # Update the context_manager with the new data
-                self.context_manager.context = new_context
-                return True
-        except Exception:
-            pass
-        return False
+            self.conn = self.listener.accept()
+        except Exception as e:
+            logger.error(f"Context window never connected: {e}")
+            self.close()
+            return
+
+        # Subscribe and take the snapshot under the same lock, so no change slips between them
+        with self.context_manager._lock:
+            self.context_manager.subscribe(self.on_event)
+            self._outbox.put(self.context_manager.snapshot())
+
+        threading.Thread(target=self._send_loop, daemon=True).start()
+        self._receive_loop()
+
+    def _send_loop(self):
+        while not self._closed:
+            event = self._outbox.get()
+            if event is None:
+                return
+            try:
+                self.conn.send(event)
+            except (OSError, EOFError):
+                self.close()
+                return
+
+    def _receive_loop(self):
+        while not self._closed:
+            try:
+                event = self.conn.recv()
+            except (OSError, EOFError):
+                # Window closed
+                self.close()
+                return
+            try:
+                self._apply_window_event(event)
+            except Exception as e:
+                logger.error(f"Could not apply context window edit: {e}")
+
+    def _apply_window_event(self, event: dict):
+        op = event.get("op")
+        if event.get("seq", 0) != self.last_window_seq + 1:
+            logger.warning(f"Context window event out of order: {event.get('seq')} after {self.last_window_seq}")
+        self.last_window_seq = event.get("seq", self.last_window_seq)
+
+        if op == "resync":
+            self._outbox.put(self.context_manager.snapshot())
+            return
+
+        with self.context_manager._lock:
+            # An edit made against an older version of the context would clobber
+            # messages added since; reject it and let the window reload.
+            if event.get("base") != self.context_manager.seq:
+                self._outbox.put({"op": "conflict", "seq": self.context_manager.seq,
+                                  "window_seq": event.get("seq")})
+                self._outbox.put(self.context_manager.snapshot())
+                return
+            if op == "snapshot":
+                self.context_manager.context = event["messages"]
+            elif op == "replace":
+                self.context_manager.replace_messages(event["start"], event["end"], event["messages"])
+            elif op == "update":
+                # Several single-message edits, ordered last to first
+                for change in event["changes"]:
+                    self.context_manager.replace_messages(change["start"], change["end"], change["messages"])
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.context_manager.unsubscribe(self.on_event)
+        self._outbox.put(None)
+        for closable in (self.conn, self.listener):
+            try:
+                if closable is not None:
+                    closable.close()
+            except Exception:
+                pass
+        if self in ContextEditor._active_observers:
+            ContextEditor._active_observers.remove(self)
 
 
 class ContextEditor:
     """Handles visualization for context display using PyQt."""
-    
+
     # Keep track of active context observers to prevent garbage collection
     _active_observers = []
-    
+
     @staticmethod
-    def start_gui_view(context_provider, refresh_interval=1000):
+    def start_gui_view(context_provider):
         """
-        Launch a GUI window showing context that updates automatically.
-        
+        Launch a GUI window showing context that updates as it changes.
+
         Args:
-            context_provider: Object with a 'context' attribute that will be monitored
-            refresh_interval: How often to refresh the view (in ms)
+            context_provider: ContextManager whose changes are pushed to the window
         """
         try:
-            # Create a persistent pickle file path
-            pickle_path = f"{tempfile.gettempdir()}/context_data_{id(context_provider)}.pickle"
-            
-            # Save initial context data
-            with open(pickle_path, "wb") as f:
-                pickle.dump(context_provider.context, f)
-            
-            # Create an observer for this context manager
-            observer = ContextObserver(context_provider, pickle_path)
-            
+            # Open the channel first; the window connects back to it
+            observer = ContextObserver(context_provider)
+
             # Store reference to prevent garbage collection
             ContextEditor._active_observers.append(observer)
-            
-            # Set up a timer to check for updates from the editor
-            def check_updates_periodically():
-                while True:
-                    time.sleep(refresh_interval / 1000 * 2)  # Check half as often as the refresh rate
-                    observer.check_for_external_updates()
-            
-            # Start the update checker in a background thread
-            update_thread = threading.Thread(target=check_updates_periodically, daemon=True)
-            update_thread.start()
-            
+
             # Launch the context window script as a separate process
             context_window_script = os.path.join(os.path.dirname(__file__), "context_window.py")
+            env = dict(os.environ, **{AUTHKEY_ENV: observer.authkey.hex()})
             with open(os.devnull, 'w') as devnull:
                 subprocess.Popen(
-                    [sys.executable, context_window_script, 
-                     "--pickle-path", pickle_path, 
-                     "--refresh-interval", str(refresh_interval)],
+                    [sys.executable, context_window_script,
+                     "--address", observer.address],
                     stdout=devnull,
                     stderr=devnull,
+                    env=env,
                     start_new_session=True
                 )
-                
+
         except Exception as e:
             raise ImportError(f"Could not start PyQt Context Window Editor: {str(e)}")
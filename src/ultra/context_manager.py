@@ -1,62 +1,420 @@
 import os
 import json
 import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
 from typing import List, Dict
-from ultra.config import APP_WORKING_DIR
+from ultra.config import APP_WORKING_DIR, load_config
+from ultra.tokens import count_message_tokens, context_window_for_model, encoding_name_for_model
 
 # Define sessions directory in the working directory
 SESSION_DIR = os.path.join(APP_WORKING_DIR, "sessions")
 
+# Marks the system message that holds the rolling summary of compacted messages
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Rolling compaction defaults (overridable in the "compaction" section of config.json)
+DEFAULT_KEEP_LAST = 6       # newest messages always kept verbatim
+DEFAULT_BATCH_SIZE = None   # oldest messages folded in per compaction (None = all eligible)
+SUMMARY_CACHE_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+# Guards ContextManager._summary_cache, used by every session's compaction and budget threads
+_summary_cache_lock = threading.Lock()
+
 def ensure_session_dir():
     os.makedirs(SESSION_DIR, exist_ok=True)
 
+class ContextBudget:
+    """
+    Policy applied before each request so the context never overflows the model.
+
+    strategy:
+        "sliding_window" - drop the oldest messages
+        "pinned_system"  - drop the oldest messages but keep a leading system prompt
+        "compact"        - summarize the history, falling back to "pinned_system"
+    max_tokens: budget in tokens (defaults to the model's context window)
+    reserve_tokens: room left for the model's reply
+    """
+    STRATEGIES = ("sliding_window", "pinned_system", "compact")
+
+    def __init__(self, strategy: str = "pinned_system", max_tokens: int = None, reserve_tokens: int = 4096):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown context budget strategy: {strategy}")
+        self.strategy = strategy
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+
+    @classmethod
+    def from_config(cls) -> "ContextBudget":
+        """Reads the "context_budget" section of config.json."""
+        return cls(**load_config().get("context_budget", {}))
+
+    def limit_for(self, model_name: str) -> int:
+        window = self.max_tokens or context_window_for_model(model_name)
+        return max(1, window - self.reserve_tokens)
+
 class ContextManager:
-    def __init__(self, session_name: str = None):
+    # Summaries already computed, keyed by a hash of (previous summary, messages folded in).
+    # Shared across sessions so repeated compactions never re-send the same text.
+    _summary_cache = OrderedDict()
+    _search_index = None
+
+    def __init__(self, session_name: str = None, budget: ContextBudget = None, journal: bool = True):
+        """
+        An existing session_name resumes that session from its journal.
+        """
         ensure_session_dir()
         if session_name is None:
             # Create a new session name based on timestamp
             session_name = time.strftime("session-%Y%m%d-%H%M%S")
         self.session_name = session_name
-        self.context = []  # List of messages
+        self.budget = budget or ContextBudget.from_config()
+        self._context = []  # List of messages
+        self._token_counts = []  # Per message: {encoding name: token count}, parallel to _context
+        self._token_totals = {}  # Running total per encoding name
+        self._lock = threading.RLock()
+        self._compaction_thread = None
+        self._listeners = []
+        self.seq = 0  # Sequence number of the last change event
+        self.journal = None
+        if journal:
+            self._open_journal()
+
+    @property
+    def context(self) -> List[Dict]:
+        return self._context
+
+    @context.setter
+    def context(self, messages: List[Dict]):
+        # Whole-context replacement (external edits): recount once
+        with self._lock:
+            encodings = list(self._token_totals)
+            self._context = list(messages)
+            self._token_counts = [{} for _ in self._context]
+            self._token_totals = {}
+            for encoding in encodings:
+                self._track_encoding(encoding)
+            self._emit({"op": "snapshot", "messages": list(self._context)})
+
+    def subscribe(self, listener):
+        """
+        Registers listener(event) to be called after every change to the context.
+        Events are dicts with a "seq" number and an "op":
+            append   {"message"}
+            replace  {"start", "end", "messages"} - context[start:end] = messages
+            clear    {}
+            snapshot {"messages"} - the whole context was replaced
+        Listeners run while the context is locked, so they must be quick.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def snapshot(self) -> dict:
+        """A snapshot event describing the current context."""
+        with self._lock:
+            return {"op": "snapshot", "seq": self.seq, "messages": list(self._context)}
+
+    def _emit(self, event: dict):
+        self.seq += 1
+        event["seq"] = self.seq
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Context listener failed: {e}")
 
     def add_message(self, role: str, content: str):
         """
         role = "user" or "assistant" or "system"
         content = actual text
         """
-        self.context.append({"role": role, "content": content})
+        with self._lock:
+            self._replace_messages(len(self._context), len(self._context), [{"role": role, "content": content}])
 
     def clear_context(self):
-        self.context = []
+        with self._lock:
+            self._context = []
+            self._token_counts = []
+            self._token_totals = {encoding: 0 for encoding in self._token_totals}
+            self._emit({"op": "clear"})
+
+    def replace_messages(self, start: int, end: int, messages: List[Dict]):
+        """Replaces context[start:end] with messages (e.g. edits from the context window)."""
+        with self._lock:
+            self._replace_messages(start, end, list(messages))
 
-    def compact_context(self, provider):
+    def token_count(self, model_name: str) -> int:
+        """
+        Total tokens in the context for a model's encoding. The first call for a
+        new encoding counts every message once; after that it is O(1).
+        """
+        encoding = encoding_name_for_model(model_name)
+        with self._lock:
+            if encoding not in self._token_totals:
+                self._track_encoding(encoding)
+            return self._token_totals[encoding]
+
+    def _track_encoding(self, encoding: str):
+        total = 0
+        for message, counts in zip(self._context, self._token_counts):
+            if encoding not in counts:
+                counts[encoding] = count_message_tokens(message, encoding)
+            total += counts[encoding]
+        self._token_totals[encoding] = total
+
+    def _replace_messages(self, start: int, end: int, messages: List[Dict]):
+        """Replaces context[start:end] with messages, keeping token totals in step."""
+        for counts in self._token_counts[start:end]:
+            for encoding, count in counts.items():
+                self._token_totals[encoding] -= count
+        new_counts = []
+        for message in messages:
+            counts = {}
+            for encoding in self._token_totals:
+                counts[encoding] = count_message_tokens(message, encoding)
+                self._token_totals[encoding] += counts[encoding]
+            new_counts.append(counts)
+        append = start == end == len(self._context) and len(messages) == 1
+        self._context[start:end] = messages
+        self._token_counts[start:end] = new_counts
+        if append:
+            self._emit({"op": "append", "message": messages[0]})
+        else:
+            self._emit({"op": "replace", "start": start, "end": end, "messages": list(messages)})
+
+    def enforce_budget(self, model_name: str, provider=None) -> bool:
+        """
+        Applies the budget policy before a request to model_name.
+        Returns True if the context had to be trimmed or compacted.
         """
-        Summarize the current context to reduce tokens.
+        limit = self.budget.limit_for(model_name)
+        if self.token_count(model_name) <= limit:
+            return False
+
+        if self.budget.strategy == "compact" and provider is not None:
+            self.compact_context(provider)
+            if self.token_count(model_name) <= limit:
+                return True
+
+        encoding = encoding_name_for_model(model_name)
+        with self._lock:
+            start = 0
+            if self.budget.strategy != "sliding_window":
+                # Keep the leading system prompt and the rolling summary
+                summary_index = self._summary_index()
+                if summary_index is not None:
+                    start = summary_index + 1
+                elif self._context and self._context[0]["role"] == "system":
+                    start = 1
+            end = start
+            total = self._token_totals[encoding]
+            # Always keep the newest message, even if it alone is over budget
+            while total > limit and end < len(self._context) - 1:
+                total -= self._token_counts[end][encoding]
+                end += 1
+            if end > start:
+                self._replace_messages(start, end, [])
+        return True
+
+    def compact_context(self, provider, keep_last: int = None, batch_size: int = None):
+        """
+        Rolling compaction: folds the oldest messages into a running summary and
+        keeps the newest keep_last messages verbatim. Only the previous summary
+        and the newly folded messages are sent, never the whole history, and
+        summaries of ranges that were already summarized come from a cache.
         Uses a cheap model from the provider (e.g. "gpt-3.5-turbo" if available).
         """
-        if not self.context:
+        plan = self._plan_compaction(keep_last, batch_size)
+        if plan is None:
             return
+        summary = self._summarize(provider, plan)
+        self._apply_compaction(plan, summary)
 
-        cheap_model = provider.get_cheapest_model()  # a method we'll define
-        prompt_text = (
-            "Summarize the following context in a concise manner, capturing "
-            "the key points and context needed to continue logically:\n\n"
-        )
-        for msg in self.context:
-            prompt_text += f"{msg['role'].upper()}: {msg['content']}\n"
+    def compact_in_background(self, provider, keep_last: int = None, batch_size: int = None,
+                              on_done=None) -> bool:
+        """
+        Runs compact_context on a background thread so chatting can continue.
+        Messages added meanwhile are kept. Returns False if a compaction is
+        already running. on_done(error) is called when it finishes.
+        """
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return False
+
+            def worker():
+                error = None
+                try:
+                    self.compact_context(provider, keep_last, batch_size)
+                except Exception as e:
+                    logger.error(f"Background compaction failed: {e}")
+                    error = e
+                if on_done is not None:
+                    on_done(error)
+
+            self._compaction_thread = threading.Thread(target=worker, daemon=True)
+            self._compaction_thread.start()
+        return True
+
+    def _summary_index(self):
+        """Index of the rolling summary message, or None if nothing was compacted yet."""
+        for index in range(min(2, len(self._context))):
+            message = self._context[index]
+            if message["role"] == "system" and str(message["content"]).startswith(SUMMARY_PREFIX):
+                return index
+        return None
+
+    def _plan_compaction(self, keep_last: int = None, batch_size: int = None):
+        settings = load_config().get("compaction", {})
+        if keep_last is None:
+            keep_last = settings.get("keep_last", DEFAULT_KEEP_LAST)
+        if batch_size is None:
+            batch_size = settings.get("batch_size", DEFAULT_BATCH_SIZE)
+
+        with self._lock:
+            summary_index = self._summary_index()
+            if summary_index is not None:
+                start = summary_index + 1
+            else:
+                # A leading system prompt stays pinned above the summary
+                pinned = self._context and self._context[0]["role"] == "system"
+                start = 1 if pinned else 0
+            end = max(start, len(self._context) - keep_last)
+            if batch_size:
+                end = min(end, start + batch_size)
+            if end <= start:
+                return None
+            return {
+                "summary_index": summary_index,
+                "summary": self._context[summary_index] if summary_index is not None else None,
+                "start": start,
+                "messages": self._context[start:end],
+            }
+
+    def _summarize(self, provider, plan) -> str:
+        previous = plan["summary"]["content"][len(SUMMARY_PREFIX):] if plan["summary"] else ""
+        transcript = "\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in plan["messages"])
+        key = hashlib.sha256(json.dumps([previous, plan["messages"]], sort_keys=True).encode()).hexdigest()
 
-        summary = provider.get_completion(cheap_model, prompt_text)
-        # Replace current context with summarized version
-        self.context = [{"role": "system", "content": summary.strip()}]
+        with _summary_cache_lock:
+            cached = self._summary_cache.get(key)
+            if cached is not None:
+                self._summary_cache.move_to_end(key)
+                return cached
+
+        if previous:
+            prompt_text = (
+                "Update the running summary below with the new conversation messages. Keep it "
+                "concise, capturing the key points and context needed to continue logically.\n\n"
+                f"RUNNING SUMMARY:\n{previous}\n\nNEW MESSAGES:\n{transcript}\n"
+            )
+        else:
+            prompt_text = (
+                "Summarize the following context in a concise manner, capturing "
+                f"the key points and context needed to continue logically:\n\n{transcript}\n"
+            )
+
+        cheap_model = provider.get_cheapest_model()
+        summary = provider.get_completion(cheap_model, prompt_text).strip()
+        with _summary_cache_lock:
+            self._summary_cache[key] = summary
+            if len(self._summary_cache) > SUMMARY_CACHE_SIZE:
+                self._summary_cache.popitem(last=False)
+        return summary
+
+    def _apply_compaction(self, plan, summary: str):
+        summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+        with self._lock:
+            start = plan["start"]
+            end = start + len(plan["messages"])
+            # The context may have changed while the summary was computed (background
+            # compaction, /clear, edits). Only apply it if the folded range is untouched.
+            current = self._context[start:end]
+            if len(current) != len(plan["messages"]) or any(a is not b for a, b in zip(current, plan["messages"])):
+                logger.info("Context changed during compaction; summary discarded")
+                return False
+            if plan["summary_index"] is not None:
+                if self._summary_index() != plan["summary_index"] or self._context[plan["summary_index"]] is not plan["summary"]:
+                    return False
+                start = plan["summary_index"]
+            self._replace_messages(start, end, [summary_message])
+        return True
+
+    @staticmethod
+    def journal_path(session_name: str) -> str:
+        return os.path.join(SESSION_DIR, f"{session_name}.jsonl")
+
+    @staticmethod
+    def legacy_session_path(session_name: str) -> str:
+        """Where sessions were saved, whole, before the journal existed."""
+        return os.path.join(SESSION_DIR, f"{session_name}.json")
+
+    @classmethod
+    def session_exists(cls, session_name: str) -> bool:
+        return (os.path.exists(cls.journal_path(session_name))
+                or os.path.exists(cls.legacy_session_path(session_name)))
+
+    @staticmethod
+    def latest_session() -> str:
+        """Name of the most recently written session, or None."""
+        ensure_session_dir()
+        journals = [name for name in os.listdir(SESSION_DIR) if name.endswith(".jsonl")]
+        if not journals:
+            return None
+        latest = max(journals, key=lambda name: os.path.getmtime(os.path.join(SESSION_DIR, name)))
+        return latest[:-len(".jsonl")]
+
+    @classmethod
+    def search_index(cls):
+        """The search index shared by every session in this process."""
+        from ultra.search_index import SearchIndex
+        if cls._search_index is None:
+            cls._search_index = SearchIndex(os.path.join(SESSION_DIR, "search.db"))
+        return cls._search_index
+
+    def _open_journal(self):
+        from ultra.session_journal import SessionJournal
+        path = self.journal_path(self.session_name)
+        messages, seq = SessionJournal.load(path)
+        legacy_path = self.legacy_session_path(self.session_name)
+        if not seq and os.path.exists(legacy_path):
+            # Sessions saved before the journal existed
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        if messages:
+            self._context = list(messages)
+            self._token_counts = [{} for _ in self._context]
+        self.seq = seq
+
+        settings = load_config().get("session_journal", {})
+        self.journal = SessionJournal(path, search_index=self.search_index(), **settings)
+        self.journal.attach(self)
+        if messages and not seq:
+            # Record the imported messages as the journal's starting point
+            self.journal.flush(snapshot=True)
 
     def save_session(self):
         """
-        Saves context to a JSON file for future reference.
+        Forces the session journal to disk and snapshots it, so resuming it
+        replays nothing.
         """
-        ensure_session_dir()
-        file_path = os.path.join(SESSION_DIR, f"{self.session_name}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(self.context, f, indent=2)
+        if self.journal is None:
+            self._open_journal()
+        self.journal.flush(snapshot=True)
+
+    def close(self):
+        """Flushes and closes the session journal."""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
 
     def export_to_text(self) -> str:
         """
@@ -67,4 +425,4 @@ class ContextManager:
             role = msg["role"].upper()
             content = msg["content"]
             lines.append(f"{role}:\n{content}\n")
-        return "\n".join(lines)
\ No newline at end of file
+        return "\n".join(lines)
@@ -1,9 +1,10 @@
 import sys
 import os
-import pickle
 import re
-import time
 import argparse
+import bisect
+import threading
+from multiprocessing.connection import Client
 
 # Suppress Qt logging
 os.environ['QT_LOGGING_RULES'] = '*.debug=false;*.warning=false'
@@ -11,24 +12,85 @@ os.environ['QT_LOGGING_TO_CONSOLE'] = '0'
 
 from PyQt6 import QtWidgets, QtCore, QtGui
 
+# Must match ultra.context_editor.AUTHKEY_ENV (not imported to keep this script standalone)
+AUTHKEY_ENV = "ULTRA_CONTEXT_AUTHKEY"
+
+# The "ROLE: " header each message is rendered with
+ROLE_HEADER = re.compile(r'([A-Za-z_]+): ')
+
+
+class ContextChannel(QtCore.QObject):
+    """
+    The window's end of the connection to the chat process. A background
+    thread blocks on recv() and hands each event to the Qt thread through a
+    signal, so nothing runs while the conversation is idle.
+    """
+    received = QtCore.pyqtSignal(object)
+    disconnected = QtCore.pyqtSignal()
+
+    def __init__(self, address, authkey):
+        super().__init__()
+        self.conn = Client(address, authkey=authkey)
+        self.seq = 0
+        self._send_lock = threading.Lock()
+
+    def start(self):
+        """Starts receiving; call once the window is connected to the signals."""
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                event = self.conn.recv()
+            except (OSError, EOFError):
+                self.disconnected.emit()
+                return
+            self.received.emit(event)
+
+    def send(self, event):
+        with self._send_lock:
+            self.seq += 1
+            event["seq"] = self.seq
+            self.conn.send(event)
+
+
 class ContextWindow(QtWidgets.QMainWindow):
-    def __init__(self, pickle_path, refresh_interval):
+    def __init__(self, channel):
         super().__init__()
         self.setWindowTitle("Live Context View (Editable)")
-        self.pickle_path = pickle_path
-        self.last_data_hash = None
-        self.last_edit_time = 0
+        self.channel = channel
+        self.context_data = []
+        self.last_seq = 0
         self.is_updating = False
         self.dark_mode = False
+
+        # One anchor cursor per rendered message marking where it starts. Qt moves
+        # the anchors as the document changes, so they stay right even after the
+        # user edits text above them. Text typed right at an anchor stays after
+        # it, so it belongs to the message that starts there.
+        self.blocks = []
+
+        # Indexes of messages the user has edited since they were last rendered or saved
+        self.dirty = set()
+
+        # Terminal updates waiting because they would overwrite unsaved edits, in order
+        self.held = []
+
+        # Shared formats instead of fresh QTextCharFormat objects per message
+        self.role_format = QtGui.QTextCharFormat()
+        self.role_format.setFontWeight(QtGui.QFont.Weight.Bold)
+        self.content_format = QtGui.QTextCharFormat()
+        self.content_format.setFontWeight(QtGui.QFont.Weight.Normal)
         
         # Create a central widget with layout
         central_widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(central_widget)
         
-        # Set up the text display - now editable with rich text support
-        self.text_widget = QtWidgets.QTextEdit()
+        # Set up the text display. QPlainTextEdit only lays out the visible
+        # blocks, so very large contexts stay responsive.
+        self.text_widget = QtWidgets.QPlainTextEdit()
         self.text_widget.setReadOnly(False)
-        self.text_widget.textChanged.connect(self.on_text_edited)
+        self.text_widget.document().contentsChange.connect(self.on_contents_change)
         
         # Set a nice monospaced font for better readability of code blocks
         font = QtGui.QFont("Monaco", 12)
@@ -56,77 +118,222 @@ class ContextWindow(QtWidgets.QMainWindow):
         
         self.setCentralWidget(central_widget)
         self.resize(800, 600)
+
+        self.channel.received.connect(self.on_event)
+        self.channel.disconnected.connect(self.on_disconnected)
+        self.channel.start()
         
-        # Set up the timer for updates
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_text)
-        self.timer.start(refresh_interval)
-        
-        self.update_text()
         self.show()
     
-    def on_text_edited(self):
-        # Track when the last edit happened
-        self.last_edit_time = time.time()
-    
-    def update_text(self):
-        try:
-            # Skip updates if user edited text in the last 2 seconds
-            if time.time() - self.last_edit_time < 2:
+    def on_contents_change(self, position, removed, added):
+        """Marks the messages a user edit touched as dirty."""
+        if self.is_updating or not self.blocks:
+            return
+        starts = [anchor.position() for anchor in self.blocks]
+        first = max(bisect.bisect_right(starts, position) - 1, 0)
+        last = max(bisect.bisect_right(starts, position + max(removed, added)) - 1, 0)
+        self.dirty.update(range(first, last + 1))
+
+    def on_event(self, event):
+        """
+        Applies a delta pushed by the chat process. An update that would
+        re-render a message with unsaved edits is held, along with everything
+        after it, until the user saves.
+        """
+        op = event["op"]
+        if op == "conflict":
+            # The snapshot that follows reloads the window, as the warning says
+            self.dirty.clear()
+            self.held.clear()
+            self.setWindowTitle("Live Context View (Editable)")
+            QtWidgets.QMessageBox.warning(self, "Save Failed",
+                                          "The context changed in the terminal before your save "
+                                          "arrived. The window has been reloaded.")
+            return
+
+        if self.held or self._touched_edits(event):
+            self.held.append(event)
+            if len(self.held) == 1:
+                self.setWindowTitle("Live Context View (Editable) - terminal changes waiting")
+                QtWidgets.QMessageBox.warning(self, "Unsaved Edits",
+                                              "The context changed in the terminal, including messages "
+                                              "you have edited. Your edits are kept; the terminal's "
+                                              "changes are shown once you save.")
+            return
+        self._apply(event)
+
+    def _touched_edits(self, event):
+        """Indexes of messages with unsaved edits that event would re-render."""
+        op = event["op"]
+        if op == "replace":
+            start, end, messages = event["start"], event["end"], event["messages"]
+            if self._is_own_save(start, end, messages):
+                return set()
+            return {i for i in self.dirty if start <= i < end}
+        if op == "snapshot":
+            changed = self._snapshot_range(event["messages"])
+            if changed is None:
+                return set()
+            return {i for i in self.dirty if changed[0] <= i < changed[1]}
+        if op == "clear":
+            return set(self.dirty)
+        return set()
+
+    def _is_own_save(self, start, end, messages):
+        """Whether a replace is our own saved edit coming back, already shown in the document."""
+        region = self._region_text(start, end)
+        rendered = self._render_text(messages)
+        # A message the user deleted may leave blank lines behind
+        return region == rendered or not region.strip() and not rendered
+
+    def _release_held(self, discard=False):
+        """
+        Applies held updates in order. Stops at one that would overwrite unsaved
+        edits, unless discard is set, in which case those edits are dropped.
+        """
+        while self.held:
+            event = self.held[0]
+            touched = self._touched_edits(event)
+            if touched and not discard:
                 return
-                
-            # Avoid recursive updates
-            if self.is_updating:
+            self.dirty.difference_update(touched)
+            self.held.pop(0)
+            self._apply(event)
+        self.setWindowTitle("Live Context View (Editable)")
+
+    def _apply(self, event):
+        op = event["op"]
+        if op != "snapshot" and event["seq"] != self.last_seq + 1:
+            # Missed an update: ask for the whole context again
+            self.channel.send({"op": "resync"})
+            return
+        self.last_seq = event["seq"]
+
+        if op == "snapshot":
+            self.apply_snapshot(event["messages"])
+        elif op == "append":
+            self.update_messages(len(self.context_data), len(self.context_data), [event["message"]])
+        elif op == "replace":
+            start, end, messages = event["start"], event["end"], event["messages"]
+            if end - start == len(messages) and self._is_own_save(start, end, messages):
+                # Our own saved edit coming back: the document already shows it
+                self.context_data[start:end] = messages
+                self.dirty.difference_update(range(start, end))
                 return
-                
+            self.update_messages(start, end, messages)
+        elif op == "clear":
+            self.update_messages(0, len(self.context_data), [])
+
+    def on_disconnected(self):
+        self.setWindowTitle("Live Context View (Disconnected)")
+
+    def apply_snapshot(self, messages):
+        """Re-renders only the messages that differ from what is already shown."""
+        changed = self._snapshot_range(messages)
+        if changed is None:
+            return  # No changes, don't update
+        start, end, new_end = changed
+        self.update_messages(start, end, messages[start:new_end])
+
+    def _snapshot_range(self, messages):
+        """
+        The shown messages [start, end) that differ from messages[start:new_end],
+        as (start, end, new_end), or None if nothing differs.
+        """
+        old = self.context_data
+        prefix = 0
+        while prefix < min(len(old), len(messages)) and old[prefix] == messages[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(old), len(messages)) - prefix
+               and old[-1 - suffix] == messages[-1 - suffix]):
+            suffix += 1
+        if prefix == len(old) == len(messages):
+            return None
+        return prefix, len(old) - suffix, len(messages) - suffix
+
+    @staticmethod
+    def _content_text(msg):
+        content = msg.get("content")
+        if isinstance(content, list):
+            # Multi-part content: show the text parts
+            return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content or ""
+
+    @staticmethod
+    def _header_text(msg):
+        return msg["role"].upper() + ": "
+
+    def _render_text(self, messages):
+        return "".join(self._header_text(msg) + self._content_text(msg) + "\n\n" for msg in messages)
+
+    def _region_text(self, start, end):
+        """Current document text of messages [start, end), including any user edits."""
+        cursor = QtGui.QTextCursor(self.text_widget.document())
+        cursor.setPosition(self._block_position(start))
+        cursor.setPosition(self._block_position(end), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        # selectedText() uses U+2029 for line breaks
+        return cursor.selectedText().replace("\u2029", "\n")
+
+    def _block_position(self, index):
+        """Document position where message index starts (the end for one past the last)."""
+        if index == 0:
+            return 0  # Text typed in front of the first message belongs to it
+        if index < len(self.blocks):
+            return self.blocks[index].position()
+        return self.text_widget.document().characterCount() - 1
+
+    def update_messages(self, start, end, messages):
+        """
+        Replaces messages [start, end) with messages, touching only that part of
+        the document. Appends are the case start == end == len(context_data).
+        """
+        try:
             self.is_updating = True
-            
-            # Reload context from pickle file
-            with open(self.pickle_path, "rb") as f:
-                context_data = pickle.load(f)
-            
-            # Check if data changed to avoid unnecessary updates
-            import hashlib
-            data_hash = hashlib.md5(str(context_data).encode()).hexdigest()
-            if self.last_data_hash == data_hash:
-                self.is_updating = False
-                return  # No changes, don't update
-            self.last_data_hash = data_hash
-            
+            document = self.text_widget.document()
+
             # Check if scrollbar is at the bottom before update
             scrollbar = self.text_widget.verticalScrollBar()
-            was_at_bottom = scrollbar.value() >= scrollbar.maximum() - 20
-                
-            # Update the text content with rich text (HTML) formatting
-            self.text_widget.clear()
-            cursor = self.text_widget.textCursor()
-            
-            for msg in context_data:
-                # Create a bold format for the role
-                bold_format = QtGui.QTextCharFormat()
-                bold_format.setFontWeight(QtGui.QFont.Weight.Bold)
-                
-                # Insert the role in bold
-                cursor.insertText(msg["role"].upper() + ": ", bold_format)
-                
-                # Create normal format for content
-                normal_format = QtGui.QTextCharFormat()
-                normal_format.setFontWeight(QtGui.QFont.Weight.Normal)
-                
-                # Insert the content with normal formatting
-                cursor.insertText(msg["content"] + "\n\n", normal_format)
-            
-            # Ensure cursor is at the end
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
-            
+            was_at_bottom = scrollbar.value() >= scrollbar.maximum() - 1
+
+            # A separate cursor, so the user's own cursor and selection are kept
+            cursor = QtGui.QTextCursor(document)
+            cursor.beginEditBlock()
+            cursor.setPosition(self._block_position(start))
+            cursor.setPosition(self._block_position(end), QtGui.QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+
+            starts = []
+            for msg in messages:
+                starts.append(cursor.position())
+                # Insert the role in bold, then the content with normal formatting
+                cursor.insertText(self._header_text(msg), self.role_format)
+                cursor.insertText(self._content_text(msg) + "\n\n", self.content_format)
+            cursor.endEditBlock()
+
+            # The next message's anchor kept its position through the insert; move it past the new text
+            if end < len(self.blocks):
+                self.blocks[end].setPosition(cursor.position())
+            anchors = []
+            for position in starts:
+                anchor = QtGui.QTextCursor(document)
+                anchor.setPosition(position)
+                anchor.setKeepPositionOnInsert(True)
+                anchors.append(anchor)
+            self.blocks[start:end] = anchors
+            self.context_data[start:end] = messages
+
+            # Re-rendered messages are clean; shift the dirty ones after them
+            shift = len(messages) - (end - start)
+            self.dirty = {i if i < start else i + shift for i in self.dirty if not start <= i < end}
+
             # Only auto-scroll if we were already at the bottom
             if was_at_bottom:
                 scrollbar.setValue(scrollbar.maximum())
-                
-            self.is_updating = False
         except Exception as e:
-            self.is_updating = False
             print(f"Error updating text: {e}")
+        finally:
+            self.is_updating = False
 
     def toggle_dark_mode(self):
         """Toggle between light and dark mode"""
@@ -136,7 +343,7 @@ class ContextWindow(QtWidgets.QMainWindow):
             # Dark mode colors
             self.setStyleSheet("""
                 QMainWindow, QWidget { background-color: #2d2d2d; }
-                QTextEdit { 
+                QPlainTextEdit { 
                     background-color: #2d2d2d; 
                     color: #e0e0e0; 
                     border: 1px solid #555555; 
@@ -154,34 +361,78 @@ class ContextWindow(QtWidgets.QMainWindow):
             # Light mode (default)
             self.setStyleSheet("")
     
+    def parse_message(self, index):
+        """
+        Reads message index back from its part of the document. The text is
+        taken literally, so content that itself looks like "ROLE:" headers is
+        kept as is, and any other keys of the message are carried over.
+        Returns None if the user deleted the whole message.
+        """
+        text = self._region_text(index, index + 1)
+        if not text.strip():
+            return None
+
+        original = self.context_data[index]
+        if text.endswith("\n\n"):
+            text = text[:-2]
+        role = original["role"]
+        header = ROLE_HEADER.match(text)
+        if header:
+            role = header.group(1).lower()
+            text = text[header.end():]
+        if role == original["role"] and text == self._content_text(original):
+            return original
+        return dict(original, role=role, content=self._with_text(original.get("content"), text))
+
+    @staticmethod
+    def _with_text(content, text):
+        """
+        content with its text replaced by text. Multi-part content keeps its
+        other parts (files, images) where they were; the edited text goes in
+        place of the first text part, since the parts were shown joined.
+        """
+        if not isinstance(content, list):
+            return text
+        parts = []
+        placed = False
+        for part in content:
+            if isinstance(part, dict) and part.get("type", "text") == "text" and "text" in part:
+                if not placed:
+                    parts.append(dict(part, text=text))
+                    placed = True
+                continue
+            parts.append(part)
+        if not placed and text:
+            parts.insert(0, {"type": "text", "text": text})
+        return parts
+
     def save_changes(self):
         try:
-            # Parse text back into context format
-            text = self.text_widget.toPlainText()
-            
-            # Simple parsing using regex pattern: "ROLE: content"
-            pattern = r'(USER|ASSISTANT|SYSTEM):\s*(.*?)(?=\n\n[A-Z]+:|$)'
-            matches = re.findall(pattern, text, re.DOTALL)
-            
-            new_context = []
-            for role, content in matches:
-                new_context.append({
-                    'role': role.lower(),
-                    'content': content.strip()
-                })
-            
-            # Save back to pickle file
-            with open(self.pickle_path, "wb") as f:
-                pickle.dump(new_context, f)
-                
-            # Also create a backup file for safety
-            backup_path = self.pickle_path + ".backup"
-            with open(backup_path, "wb") as f:
-                pickle.dump(new_context, f)
-                
-            # Reset the last edit time so we don't immediately override our change
-            self.last_edit_time = time.time()
-            
+            if self.held:
+                # Saving against an outdated context would be rejected; catch up first
+                answer = QtWidgets.QMessageBox.question(
+                    self, "Terminal Changes Waiting",
+                    "The terminal changed messages you have edited. Discard your edits to those "
+                    "messages and load the terminal's version? Your other edits are saved.")
+                if answer != QtWidgets.QMessageBox.StandardButton.Yes:
+                    return
+                self._release_held(discard=True)
+
+            # Only the messages the user touched are read back and sent
+            changes = []
+            for index in sorted(self.dirty):
+                message = self.parse_message(index)
+                if message is self.context_data[index]:
+                    continue
+                changes.append({"start": index, "end": index + 1,
+                                "messages": [message] if message is not None else []})
+
+            if changes:
+                # Applied last to first so earlier indexes stay valid
+                changes.reverse()
+                # The chat process echoes each change back as a replace event
+                self.channel.send({"op": "update", "base": self.last_seq, "changes": changes})
+
             QtWidgets.QMessageBox.information(self, "Save Successful", 
                                             "Your changes have been saved.")
         except Exception as e:
@@ -190,12 +441,12 @@ class ContextWindow(QtWidgets.QMainWindow):
 
 def main():
     parser = argparse.ArgumentParser(description='Context Viewer')
-    parser.add_argument('--pickle-path', required=True, help='Path to the pickle file')
-    parser.add_argument('--refresh-interval', type=int, default=1000, help='Refresh interval in ms')
+    parser.add_argument('--address', required=True, help='Address of the chat process context channel')
     args = parser.parse_args()
     
     app = QtWidgets.QApplication([])
-    window = ContextWindow(args.pickle_path, args.refresh_interval)
+    channel = ContextChannel(args.address, bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    window = ContextWindow(channel)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
@@ -9,7 +9,7 @@ from ultra.opener import open_video
 logger = logging.getLogger(__name__)
 
 
-def write_styled_docx(json_file: str):
+def write_styled_docx(json_file: str, open_output: bool = True):
     # Load metadata from the JSON file
     with open(json_file, "r") as jf:
         data = json.load(jf)
@@ -89,8 +89,9 @@ def write_styled_docx(json_file: str):
     # Save and open the document
     doc.save(output_path)
     logger.info(f"Document has been created: {output_path}")
-    os.system(f"open {output_path}")
-    open_video(data["id"])
+    if open_output:
+        os.system(f"open {output_path}")
+        open_video(data["id"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+Fan-out: the same conversation sent to several models at once, to compare
+their answers.
+
+    /fanout gpt-4o,gpt-4o-mini                  # answer the conversation so far
+    /fanout gpt-4o,gpt-4o-mini What is a monad? # ask a question without adding it to the session
+    /fanout gpt-4o,o3-mini --sequential         # print each answer as it finishes
+
+All models stream concurrently through the current provider. With room for
+at least MIN_COLUMN_WIDTH characters per model, the answers are shown side by
+side as they stream. Otherwise, or with --sequential, each answer is printed
+as soon as it is complete. A table of time to first token, latency, tokens
+and tokens per second per model follows. The requests are also recorded in
+the metrics store (see ultra/metrics.py). Fan-out answers are not added to
+the session.
+"""
+import time
+import asyncio
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Narrower columns than this are unreadable; fall back to one answer after another
+MIN_COLUMN_WIDTH = 40
+
+
+class FanoutResult:
+    """One model's answer and its timing."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.chunks = []
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+        self.error = None
+        self.stopped = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    @property
+    def ttft(self):
+        return self.first_token - self.started if self.first_token else None
+
+    @property
+    def latency(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def tokens(self) -> int:
+        from ultra.tokens import count_text_tokens, encoding_name_for_model
+        return count_text_tokens(self.text, encoding_name_for_model(self.model))
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return f"failed: {type(self.error).__name__}"
+        if self.stopped:
+            return "stopped"
+        if self.finished is None:
+            return "streaming" if self.first_token else "waiting"
+        return "done"
+
+
+def parse_fanout_args(args: str):
+    """
+    Splits "/fanout" arguments into (models, layout, question). layout is
+    "columns", "sequential" or "auto"; question is None when not given.
+    """
+    parts = args.split()
+    if not parts:
+        raise ValueError("Usage: /fanout model1,model2,... [--columns | --sequential] [question]")
+    models = [model for model in parts[0].split(",") if model]
+    if len(models) < 2:
+        raise ValueError("Give at least two comma-separated models, e.g. /fanout gpt-4o,gpt-4o-mini")
+    layout = "auto"
+    words = []
+    for word in parts[1:]:
+        if word in ("--columns", "--sequential"):
+            layout = word[2:]
+        else:
+            words.append(word)
+    return models, layout, " ".join(words) or None
+
+
+async def _stream(provider, result: FanoutResult, messages: list, on_token=None, on_done=None):
+    try:
+        async for token in provider.astream_completion(result.model, messages):
+            if result.first_token is None:
+                result.first_token = time.perf_counter()
+            result.chunks.append(token)
+            if on_token is not None:
+                on_token(result)
+    except asyncio.CancelledError:
+        result.stopped = True
+        raise
+    except Exception as e:
+        # One model failing doesn't stop the others
+        result.error = e
+        logger.warning(f"Fan-out to {result.model} failed: {e}")
+    finally:
+        result.finished = time.perf_counter()
+    if on_done is not None:
+        on_done(result)
+
+
+async def fanout(provider, models: List[str], messages: list, on_token=None, on_done=None) -> List[FanoutResult]:
+    """
+    Streams messages to every model concurrently. on_token(result) is called
+    for each token, on_done(result) when a model finishes or fails. If
+    cancelled, the results keep whatever arrived before.
+    """
+    results = [FanoutResult(model) for model in models]
+    await _gather(provider, results, messages, on_token, on_done)
+    return results
+
+
+async def _gather(provider, results: List[FanoutResult], messages: list, on_token=None, on_done=None):
+    tasks = [asyncio.ensure_future(_stream(provider, result, messages, on_token, on_done)) for result in results]
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        # gather() gives up at the first cancelled stream; wait until every one has stopped
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        raise
+
+
+def _columns_view(results: List[FanoutResult], height: int):
+    """The last lines of every answer side by side, for the live display."""
+    from rich.table import Table
+    from rich.text import Text
+
+    table = Table(expand=True)
+    for result in results:
+        table.add_column(f"{result.model} [dim]({result.status})[/dim]", ratio=1, overflow="fold")
+    table.add_row(*(Text("\n".join(result.text.splitlines()[-height:])) for result in results))
+    return table
+
+
+def _status_view(results: List[FanoutResult]):
+    from rich.text import Text
+    lines = [f"{result.model}: {result.status}, {len(result.chunks)} chunks, {result.latency:.1f}s"
+             for result in results if result.finished is None]
+    return Text("\n".join(lines), style="dim")
+
+
+def print_fanout_summary(results: List[FanoutResult], console):
+    from rich.table import Table
+
+    table = Table(title="Fan-out")
+    table.add_column("Model")
+    table.add_column("TTFT", justify="right")
+    table.add_column("Latency", justify="right")
+    table.add_column("Tokens", justify="right")
+    table.add_column("Tokens/s", justify="right")
+    table.add_column("Status")
+    for result in results:
+        tokens = result.tokens
+        generating = result.latency - (result.ttft or 0)
+        table.add_row(result.model,
+                      f"{result.ttft * 1000:.0f} ms" if result.ttft is not None else "-",
+                      f"{result.latency:.2f}s",
+                      str(tokens),
+                      f"{tokens / generating:.0f}" if tokens and generating > 0 else "-",
+                      result.status)
+    console.print(table)
+
+
+async def run_fanout(provider, models: List[str], messages: list, console, layout: str = "auto") -> List[FanoutResult]:
+    """Runs a fan-out with a live display, then prints the answers and the summary table."""
+    from rich.live import Live
+    from rich.panel import Panel
+    from rich.table import Table
+
+    if layout == "auto":
+        layout = "columns" if console.width // len(models) >= MIN_COLUMN_WIDTH else "sequential"
+    height = max(3, console.height - 8)
+    results = [FanoutResult(model) for model in models]
+
+    def view():
+        return _columns_view(results, height) if layout == "columns" else _status_view(results)
+
+    def on_done(result: FanoutResult):
+        if layout == "sequential" and not result.stopped:
+            # Printed above the live status lines as soon as this answer is complete
+            console.print(Panel(_body(result), title=f"{result.model} ({result.latency:.1f}s)", title_align="left"))
+
+    stopped = False
+    with Live(console=console, refresh_per_second=10, get_renderable=view, transient=True):
+        try:
+            await _gather(provider, results, messages, on_done=on_done)
+        except asyncio.CancelledError:
+            # Ctrl-C stops every stream; what arrived so far is still shown
+            stopped = True
+    if stopped:
+        console.print("[dim](stopped)[/dim]")
+    if layout == "columns":
+        table = Table(expand=True)
+        for result in results:
+            table.add_column(f"{result.model} ({result.latency:.1f}s)", ratio=1)
+        table.add_row(*(_body(result) for result in results))
+        console.print(table)
+    else:
+        for result in results:
+            if result.stopped:
+                console.print(Panel(_body(result), title=f"{result.model} (stopped)", title_align="left"))
+    print_fanout_summary(results, console)
+    return results
+
+
+def _body(result: FanoutResult):
+    from rich.markdown import Markdown
+    from rich.markup import escape
+    if result.error is not None:
+        return f"[red]{escape(str(result.error))}[/red]"
+    return Markdown(result.text)
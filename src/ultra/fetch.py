@@ -0,0 +1,125 @@
+import os
+import glob
+import json
+import shlex
+import shutil
+import subprocess
+import logging
+from ultra.config import load_config
+
+logger = logging.getLogger(__name__)
+
+# Overridable with ULTRA_YT_DLP, e.g. to point at a fake yt-dlp for testing
+YT_DLP_ENV = "ULTRA_YT_DLP"
+
+USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/127.0.0.0 Safari/537.36 Edg/127.0.0.0")
+
+# Prefer streams that mux into mp4 without re-encoding
+VIDEO_FORMAT = "bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv*+ba/b"
+
+
+def yt_dlp_executable() -> str:
+    return os.environ.get(YT_DLP_ENV) or load_config().get("yt_dlp", {}).get("executable", "yt-dlp")
+
+
+def download_video_default() -> bool:
+    """Whether /transcribe also keeps the video ("transcription.download_video" in config.json)."""
+    return load_config().get("transcription", {}).get("download_video", True)
+
+
+class FetchError(RuntimeError):
+    pass
+
+
+class VideoFetch:
+    """
+    Fetches what the /transcribe stages need from one URL with a single
+    yt-dlp run: the info dict, the audio as mp3, and (unless download_video
+    is off) the video as mp4. The video is remuxed rather than recoded, and
+    the mp3 is extracted from it, so nothing is downloaded twice.
+
+    Nothing runs until a stage asks: `info` alone only resolves metadata
+    (no download), and audio_path() runs the download.
+    """
+
+    def __init__(self, url: str, download_video: bool = None, executable: str = None,
+                 audio_dir: str = "audio", video_dir: str = "video"):
+        self.url = url
+        self.download_video = download_video_default() if download_video is None else download_video
+        self.executable = executable or yt_dlp_executable()
+        self.audio_dir = audio_dir
+        self.video_dir = video_dir
+        self._info = None
+        self._audio_path = None
+
+    @property
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = self._run(download=False)
+        return self._info
+
+    @property
+    def video_id(self) -> str:
+        return self.info["id"]
+
+    def audio_path(self) -> str:
+        if self._audio_path is None:
+            self._info = self._run(download=True)
+            self._audio_path = os.path.join(self.audio_dir, f"{self._info['id']}.mp3")
+            if not os.path.exists(self._audio_path):
+                raise FetchError(f"yt-dlp did not produce {self._audio_path}")
+        return self._audio_path
+
+    def video_path(self):
+        """The downloaded video file, or None if video was skipped."""
+        if not self.download_video:
+            return None
+        matches = [path for path in glob.glob(os.path.join(self.video_dir, f"{self.info['id']}.*"))
+                   if not path.endswith(".mp3")]
+        return matches[0] if matches else None
+
+    def _command(self, download: bool) -> list:
+        command = [self.executable, "--dump-json", "--user-agent", USER_AGENT, "--no-playlist"]
+        if not download:
+            return command + ["--skip-download", self.url]
+
+        command.append("--no-simulate")
+        if self.download_video:
+            # Keep the mp4 after extracting the audio from it
+            command += ["-f", VIDEO_FORMAT, "--merge-output-format", "mp4", "--keep-video",
+                        "-o", os.path.join(self.video_dir, "%(id)s.%(ext)s")]
+        else:
+            command += ["-f", "bestaudio/best", "-o", os.path.join(self.audio_dir, "%(id)s.%(ext)s")]
+        return command + ["--extract-audio", "--audio-format", "mp3", self.url]
+
+    def _run(self, download: bool) -> dict:
+        os.makedirs(self.audio_dir, exist_ok=True)
+        if download and self.download_video:
+            os.makedirs(self.video_dir, exist_ok=True)
+        command = self._command(download)
+        logger.info("Running command:")
+        logger.info(" ".join(shlex.quote(arg) for arg in command))
+
+        try:
+            # Output is captured, so this is safe to run from several threads at once
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"yt-dlp failed: {e.stderr}")
+            raise FetchError(f"yt-dlp failed for {self.url}: {e.stderr.strip()[-500:]}") from e
+        if result.stderr:
+            logger.debug(result.stderr)
+
+        info = None
+        for line in result.stdout.splitlines():
+            if line.startswith("{"):
+                info = json.loads(line)
+        if info is None:
+            raise FetchError(f"yt-dlp printed no metadata for {self.url}")
+
+        if download and self.download_video:
+            # The audio was extracted next to the video; move it where the audio stage expects it
+            extracted = os.path.join(self.video_dir, f"{info['id']}.mp3")
+            if os.path.exists(extracted):
+                shutil.move(extracted, os.path.join(self.audio_dir, f"{info['id']}.mp3"))
+        return info
@@ -2,6 +2,7 @@
 import logging
 import os
 import io
+import threading
 from contextlib import redirect_stdout, redirect_stderr
 
 
@@ -29,6 +30,11 @@ def configure_logging(log_file="logs/transcribe.log", level=logging.DEBUG):
 
 
 
+# redirect_stdout swaps the process-wide sys.stdout, so overlapping calls from
+# different threads would leave it pointing at another call's buffer
+_redirect_lock = threading.RLock()
+
+
 def redirect_nested_logs(func, *args, **kwargs):
     """
     Redirects stdout and stderr from a function call to the caller's logger.
@@ -39,7 +45,7 @@ def redirect_nested_logs(func, *args, **kwargs):
     logger = kwargs.pop('logger', logging.getLogger(__name__))
     stdout_buf = io.StringIO()
     stderr_buf = io.StringIO()
-    with redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
+    with _redirect_lock, redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
         result = func(*args, **kwargs)
     stdout_val = stdout_buf.getvalue()
     stderr_val = stderr_buf.getvalue()
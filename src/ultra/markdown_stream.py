@@ -0,0 +1,177 @@
+import re
+from typing import List, Optional
+
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.segment import SegmentLines
+
+# Opening/closing code fences (``` or ~~~, at most three spaces of indent)
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+# ATX headings are always single-line blocks
+HEADING_RE = re.compile(r"^ {0,3}#{1,6}(\s|$)")
+
+
+class _TailView:
+    """
+    Renderable for the open tail block.
+
+    The markdown is parsed lazily when Live refreshes (at most
+    ``refresh_per_second`` times), not once per token, and the parse is cached
+    until the tail changes. While streaming only the bottom of the block is
+    shown so a long code block scrolls instead of being cut off.
+    """
+
+    def __init__(self, stream: "StreamingMarkdown"):
+        self.stream = stream
+        self._source = None
+        self._markdown = None
+
+    def markdown(self) -> Markdown:
+        source = self.stream.tail_source()
+        if source != self._source:
+            self._source = source
+            self._markdown = Markdown(source)
+        return self._markdown
+
+    def __rich_console__(self, console, options):
+        lines = self.stream.render_block(self.markdown(), options)
+        if not self.stream.finished:
+            height = max(1, (options.height or console.height) - 1)
+            lines = lines[-height:]
+        yield SegmentLines(lines, new_lines=True)
+
+
+class StreamingMarkdown:
+    """
+    Renders a streamed markdown reply incrementally.
+
+    Tokens are appended to a buffer. Whenever a markdown block is complete
+    (a paragraph closed by a blank line, a heading, or a fenced code block
+    closed by its fence) it is printed once above the live display and never
+    parsed again; only the open tail block is re-parsed on refresh.
+
+    Usage:
+        with StreamingMarkdown(console) as stream:
+            for token in provider.stream_completion(model, messages):
+                stream.feed(token)
+        full_response = stream.text
+    """
+
+    def __init__(self, console: Console, refresh_per_second: int = 20):
+        self.console = console
+        self.refresh_per_second = refresh_per_second
+        self.finished = False
+        self.blocks_printed = 0
+        self._chunks: List[str] = []
+        self._tail = ""
+        self._scan = 0            # offset in the tail up to which whole lines were scanned
+        self._fence = None        # (char, length) of the currently open code fence
+        self._blank_at = None     # tail offset just past a blank line outside a fence
+        self._view = _TailView(self)
+        self._live: Optional[Live] = None
+
+    @property
+    def text(self) -> str:
+        """The full response received so far."""
+        return "".join(self._chunks)
+
+    def tail_source(self) -> str:
+        """Markdown source of the block that is still open."""
+        return self._tail
+
+    def start(self):
+        self._live = Live(
+            self._view,
+            console=self.console,
+            refresh_per_second=self.refresh_per_second,
+        )
+        self._live.start()
+
+    def feed(self, chunk: str):
+        """Append a streamed token and freeze any blocks it completes."""
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        self._tail += chunk
+        self._scan_lines()
+
+    def finish(self) -> str:
+        """Render whatever is left of the tail in full and stop the live display."""
+        self.finished = True
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        elif self._tail.strip():
+            self.console.print(self._view.markdown())
+        return self.text
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+        return False
+
+    def render_block(self, markdown: Markdown, options) -> list:
+        """
+        Render a block to lines, separated from the previous block by the same
+        gap Markdown would have put between them in a single document.
+        """
+        lines = self.console.render_lines(markdown, options.update(height=None), pad=False)
+        if self.blocks_printed and lines and "".join(seg.text for seg in lines[0]):
+            lines.insert(0, [])
+        return lines
+
+    def _scan_lines(self):
+        while True:
+            newline = self._tail.find("\n", self._scan)
+            if newline == -1:
+                return
+            line_start = self._scan
+            line = self._tail[line_start:newline]
+            self._scan = newline + 1
+
+            if self._fence is not None:
+                # Inside a code block only the matching closing fence matters
+                stripped = line.strip()
+                char, length = self._fence
+                if stripped and set(stripped) == {char} and len(stripped) >= length:
+                    self._fence = None
+                    self._freeze(self._scan)
+                continue
+
+            if not line.strip():
+                if self._tail[:line_start].strip():
+                    self._blank_at = self._scan
+                continue
+
+            if self._blank_at is not None:
+                blank_at, self._blank_at = self._blank_at, None
+                # Indented lines may continue a list item or code block
+                if not line[0].isspace():
+                    self._freeze(blank_at)
+                    line_start -= blank_at
+
+            fence = FENCE_RE.match(line)
+            if fence:
+                self._freeze(line_start)
+                marker = fence.group(1)
+                self._fence = (marker[0], len(marker))
+            elif HEADING_RE.match(line):
+                self._freeze(line_start)
+                self._freeze(self._scan)
+
+    def _freeze(self, offset: int):
+        """Print the tail up to ``offset`` as a finished block."""
+        if offset <= 0:
+            return
+        block, self._tail = self._tail[:offset], self._tail[offset:]
+        self._scan -= offset
+        if self._blank_at is not None:
+            self._blank_at = max(0, self._blank_at - offset) or None
+        if block.strip():
+            lines = self.render_block(Markdown(block), self.console.options)
+            self.console.print(SegmentLines(lines, new_lines=True))
+            self.blocks_printed += 1
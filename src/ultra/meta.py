@@ -1,49 +1,44 @@
 import os
-import subprocess
 import json
-import shlex
+import shutil
 #from thumbnail import download_thumbnail  # Import the thumbnail downloader
 import logging
-from ultra.logging_config import redirect_nested_logs
 from datetime import datetime
 
 
 logger = logging.getLogger(__name__)
 
 
-def download_video_info(url: str) -> str:
-    
-    # Ensure the 'video' directory exists or create it
-    os.makedirs("video", exist_ok=True)
-    
-    # Build the command using the user-agent (no cookies used)
-    command = [
-        "yt-dlp",
-        "--recode-video", "mp4",
-        #"--skip-download",
-        "--print-json",
-        "--user-agent", "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36 Edg/127.0.0.0",
-        "--output", "video/%(id)s.%(ext)s",
-        url,
-    ]
-    
-    logger.info("Running command:")
-    logger.info(" ".join(shlex.quote(arg) for arg in command))
-    
-    try:
-        result = redirect_nested_logs(subprocess.run, command, capture_output=True, text=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print("yt-dlp failed:")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        return
-    
-    info_str = result.stdout.strip()
-    
+# Bump when the fields saved in custom-<id>.json change, so cached copies are rebuilt
+METADATA_FORMAT = 1
+
+
+def download_video_info(url: str, fetch=None) -> str:
+    """
+    Saves the video's processed metadata to json/custom-<id>.json. A cached
+    copy is used when there is one; otherwise the metadata comes from fetch
+    (an ultra.fetch.VideoFetch shared with the audio stage), so yt-dlp only
+    runs once per video.
+    """
+    from ultra.audio import video_id_from_url
+    from ultra.fetch import VideoFetch, FetchError
+    from ultra.stage_cache import StageCache
+
+    cache = StageCache()
+    url_video_id = video_id_from_url(url)
+    if url_video_id:
+        cached_path = cache.get(cache.key("metadata", url_video_id, format=METADATA_FORMAT))
+        if cached_path is not None:
+            os.makedirs("json", exist_ok=True)
+            custom_json_filename = f"json/custom-{url_video_id}.json"
+            shutil.copyfile(cached_path, custom_json_filename)
+            logger.info(f"Using cached metadata for {url_video_id}")
+            return custom_json_filename
+
     try:
-        info_dict = json.loads(info_str)
-    except json.JSONDecodeError:
-        logger.info("Failed to parse JSON output.")
+        info_dict = (fetch or VideoFetch(url)).info
+    except FetchError as e:
+        print(f"yt-dlp failed: {e}")
         return
 
     # Use video id for naming
@@ -102,6 +97,7 @@ def download_video_info(url: str) -> str:
     # download_thumbnail(video_thumbnail, video_id)
     
     process_custom_json(custom_json_filename)
+    cache.put(cache.key("metadata", video_id, format=METADATA_FORMAT), custom_json_filename)
     return custom_json_filename
 
 def numbers_to_strings(data):
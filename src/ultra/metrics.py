@@ -0,0 +1,264 @@
+"""
+Per-request latency and throughput metrics for provider calls.
+
+Every chat stream, completion and transcript formatting request is recorded
+in ~/.ultra/metrics.db: time to first token, total latency, prompt and
+completion tokens, tokens per second, retries, cache hits and errors. Token
+counts come from the API's usage report when there is one, otherwise they
+are estimated at four characters per token.
+
+    ultra stats                  # p50/p95/p99 per model (also /stats in a chat)
+    ultra stats --days 1
+
+Turned off with "metrics": {"enabled": false} in config.json.
+"""
+import os
+import math
+import time
+import sqlite3
+import threading
+import logging
+from ultra.config import CONFIG_DIR, ensure_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+METRICS_DB = os.path.join(CONFIG_DIR, "metrics.db")
+
+# Overridable with "metrics": {"enabled": ..., "retention_days": ...} in config.json
+DEFAULT_RETENTION_DAYS = 30
+
+PERCENTILES = (50, 95, 99)
+
+# Recorded as the error of a stream the caller stopped reading; not counted as a failure
+CANCELLED = "cancelled"
+
+
+def percentile(sorted_values: list, p: float):
+    """Nearest-rank percentile of an already sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(len(sorted_values) * p / 100))
+    return sorted_values[rank - 1]
+
+
+def _approx_tokens(chars: int) -> int:
+    return (chars + 3) // 4
+
+
+def _message_chars(messages: list) -> int:
+    chars = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chars += len(content)
+    return chars
+
+
+class RequestMetrics:
+    """One provider request, filled in as it runs and stored by finish()."""
+
+    def __init__(self, store, provider: str, model: str, kind: str, messages: list):
+        self.store = store
+        self.provider = provider
+        self.model = model
+        self.kind = kind
+        self.prompt_chars = _message_chars(messages)
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.completion_chars = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = False
+
+    def token(self, text: str):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.completion_chars += len(text)
+
+    def usage(self, usage):
+        """Takes the exact token counts from an API usage report."""
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        ended = time.perf_counter()
+        completion_tokens = self.completion_tokens
+        if completion_tokens is None:
+            completion_tokens = _approx_tokens(self.completion_chars)
+        # Generation rate: from the first token when streamed, over the whole request otherwise
+        generating = ended - (self.first_token or self.started)
+        tokens_per_second = completion_tokens / generating if completion_tokens and generating > 0 else None
+        if isinstance(error, BaseException):
+            error = type(error).__name__
+        self.store.record({
+            "ts": int(time.time()),
+            "provider": self.provider,
+            "model": self.model,
+            "kind": self.kind,
+            "ttft_ms": round((self.first_token - self.started) * 1000) if self.first_token else None,
+            "latency_ms": round((ended - self.started) * 1000),
+            "prompt_tokens": self.prompt_tokens if self.prompt_tokens is not None
+            else _approx_tokens(self.prompt_chars),
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": tokens_per_second,
+            "retries": self.retries,
+            "cache_hit": int(self.cache_hit),
+            "error": error,
+        })
+
+
+class _NoMetrics:
+    """Stands in for the store when metrics are turned off."""
+
+    def record(self, row: dict):
+        pass
+
+
+COLUMNS = ("ts", "provider", "model", "kind", "ttft_ms", "latency_ms", "prompt_tokens", "completion_tokens",
+           "tokens_per_second", "retries", "cache_hit", "error")
+
+
+class MetricsStore:
+    """
+    SQLite table of request metrics, one row per request. Rows older than
+    retention_days are pruned when the store is opened.
+    """
+
+    def __init__(self, path: str = METRICS_DB, retention_days: float = DEFAULT_RETENTION_DAYS):
+        ensure_config_dir()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS requests ("
+                               "ts INTEGER NOT NULL, provider TEXT, model TEXT, kind TEXT, ttft_ms INTEGER, "
+                               "latency_ms INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER, "
+                               "tokens_per_second REAL, retries INTEGER, cache_hit INTEGER, error TEXT)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS requests_ts ON requests (ts)")
+            self._conn.execute("DELETE FROM requests WHERE ts < ?", (time.time() - retention_days * 86400,))
+
+    @classmethod
+    def from_config(cls, path: str = METRICS_DB) -> "MetricsStore":
+        settings = dict(load_config().get("metrics", {}))
+        settings.pop("enabled", None)
+        return cls(path, **settings)
+
+    def record(self, row: dict):
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(f"INSERT INTO requests ({', '.join(COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                                   tuple(row.get(column) for column in COLUMNS))
+        except sqlite3.Error as e:
+            # Metrics must never fail the request they describe
+            logger.warning(f"Could not record request metrics: {e}")
+
+    def rows(self, since: float = 0) -> list:
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM requests WHERE ts >= ?", (since,))
+            return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    def summary(self, since: float = 0) -> list:
+        """One dict per (model, kind) with request counts and latency percentiles."""
+        groups = {}
+        for row in self.rows(since):
+            groups.setdefault((row["model"], row["kind"]), []).append(row)
+        summary = []
+        for (model, kind), rows in sorted(groups.items(), key=lambda item: (item[0][0] or "", item[0][1] or "")):
+            fresh = [row for row in rows if not row["cache_hit"] and not row["error"]]
+            entry = {
+                "model": model,
+                "kind": kind,
+                "requests": len(rows),
+                "errors": sum(1 for row in rows if row["error"] and row["error"] != CANCELLED),
+                "cache_hits": sum(row["cache_hit"] or 0 for row in rows),
+                "retries": sum(row["retries"] or 0 for row in rows),
+                "prompt_tokens": sum(row["prompt_tokens"] or 0 for row in rows),
+                "completion_tokens": sum(row["completion_tokens"] or 0 for row in rows),
+            }
+            # Percentiles over requests that reached the API and succeeded
+            for name in ("ttft_ms", "latency_ms", "tokens_per_second"):
+                values = sorted(row[name] for row in fresh if row[name] is not None)
+                entry[name] = {p: percentile(values, p) for p in PERCENTILES}
+            summary.append(entry)
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def shared_metrics_store():
+    """The process-wide store every provider records into (a no-op one if metrics are off)."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            if load_config().get("metrics", {}).get("enabled", True):
+                _shared_store = MetricsStore.from_config()
+            else:
+                _shared_store = _NoMetrics()
+        return _shared_store
+
+
+def parse_days(args: list):
+    """The value given to --days in args, or None; ValueError if it is missing or not a positive number."""
+    if "--days" not in args:
+        return None
+    position = args.index("--days")
+    if position + 1 >= len(args):
+        raise ValueError("--days needs a number")
+    days = float(args[position + 1])
+    if not days > 0:
+        raise ValueError("--days must be positive")
+    return days
+
+
+def print_stats(days: float = None):
+    from rich.table import Table
+    from ultra.utils import console
+
+    store = shared_metrics_store()
+    if not isinstance(store, MetricsStore):
+        console.print("[dim]Request metrics are turned off (\"metrics\": {\"enabled\": false} in config.json)[/dim]")
+        return
+    since = time.time() - days * 86400 if days else 0
+    summary = store.summary(since)
+    if not summary:
+        console.print("[dim]No requests recorded yet[/dim]")
+        return
+
+    def spread(values: dict, scale: str = "{:.0f}") -> str:
+        return " / ".join("-" if values[p] is None else scale.format(values[p]) for p in PERCENTILES)
+
+    period = f"last {days:g} days" if days else "all recorded"
+    table = Table(title=f"Provider requests ({period}; p50 / p95 / p99)")
+    table.add_column("Model")
+    table.add_column("Kind")
+    table.add_column("Requests", justify="right")
+    table.add_column("Errors", justify="right")
+    table.add_column("Cached", justify="right")
+    table.add_column("Retries", justify="right")
+    table.add_column("TTFT ms", justify="right")
+    table.add_column("Latency ms", justify="right")
+    table.add_column("Tokens/s", justify="right")
+    table.add_column("Tokens in / out", justify="right")
+    for entry in summary:
+        table.add_row(entry["model"] or "-", entry["kind"] or "-", str(entry["requests"]), str(entry["errors"]),
+                      str(entry["cache_hits"]), str(entry["retries"]), spread(entry["ttft_ms"]),
+                      spread(entry["latency_ms"]), spread(entry["tokens_per_second"]),
+                      f"{entry['prompt_tokens']} / {entry['completion_tokens']}")
+    console.print(table)
+    console.print(f"[dim]{store.path}[/dim]")
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import threading
+import logging
+from typing import List
+from ultra.config import MODELS_CACHE_FILE, ensure_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+# How long a cached model list is considered fresh (overridable with "model_cache_ttl" in config.json)
+DEFAULT_MODEL_CACHE_TTL = 24 * 60 * 60
+
+
+class ModelCatalog:
+    """
+    Persistent cache of each provider's model list, stored in ~/.ultra/models.json.
+
+    Cached lists are returned immediately. Once an entry is older than the TTL it
+    is still returned, but a background thread refreshes it for next time
+    (stale-while-revalidate). Only a missing entry or an explicit refresh blocks
+    on the provider.
+    """
+
+    _lock = threading.Lock()
+    _refreshing = set()
+
+    def __init__(self, path: str = MODELS_CACHE_FILE, ttl: float = None):
+        self.path = path
+        if ttl is None:
+            ttl = load_config().get("model_cache_ttl", DEFAULT_MODEL_CACHE_TTL)
+        self.ttl = ttl
+
+    @staticmethod
+    def cache_key(provider) -> str:
+        base_url = getattr(provider, "base_url", None)
+        return f"{provider.short_name()}@{base_url}" if base_url else provider.short_name()
+
+    def get_models(self, provider, refresh: bool = False) -> List[str]:
+        """
+        Returns the model list for a provider, from cache when possible.
+        """
+        key = self.cache_key(provider)
+        entry = None if refresh else self._load().get(key)
+        if entry is None:
+            return self.refresh(provider)
+
+        if time.time() - entry.get("fetched_at", 0) > self.ttl:
+            self.refresh_in_background(provider)
+        return entry["models"]
+
+    def refresh(self, provider) -> List[str]:
+        """Fetches the model list from the provider and stores it."""
+        models = provider.list_models()
+        key = self.cache_key(provider)
+        with self._lock:
+            data = self._load()
+            data[key] = {"fetched_at": time.time(), "models": models}
+            self._save(data)
+        return models
+
+    def refresh_in_background(self, provider):
+        key = self.cache_key(provider)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def worker():
+            try:
+                self.refresh(provider)
+                logger.info(f"Refreshed cached model list for {key}")
+            except Exception as e:
+                logger.error(f"Background model list refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data: dict):
+        # Write then rename so a crash or a concurrent reader never sees a partial file
+        ensure_config_dir()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
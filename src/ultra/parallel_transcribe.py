@@ -0,0 +1,183 @@
+"""
+Parallel Whisper transcription of long audio.
+
+The decoded audio is cut into chunks at quiet points, each chunk padded with
+a little overlap on both sides, and the chunks are transcribed across a pool
+of worker processes that each load the model once. The segments are then
+stitched back in order: a segment is kept only by the chunk whose own
+(unpadded) span contains its midpoint, which drops the words transcribed
+twice in the overlaps.
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000             # whisper.audio.SAMPLE_RATE
+DEFAULT_CHUNK_SECONDS = 120.0   # target chunk length
+DEFAULT_SEARCH_SECONDS = 10.0   # how far from the target a cut may move to find silence
+DEFAULT_OVERLAP_SECONDS = 2.0   # audio shared with each neighbouring chunk
+FRAME_SECONDS = 0.03            # resolution of the silence search
+
+# The worker process's model, loaded once by _init_worker
+_worker_model = None
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def load_audio(audio_file: str):
+    """
+    Decodes audio_file to 16 kHz mono float32 samples with ffmpeg, as
+    whisper.load_audio does, without importing whisper (and torch) here.
+    """
+    import subprocess
+    import numpy as np
+
+    command = ["ffmpeg", "-nostdin", "-threads", "0", "-i", audio_file,
+               "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        output = subprocess.run(command, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='replace')}") from e
+    return np.frombuffer(output, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def find_cut_points(audio, chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+                    search_seconds: float = DEFAULT_SEARCH_SECONDS) -> List[int]:
+    """
+    Returns sample offsets where the audio should be cut, roughly every
+    chunk_seconds, each moved to the quietest frame within search_seconds.
+    """
+    import numpy as np
+
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return []
+    energy = np.sqrt(np.mean(np.square(audio[:frame_count * frame].reshape(frame_count, frame)), axis=1))
+
+    cuts = []
+    target = chunk_seconds
+    total_seconds = len(audio) / SAMPLE_RATE
+    # Leave out a last chunk shorter than half the target; it joins the one before
+    while target < total_seconds - chunk_seconds / 2:
+        low = max(int((target - search_seconds) / FRAME_SECONDS), 1)
+        high = min(int((target + search_seconds) / FRAME_SECONDS), frame_count - 1)
+        quietest = low + int(np.argmin(energy[low:high])) if high > low else low
+        cut = quietest * frame + frame // 2
+        if not cuts or cut > cuts[-1]:
+            cuts.append(cut)
+        target = cut / SAMPLE_RATE + chunk_seconds
+    return cuts
+
+
+def plan_chunks(sample_count: int, cuts: List[int],
+                overlap_seconds: float = DEFAULT_OVERLAP_SECONDS) -> List[Tuple[int, int, int, int]]:
+    """
+    Turns cut points into chunks of (start, end, own_start, own_end) samples:
+    start/end include the overlap, own_start/own_end are the span whose
+    segments the chunk keeps.
+    """
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    bounds = [0] + list(cuts) + [sample_count]
+    return [(max(0, own_start - overlap), min(sample_count, own_end + overlap), own_start, own_end)
+            for own_start, own_end in zip(bounds, bounds[1:])]
+
+
+def stitch_chunk(chunk, chunk_segments, previous: dict = None) -> List[dict]:
+    """
+    Returns the segments a chunk keeps, shifted to file time, given segment
+    times relative to the chunk start and the last segment kept before it.
+    """
+    start, _, own_start, own_end = chunk
+    offset = start / SAMPLE_RATE
+    kept = []
+    for segment in chunk_segments:
+        segment_start = segment["start"] + offset
+        segment_end = segment["end"] + offset
+        midpoint = (segment_start + segment_end) / 2 * SAMPLE_RATE
+        if not own_start <= midpoint < own_end:
+            continue  # Belongs to the neighbouring chunk's overlap
+        segment = dict(segment, start=segment_start, end=segment_end)
+        # Whisper repeats the last words of a chunk in the next one's first segment
+        last = kept[-1] if kept else previous
+        if last and segment["text"].strip() and segment["text"].strip() == last["text"].strip():
+            continue
+        kept.append(segment)
+    return kept
+
+
+def stitch_segments(chunk_results) -> dict:
+    """
+    Merges per-chunk results, given as (chunk, segments) with segment times
+    relative to the chunk start, into one whisper-style result.
+    """
+    segments = []
+    for chunk, chunk_segments in chunk_results:
+        segments.extend(stitch_chunk(chunk, chunk_segments, segments[-1] if segments else None))
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def _init_worker(model_name: str, device: str, download_root: str, threads: int):
+    global _worker_model
+    import torch
+    import whisper
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model_name, device, download_root=download_root)
+
+
+def _transcribe_chunk(chunk, samples, options: dict):
+    result = _worker_model.transcribe(samples, **options)
+    return chunk, [{"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+                   for segment in result["segments"]]
+
+
+def iter_parallel_segments(audio_file: str, workers: int = None, model_name: str = "base", device: str = "cpu",
+                           download_root: str = None, chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+                           overlap_seconds: float = DEFAULT_OVERLAP_SECONDS, **options):
+    """
+    Transcribes audio_file across worker processes, yielding stitched
+    segments in order as soon as each chunk (and every chunk before it) is
+    done. Takes the same options as whisper's model.transcribe.
+    """
+    workers = workers or default_workers()
+    # Decoded here without whisper; only the worker processes load it
+    audio = load_audio(audio_file)
+    chunks = plan_chunks(len(audio), find_cut_points(audio, chunk_seconds), overlap_seconds)
+    workers = min(workers, len(chunks))
+    logger.info(f"Transcribing {len(audio) / SAMPLE_RATE:.0f}s of audio in {len(chunks)} chunks "
+                f"with {workers} workers")
+
+    # No per-worker progress output
+    options = dict(options, verbose=None)
+    threads = max(1, default_workers() // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_name, device, download_root, threads)) as pool:
+        futures = [pool.submit(_transcribe_chunk, chunk, audio[chunk[0]:chunk[1]], options) for chunk in chunks]
+        previous = None
+        for future in futures:
+            chunk, chunk_segments = future.result()
+            for segment in stitch_chunk(chunk, chunk_segments, previous):
+                previous = segment
+                yield segment
+
+
+def transcribe_parallel(audio_file: str, workers: int = None, model_name: str = "base", device: str = "cpu",
+                        download_root: str = None, chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+                        overlap_seconds: float = DEFAULT_OVERLAP_SECONDS, **options) -> dict:
+    """
+    Transcribes audio_file across worker processes. Takes the same options
+    as whisper's model.transcribe and returns a result in the same shape.
+    """
+    segments = list(iter_parallel_segments(audio_file, workers, model_name, device, download_root,
+                                           chunk_seconds, overlap_seconds, **options))
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
@@ -0,0 +1,67 @@
+"""
+Lookup of provider classes by name.
+
+The built-in providers are listed below. Other packages can add their own by
+declaring an entry point in the "ultra.providers" group that names a
+BaseProvider subclass:
+
+    [project.entry-points."ultra.providers"]
+    anthropic = "ultra_anthropic:AnthropicProvider"
+
+A provider is configured under its name in config.json. The section's "type"
+picks the class, so one class can back several endpoints:
+
+    "openai": {"api_key": "..."},
+    "ollama": {"type": "local", "base_url": "http://localhost:11434/v1", "model": "llama3.1"}
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "ultra.providers"
+
+# Resolved without scanning entry points, which keeps startup fast
+BUILTIN_PROVIDERS = {
+    "openai": "ultra.providers:OpenAIProvider",
+    "local": "ultra.providers:LocalProvider",
+    "router": "ultra.router:RoutingProvider",
+}
+
+
+def _entry_points() -> dict:
+    from importlib.metadata import entry_points
+    return {entry_point.name: entry_point for entry_point in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def available_providers() -> dict:
+    """Provider type -> "module:Class", built-ins first; installed plugins can't shadow them."""
+    providers = dict(BUILTIN_PROVIDERS)
+    for name, entry_point in _entry_points().items():
+        providers.setdefault(name, entry_point.value)
+    return providers
+
+
+def load_provider_class(provider_type: str):
+    import importlib
+    target = BUILTIN_PROVIDERS.get(provider_type)
+    if target is None:
+        entry_point = _entry_points().get(provider_type)
+        if entry_point is None:
+            raise ValueError(f"Unknown provider: {provider_type} "
+                             f"(available: {', '.join(sorted(available_providers()))})")
+        return entry_point.load()
+    module_name, class_name = target.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def provider_type(name: str) -> str:
+    """The provider type configured for name; a name without a section or "type" is its own type."""
+    from ultra.config import load_config
+    return load_config().get(name, {}).get("type", name)
+
+
+def create_provider(name: str):
+    """Builds the provider configured under name in config.json."""
+    cls = load_provider_class(provider_type(name))
+    logger.debug(f"Creating provider {name} ({cls.__name__})")
+    return cls.from_config(name)
@@ -1,6 +1,42 @@
-import openai
-from typing import List
-from ultra.text_templates import TRANSCRIBE_SPEAKERS_V3
+import time
+import weakref
+import threading
+import logging
+import importlib.util
+from typing import AsyncIterator, List, Optional
+
+# openai and httpx take most of a second to import (asyncio a few dozen ms), so they are only loaded
+# when a client is first needed (or by the warm-up thread, see startup.py)
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional 'h2' package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Transcripts sent as text are split into content parts of about this many characters
+TRANSCRIPT_PART_CHARS = 16000
+
+
+def transcript_parts(text: str, max_chars: int = TRANSCRIPT_PART_CHARS) -> List[str]:
+    """Splits a transcript into pieces of at most max_chars, breaking between lines where possible."""
+    parts, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            # A single line longer than a part: cut it at the last space that fits
+            cut = line.rfind(" ", 0, max_chars) + 1 or max_chars
+            if current:
+                parts.append("".join(current))
+                current, size = [], 0
+            parts.append(line[:cut])
+            line = line[cut:]
+        if size + len(line) > max_chars and current:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        parts.append("".join(current))
+    return parts
 
 class BaseProvider:
     def list_models(self) -> List[str]:
@@ -19,21 +55,158 @@ class BaseProvider:
         """Get a single completion from the provider. (Used for summary, etc.)"""
         raise NotImplementedError()
 
+    def astream_completion(self, model_name: str, messages: list) -> AsyncIterator[str]:
+        """Async variant of stream_completion. Must be an async generator of partial text."""
+        raise NotImplementedError()
+
+    async def aget_completion(self, model_name: str, prompt: str) -> str:
+        """Async variant of get_completion."""
+        raise NotImplementedError()
+
     def short_name(self) -> str:
         """Identifier for the provider, e.g. 'openai'."""
         raise NotImplementedError()
 
+    @classmethod
+    def from_config(cls, name: str) -> "BaseProvider":
+        """
+        Builds the provider configured under `name` in config.json. Used by
+        provider_registry for providers found through entry points.
+        """
+        raise NotImplementedError()
+
 class OpenAIProvider(BaseProvider):
-    def __init__(self, api_key: str):
+    # Request a usage report at the end of each stream (stream_options.include_usage)
+    stream_usage = True
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0, http2: bool = True, response_cache: bool = False,
+                 connect_timeout: float = 10.0, first_token_timeout: float = 60.0, token_timeout: float = 30.0,
+                 request_timeout: float = 600.0, max_retries: int = 3, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 60.0, requests_per_minute: Optional[float] = None):
+        from ultra.resilience import RetryPolicy
         self.api_key = api_key
-        openai.api_key = self.api_key
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.first_token_timeout = first_token_timeout
+        self.token_timeout = token_timeout
+        self.request_timeout = request_timeout
+        # Retries are ours (see ultra/resilience.py); the SDK's own are turned off
+        self.retry_policy = RetryPolicy(max_retries, backoff_seconds, max_backoff_seconds)
+        # Shared by every provider instance for this endpoint: chat, compaction and transcript formatting
+        if requests_per_minute:
+            from ultra.rate_limit import shared_bucket
+            # Bursts of up to a second's worth of requests
+            self.rate_limiter = shared_bucket((type(self).__name__, base_url), requests_per_minute,
+                                              capacity=max(1.0, requests_per_minute / 60))
+        else:
+            self.rate_limiter = None
+        # Deterministic (temperature 0, non-streaming) calls are answered from disk when enabled
+        if response_cache:
+            from ultra.response_cache import shared_response_cache
+            self.response_cache = shared_response_cache()
+        else:
+            self.response_cache = None
+        self.limit_settings = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+        }
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Event loop -> async client; several threads may each run their own loop
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_config(cls, name: str = "openai") -> "OpenAIProvider":
+        from ultra.config import get_api_key, get_provider_settings
+        return cls(get_api_key(name), **get_provider_settings(name))
+
+    @property
+    def limits(self):
+        import httpx
+        return httpx.Limits(**self.limit_settings)
+
+    @property
+    def timeout(self):
+        import httpx
+        return httpx.Timeout(self.request_timeout, connect=self.connect_timeout)
+
+    @property
+    def stream_timeout(self):
+        """
+        Transport read timeout for streams. It is only a backstop: the
+        first-token and inter-token limits are enforced per stream.
+        """
+        import httpx
+        return httpx.Timeout(max(self.first_token_timeout, self.token_timeout), connect=self.connect_timeout)
+
+    @property
+    def client(self):
+        """
+        One long-lived pooled client per provider instance instead of the
+        module-global openai client, so connections are kept alive and reused.
+        Created on first use.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                        http_client=httpx.Client(limits=self.limits, http2=self.http2),
+                    )
+        return self._client
+
+    def warm(self):
+        """Imports the SDK and opens the client ahead of the first request."""
+        self.client
+
+    def _get_async_client(self) -> "openai.AsyncOpenAI":
+        """
+        Returns the pooled async client for the running event loop, creating it
+        on first use. Async connections are bound to the event loop that opened
+        them, so each loop (e.g. one per formatting thread) gets its own client.
+        """
+        import asyncio
+        import httpx
+        import openai
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self.limits, http2=self.http2),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    async def aclose(self):
+        """Closes the running event loop's async client."""
+        import asyncio
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
 
     def short_name(self) -> str:
         return "openai"
 
     def list_models(self) -> List[str]:
         # For large org accounts, listing all can be lengthy.
-        result = openai.models.list()
+        result = self.client.models.list()
         models = [m.id for m in result.data if "gpt" in m.id]
         return sorted(models)
 
@@ -41,44 +214,338 @@ class OpenAIProvider(BaseProvider):
         # Hardcode the model for now.
         return "gpt-4o-mini"
 
+    def _throttle(self):
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire()
+            if waited:
+                logger.debug(f"Rate limiter held a request for {waited:.2f}s")
+
+    async def _athrottle(self):
+        if self.rate_limiter is not None:
+            waited = await self.rate_limiter.aacquire()
+            if waited:
+                logger.debug(f"Rate limiter held a request for {waited:.2f}s")
+
+    def _metrics(self, model_name: str, kind: str, messages: list):
+        from ultra.metrics import RequestMetrics, shared_metrics_store
+        return RequestMetrics(shared_metrics_store(), self.short_name(), model_name, kind, messages)
+
+    def _retry_delay(self, error: Exception, attempt: int):
+        """Seconds to wait before the next attempt, or None to raise the error."""
+        from ultra.resilience import retry_after_seconds
+        delay = self.retry_policy.delay(error, attempt)
+        if delay is None:
+            return None
+        if self.rate_limiter is not None and retry_after_seconds(error) is not None:
+            # The server is throttling this endpoint: hold every caller, not just this one
+            self.rate_limiter.pause(delay)
+        logger.warning(f"{self.short_name()} request failed ({type(error).__name__}: {error}), "
+                       f"retry {attempt + 1}/{self.retry_policy.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _with_retries(self, call, metrics=None):
+        for attempt in range(self.retry_policy.max_retries + 1):
+            self._throttle()
+            try:
+                return call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                if metrics is not None:
+                    metrics.retries += 1
+                time.sleep(delay)
+
+    async def _awith_retries(self, call, metrics=None):
+        import asyncio
+        for attempt in range(self.retry_policy.max_retries + 1):
+            await self._athrottle()
+            try:
+                return await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                if metrics is not None:
+                    metrics.retries += 1
+                await asyncio.sleep(delay)
+
     def stream_completion(self, model_name: str, messages: list):
-        response = openai.chat.completions.create(
+        """
+        Streams the reply, retrying failed attempts until the first token
+        arrives. After that a failure or stall is raised to the caller.
+        """
+        from ultra.metrics import CANCELLED
+        metrics = self._metrics(model_name, "stream", messages)
+        try:
+            for attempt in range(self.retry_policy.max_retries + 1):
+                self._throttle()
+                started = False
+                try:
+                    for content in self._stream_once(model_name, messages, metrics):
+                        started = True
+                        metrics.token(content)
+                        yield content
+                    metrics.finish()
+                    return
+                except Exception as e:
+                    delay = None if started else self._retry_delay(e, attempt)
+                    if delay is None:
+                        metrics.finish(error=e)
+                        raise
+                    metrics.retries += 1
+                    time.sleep(delay)
+        finally:
+            # The caller stopped reading before the end
+            metrics.finish(error=CANCELLED)
+
+    def _stream_once(self, model_name: str, messages: list, metrics=None):
+        from ultra.resilience import StreamTimeout, StreamWatchdog
+        response = self.client.chat.completions.create(
             model=model_name,
             messages=messages,
-            stream=True
+            stream=True,
+            timeout=self.stream_timeout,
+            **self._stream_options(),
         )
-        for chunk in response:
-            content = chunk.choices[0].delta.content
-            if content is not None:
-                yield content
+        watchdog = StreamWatchdog(response, self.first_token_timeout)
+        try:
+            for chunk in response:
+                if getattr(chunk, "usage", None) is not None and metrics is not None:
+                    metrics.usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content is not None:
+                    watchdog.disarm()
+                    yield content
+                    watchdog.arm(self.token_timeout)
+        except Exception as e:
+            if watchdog.expired:
+                raise StreamTimeout(f"no token from {model_name} for {watchdog.timeout:g}s") from e
+            raise
+        finally:
+            watchdog.stop()
+            response.close()
+        if watchdog.expired:
+            raise StreamTimeout(f"no token from {model_name} for {watchdog.timeout:g}s")
 
-    def get_completion(self, model_name: str, prompt: str) -> str:
-        response = openai.chat.completions.create(
+    async def astream_completion(self, model_name: str, messages: list) -> AsyncIterator[str]:
+        import asyncio
+        from ultra.metrics import CANCELLED
+        metrics = self._metrics(model_name, "stream", messages)
+        try:
+            for attempt in range(self.retry_policy.max_retries + 1):
+                await self._athrottle()
+                started = False
+                try:
+                    async for content in self._astream_once(model_name, messages, metrics):
+                        started = True
+                        metrics.token(content)
+                        yield content
+                    metrics.finish()
+                    return
+                except Exception as e:
+                    delay = None if started else self._retry_delay(e, attempt)
+                    if delay is None:
+                        metrics.finish(error=e)
+                        raise
+                    metrics.retries += 1
+                    await asyncio.sleep(delay)
+        finally:
+            metrics.finish(error=CANCELLED)
+
+    async def _astream_once(self, model_name: str, messages: list, metrics=None) -> AsyncIterator[str]:
+        import asyncio
+        from ultra.resilience import StreamTimeout
+        response = await self._get_async_client().chat.completions.create(
             model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
+            messages=messages,
+            stream=True,
+            timeout=self.stream_timeout,
+            **self._stream_options(),
         )
-        return response.choices[0].message.content.strip()
+        chunks = response.__aiter__()
+        timeout = self.first_token_timeout
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise StreamTimeout(f"no token from {model_name} for {timeout:g}s") from None
+                if getattr(chunk, "usage", None) is not None and metrics is not None:
+                    metrics.usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content is not None:
+                    timeout = self.token_timeout
+                    yield content
+        finally:
+            await response.close()
+
+    def _stream_options(self) -> dict:
+        """Asks for a final usage chunk, so streamed token counts are exact rather than estimated."""
+        return {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+
+    def get_completion(self, model_name: str, prompt: str) -> str:
+        return self._complete(model_name, [{"role": "user", "content": prompt}], temperature=0.0)
+
+    async def aget_completion(self, model_name: str, prompt: str) -> str:
+        return await self._acomplete(model_name, [{"role": "user", "content": prompt}], temperature=0.0)
 
     def send_non_streaming_request(self, messages: list) -> str:
-        response = openai.chat.completions.create(
-            model=self.get_cheapest_model(),
-            messages=messages,
-            temperature=0.0
-        )
-        return response.choices[0].message.content.strip()
+        return self._complete(self.get_cheapest_model(), messages, temperature=0.0)
+
+    async def asend_non_streaming_request(self, messages: list) -> str:
+        return await self._acomplete(self.get_cheapest_model(), messages, temperature=0.0)
+
+    def _cache_key(self, model_name: str, messages: list, params: dict):
+        """The response cache key for a request, or None if it must go to the API."""
+        from ultra.response_cache import is_cacheable, request_key
+        if self.response_cache is None or not is_cacheable(**params):
+            return None
+        return request_key(self.short_name(), self.base_url, model_name, messages, **params)
+
+    def _complete(self, model_name: str, messages: list, kind: str = "completion", **params) -> str:
+        metrics = self._metrics(model_name, kind, messages)
+        key = self._cache_key(model_name, messages, params)
+        if key is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                metrics.cache_hit = True
+                metrics.token(cached)
+                metrics.finish()
+                return cached
+        try:
+            response = self._with_retries(
+                lambda: self.client.chat.completions.create(model=model_name, messages=messages, **params), metrics)
+        except Exception as e:
+            metrics.finish(error=e)
+            raise
+        text = response.choices[0].message.content.strip()
+        metrics.completion_chars = len(text)
+        metrics.usage(response.usage)
+        metrics.finish()
+        if key is not None:
+            self.response_cache.put(key, text, model_name)
+        return text
+
+    async def _acomplete(self, model_name: str, messages: list, kind: str = "completion", **params) -> str:
+        metrics = self._metrics(model_name, kind, messages)
+        key = self._cache_key(model_name, messages, params)
+        if key is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                metrics.cache_hit = True
+                metrics.token(cached)
+                metrics.finish()
+                return cached
+        try:
+            response = await self._awith_retries(
+                lambda: self._get_async_client().chat.completions.create(model=model_name, messages=messages,
+                                                                         **params), metrics)
+        except Exception as e:
+            metrics.finish(error=e)
+            raise
+        text = response.choices[0].message.content.strip()
+        metrics.completion_chars = len(text)
+        metrics.usage(response.usage)
+        metrics.finish()
+        if key is not None:
+            self.response_cache.put(key, text, model_name)
+        return text
+
+    def format_transcript_text(self, text: str, context: str = None) -> str:
+        """
+        Formats a transcript sent inline as text parts (no upload or temp files).
+        context is the text just before it, shown to the model but not formatted.
+        """
+        return self._complete(self.get_cheapest_model(), self._transcript_text_messages(text, context),
+                              kind="format", temperature=0.0)
+
+    async def aformat_transcript_text(self, text: str, context: str = None) -> str:
+        return await self._acomplete(self.get_cheapest_model(), self._transcript_text_messages(text, context),
+                                     kind="format", temperature=0.0)
+
+    def _transcript_text_messages(self, text: str, context: str = None) -> list:
+        from ultra.text_templates import TRANSCRIBE_SPEAKERS_V3, TRANSCRIPT_CONTEXT_HEADER, TRANSCRIPT_CONTINUE_HEADER
+        content = []
+        if context:
+            content.append({"type": "text", "text": TRANSCRIPT_CONTEXT_HEADER + context})
+            content.append({"type": "text", "text": TRANSCRIPT_CONTINUE_HEADER})
+        content += [{"type": "text", "text": part} for part in transcript_parts(text)]
+        content.append({"type": "text", "text": TRANSCRIBE_SPEAKERS_V3})
+        return [{"role": "user", "content": content}]
 
     def format_transcription(self, file_path: str) -> str:
-        with open(file_path, "rb") as f:
-            file_upload = openai.files.create(file=f, purpose="user_data")
-        messages = [
+        """Formats a transcript PDF, uploaded through the files API."""
+        def upload():
+            with open(file_path, "rb") as f:
+                return self.client.files.create(file=f, purpose="user_data")
+        file_upload = self._with_retries(upload)
+        return self._complete(self.get_cheapest_model(), self._transcription_messages(file_upload.id),
+                              kind="format", temperature=0.0)
+
+    async def aformat_transcription(self, file_path: str) -> str:
+        async def upload():
+            with open(file_path, "rb") as f:
+                return await self._get_async_client().files.create(file=f, purpose="user_data")
+        file_upload = await self._awith_retries(upload)
+        return await self._acomplete(self.get_cheapest_model(), self._transcription_messages(file_upload.id),
+                                     kind="format", temperature=0.0)
+
+    def _transcription_messages(self, file_id: str) -> list:
+        from ultra.text_templates import TRANSCRIBE_SPEAKERS_V3
+        return [
             {
                 "role": "user",
                 "content": [
-                    {"type": "file", "file": {"file_id": file_upload.id}},
+                    {"type": "file", "file": {"file_id": file_id}},
                     {"type": "text", "text": TRANSCRIBE_SPEAKERS_V3}
                 ]
             }
         ]
-        return self.send_non_streaming_request(messages)
-        
\ No newline at end of file
+
+
+class LocalProvider(OpenAIProvider):
+    """
+    Any OpenAI-compatible endpoint that serves its own models (Ollama,
+    llama.cpp server, vLLM, LM Studio...). No API key is needed unless the
+    server asks for one, and `model` picks what chat and compaction use.
+    """
+
+    DEFAULT_BASE_URL = "http://localhost:11434/v1"
+
+    # Not every OpenAI-compatible server accepts stream_options; token counts are estimated instead
+    stream_usage = False
+
+    def __init__(self, api_key: str = "local", base_url: Optional[str] = DEFAULT_BASE_URL,
+                 model: Optional[str] = None, name: str = "local", **settings):
+        super().__init__(api_key, base_url or self.DEFAULT_BASE_URL, **settings)
+        self.model = model
+        self.name = name
+
+    @classmethod
+    def from_config(cls, name: str = "local") -> "LocalProvider":
+        from ultra.config import load_config, get_provider_settings
+        section = load_config().get(name, {})
+        return cls(section.get("api_key", "local"), model=section.get("model"), name=name,
+                   **{key: value for key, value in get_provider_settings(name).items()
+                      if key != "base_url" or value is not None})
+
+    def short_name(self) -> str:
+        return self.name
+
+    def list_models(self) -> List[str]:
+        return sorted(m.id for m in self.client.models.list().data)
+
+    def get_cheapest_model(self) -> str:
+        if self.model is None:
+            models = self.list_models()
+            if not models:
+                raise RuntimeError(f"{self.base_url} serves no models")
+            self.model = models[0]
+        return self.model
@@ -0,0 +1,76 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `rate` acquisitions per `per` seconds on
+    average, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, capacity: float = None):
+        self.rate = rate / per
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Takes tokens if available and returns 0, otherwise returns the seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self.updated < self.paused_until:
+                return self.paused_until - self.updated
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Blocks until tokens are available and returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        """acquire() for coroutines: waits without blocking the event loop."""
+        import asyncio
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Holds every caller for seconds, e.g. after the server answers 429 with Retry-After."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_shared_buckets = {}
+_shared_lock = threading.Lock()
+
+
+def shared_bucket(key, rate: float, per: float = 60.0, capacity: float = None) -> TokenBucket:
+    """
+    The process-wide bucket for key (e.g. a provider endpoint), created on
+    first use, so every client of the same endpoint draws from one budget.
+    """
+    with _shared_lock:
+        bucket = _shared_buckets.get(key)
+        if bucket is None:
+            bucket = _shared_buckets[key] = TokenBucket(rate, per=per, capacity=capacity)
+        return bucket
@@ -0,0 +1,144 @@
+"""
+Timeouts and retries for provider requests.
+
+    connect_timeout      seconds to open a connection
+    first_token_timeout  seconds from sending a streamed request to its first token
+    token_timeout        seconds between tokens once a stream has started
+    request_timeout      seconds for a whole non-streaming request
+
+Failed requests are retried up to max_retries times with jittered
+exponential backoff (backoff_seconds doubling per attempt, capped at
+max_backoff_seconds). A Retry-After header from the server takes the place
+of the backoff. One asking for longer than max_backoff_seconds is not
+retried. A stream is only retried while none of its tokens have been
+returned, so a reply is never shown twice.
+"""
+import time
+import random
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class StreamTimeout(TimeoutError):
+    """A stream produced no token within first_token_timeout or token_timeout."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, dropped connections, rate limits and server errors; not bad requests or auth failures."""
+    if isinstance(error, StreamTimeout):
+        return True
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 409)
+                                                         or error.status_code >= 500)
+
+
+def retry_after_seconds(error: Exception):
+    """The wait the server asked for in Retry-After (or retry-after-ms), or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 3, backoff_seconds: float = 1.0, max_backoff_seconds: float = 60.0):
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def delay(self, error: Exception, attempt: int):
+        """Seconds to wait before retrying after attempt (0-based) failed with error, or None to give up."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            return requested if requested <= self.max_backoff_seconds else None
+        # Jittered so clients throttled together don't retry in lockstep
+        return min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt) * (0.5 + random.random()))
+
+
+class StreamWatchdog:
+    """
+    Closes a stream that goes quiet for too long. The blocked read in the
+    caller's thread then fails, and `expired` tells it why. The clock only
+    runs while armed, i.e. while the caller is waiting on the stream, not
+    while it is rendering a token.
+    """
+
+    def __init__(self, stream, timeout: float):
+        self.stream = stream
+        self.timeout = timeout
+        self.expired = False
+        self._deadline = time.monotonic() + timeout
+        self._wake = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="ultra-stream-watchdog", daemon=True)
+        self._thread.start()
+
+    def arm(self, timeout: float):
+        with self._wake:
+            self.timeout = timeout
+            self._deadline = time.monotonic() + timeout
+            self._wake.notify()
+
+    def disarm(self):
+        with self._wake:
+            self._deadline = None
+
+    def stop(self):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify()
+
+    def _run(self):
+        with self._wake:
+            while not self._stopped:
+                if self._deadline is None:
+                    self._wake.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._wake.wait(remaining)
+                    continue
+                self.expired = True
+                break
+        if self.expired:
+            logger.warning(f"No token for {self.timeout:g}s, closing the stream")
+            try:
+                _interrupt(self.stream)
+            except Exception as e:
+                logger.debug(f"Closing a stalled stream failed: {e}")
+
+
+def _interrupt(stream):
+    """
+    Closing a response from another thread doesn't wake a read already blocked
+    on its socket, so an HTTP/1.1 connection's socket is shut down first. An
+    HTTP/2 connection is shared with other requests, so it is left open; its
+    transport read timeout ends the read instead.
+    """
+    import socket
+    response = getattr(stream, "response", None)
+    network_stream = response.extensions.get("network_stream") if response is not None else None
+    if network_stream is not None and response.http_version == "HTTP/1.1":
+        sock = network_stream.get_extra_info("socket")
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+    stream.close()
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from ultra.config import CONFIG_DIR, ensure_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_FILE = os.path.join(CONFIG_DIR, "response_cache.db")
+
+# Overridable with "response_cache": {"ttl_seconds": ..., "max_mb": ...} in config.json
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_MB = 200
+
+STAT_NAMES = ("hits", "misses", "stores", "expired", "evicted")
+
+
+def request_key(provider: str, base_url, model: str, messages: list, **params) -> str:
+    """Hash identifying a request: same provider endpoint, model, messages and sampling parameters."""
+    data = json.dumps({"provider": provider, "base_url": base_url, "model": model,
+                       "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(stream: bool = False, temperature=None, **params) -> bool:
+    """Only deterministic, non-streaming requests can be answered from the cache."""
+    return not stream and temperature == 0
+
+
+class ResponseCache:
+    """
+    On-disk cache of provider responses to deterministic requests (temperature
+    0, not streamed), so re-compacting the same history or re-formatting the
+    same transcript is not re-sent and re-billed.
+
+    Entries expire after ttl_seconds, and the least recently used are evicted
+    once the stored responses pass max_mb. Hit/miss counters are kept in the
+    same database, so stats() covers every process that used the cache.
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_FILE, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_mb: float = DEFAULT_MAX_MB):
+        ensure_config_dir()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                               "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                               "created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @classmethod
+    def from_config(cls, path: str = RESPONSE_CACHE_FILE) -> "ResponseCache":
+        return cls(path, **load_config().get("response_cache", {}))
+
+    def get(self, key: str):
+        """The cached response for key, or None on a miss (expired entries are dropped)."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count("expired")
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._count("hits")
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = None):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now))
+            self._count("stores")
+            self._evict(keep=key)
+
+    def _count(self, name: str, amount: int = 1):
+        # Caller holds self._lock inside a transaction
+        self._conn.execute("INSERT INTO stats (name, value) VALUES (?, ?) "
+                           "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def _evict(self, keep: str = None):
+        # Caller holds self._lock inside a transaction
+        expired = self._conn.execute("DELETE FROM responses WHERE created < ? AND key != ?",
+                                     (time.time() - self.ttl_seconds, keep)).rowcount
+        if expired:
+            self._count("expired", expired)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count("evicted", evicted)
+        logger.info(f"Evicted {evicted} responses from the response cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict.fromkeys(STAT_NAMES, 0)
+            stats.update(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(entries=entries, size_mb=size / (1024 * 1024),
+                     hit_rate=stats["hits"] / lookups if lookups else 0.0)
+        return stats
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM stats")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_response_cache() -> ResponseCache:
+    """The process-wide cache used by every provider with response_cache enabled."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache.from_config()
+        return _shared_cache
+
+
+def print_cache_stats(clear: bool = False):
+    from ultra.utils import console
+
+    cache = shared_response_cache()
+    if clear:
+        cache.clear()
+        console.print("[bold yellow]Response cache cleared[/bold yellow]")
+        return
+    stats = cache.stats()
+    console.print(f"[bold]Response cache[/bold] [dim]({cache.path})[/dim]")
+    console.print(f"  {stats['entries']} responses, {stats['size_mb']:.1f} MB")
+    console.print(f"  hits {stats['hits']}, misses {stats['misses']} "
+                  f"(hit rate {stats['hit_rate']:.0%}), stored {stats['stores']}, "
+                  f"expired {stats['expired']}, evicted {stats['evicted']}")
@@ -0,0 +1,345 @@
+"""
+Routing across several providers.
+
+    "router": {
+        "backends": ["openai", {"provider": "ollama", "model": "llama3.1"}],
+        "window": 20, "cooldown_seconds": 30, "max_error_rate": 0.5
+    }
+
+Each request goes to the fastest healthy backend, ranked by median
+time-to-first-token over its last `window` streamed replies. Backends with no
+measurements yet are tried first, in config order, so every backend gets
+measured. A failed request puts the backend in cooldown (doubling with each
+failure in a row) and the request is retried on the next backend, as long as
+no tokens have been shown yet. A failure mid-reply is raised, and the next
+request goes elsewhere. Backends whose error rate over the window reaches
+max_error_rate are ranked after all others.
+
+With more than one backend, the backends' own retries are turned off: a
+failing backend hands the request to the next one at once, and its cooldown
+does the backing off.
+"""
+import time
+import threading
+import statistics
+import logging
+from collections import deque
+from typing import AsyncIterator, List, Optional
+from ultra.config import load_config
+from ultra.providers import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+# Overridable in the "router" section of config.json
+DEFAULT_WINDOW = 20
+DEFAULT_COOLDOWN_SECONDS = 30.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+
+# Cooldowns stop doubling at this multiple of cooldown_seconds
+MAX_COOLDOWN_FACTOR = 16
+
+
+# A malformed request fails on every backend alike; other errors (auth, unknown model,
+# rate limits, server and connection errors) are specific to the backend
+REQUEST_ERROR_STATUSES = (400, 413, 422)
+
+
+def _should_fail_over(error: Exception) -> bool:
+    return getattr(error, "status_code", None) not in REQUEST_ERROR_STATUSES
+
+
+class Backend:
+    """A provider behind the router and its rolling latency and error stats."""
+
+    def __init__(self, name: str, provider, model: Optional[str] = None, window: int = DEFAULT_WINDOW,
+                 cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS):
+        self.name = name
+        self.provider = provider
+        self.model = model
+        self.cooldown_seconds = cooldown_seconds
+        self.ttfts = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def model_for(self, model_name: str) -> str:
+        return self.model or model_name
+
+    def disable_retries(self):
+        """Makes the provider raise on the first failure, so the router can fail over."""
+        policy = getattr(self.provider, "retry_policy", None)
+        if policy is not None and policy.max_retries:
+            from ultra.resilience import RetryPolicy
+            self.provider.retry_policy = RetryPolicy(0, policy.backoff_seconds, policy.max_backoff_seconds)
+
+    @property
+    def median_ttft(self) -> Optional[float]:
+        with self._lock:
+            return statistics.median(self.ttfts) if self.ttfts else None
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def cooling_down(self, now: float = None) -> bool:
+        return (now or time.monotonic()) < self.cooldown_until
+
+    def record_success(self, ttft: float = None):
+        with self._lock:
+            self.requests += 1
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.cooldown_until = 0.0
+            if ttft is not None:
+                self.ttfts.append(ttft)
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            factor = min(2 ** (self.consecutive_failures - 1), MAX_COOLDOWN_FACTOR)
+            self.cooldown_until = time.monotonic() + self.cooldown_seconds * factor
+            self.last_error = f"{type(error).__name__}: {error}"
+
+
+class RoutingProvider(BaseProvider):
+    """Sends each request to the fastest healthy backend and fails over to the others."""
+
+    def __init__(self, backends: List[Backend], max_error_rate: float = DEFAULT_MAX_ERROR_RATE):
+        if not backends:
+            raise ValueError("The router needs at least one backend")
+        self.backends = backends
+        self.max_error_rate = max_error_rate
+        if len(backends) > 1:
+            for backend in backends:
+                backend.disable_retries()
+
+    @classmethod
+    def from_config(cls, name: str = "router") -> "RoutingProvider":
+        from ultra.provider_registry import create_provider
+        section = load_config().get(name, {})
+        backends = []
+        for entry in section.get("backends", ["openai"]):
+            if isinstance(entry, str):
+                entry = {"provider": entry}
+            provider = create_provider(entry["provider"])
+            # A local provider's own "model" setting pins the backend's model too
+            model = entry.get("model") or getattr(provider, "model", None)
+            backends.append(Backend(entry["provider"], provider, model,
+                                    window=section.get("window", DEFAULT_WINDOW),
+                                    cooldown_seconds=section.get("cooldown_seconds", DEFAULT_COOLDOWN_SECONDS)))
+        return cls(backends, max_error_rate=section.get("max_error_rate", DEFAULT_MAX_ERROR_RATE))
+
+    def ranked(self) -> List[Backend]:
+        """
+        Backends in the order to try them: healthy before cooling down or
+        error-prone, unmeasured before measured, then fastest first. Backends
+        still cooling down stay at the end as a last resort.
+        """
+        now = time.monotonic()
+
+        def rank(indexed):
+            index, backend = indexed
+            ttft = backend.median_ttft
+            return (backend.cooling_down(now) and backend.cooldown_until,
+                    backend.error_rate >= self.max_error_rate,
+                    ttft is not None,
+                    ttft or 0.0,
+                    index)
+
+        return [backend for _, backend in sorted(enumerate(self.backends), key=rank)]
+
+    def short_name(self) -> str:
+        return "router"
+
+    @property
+    def base_url(self) -> str:
+        return ",".join(backend.name for backend in self.backends)
+
+    def list_models(self) -> List[str]:
+        # Each pinned model, plus whatever the unpinned backends list
+        models = set()
+        for backend in self.backends:
+            if backend.model:
+                models.add(backend.model)
+                continue
+            try:
+                models.update(backend.provider.list_models())
+            except Exception as e:
+                logger.warning(f"Listing models on {backend.name} failed: {e}")
+        return sorted(models)
+
+    def get_cheapest_model(self) -> str:
+        backend = self.backends[0]
+        return backend.model or backend.provider.get_cheapest_model()
+
+    def warm(self):
+        for backend in self.backends:
+            if hasattr(backend.provider, "warm"):
+                backend.provider.warm()
+
+    def close(self):
+        for backend in self.backends:
+            if hasattr(backend.provider, "close"):
+                backend.provider.close()
+
+    async def aclose(self):
+        for backend in self.backends:
+            if hasattr(backend.provider, "aclose"):
+                await backend.provider.aclose()
+
+    def _failed(self, backend: Backend, error: Exception, errors: list) -> bool:
+        """Records a failed attempt; True if the request should move on to the next backend."""
+        if not _should_fail_over(error):
+            return False
+        backend.record_failure(error)
+        errors.append(error)
+        logger.warning(f"{backend.name} failed ({type(error).__name__}: {error}), failing over")
+        return True
+
+    def stream_completion(self, model_name: str, messages: list):
+        errors = []
+        for backend in self.ranked():
+            start = time.perf_counter()
+            stream = backend.provider.stream_completion(backend.model_for(model_name), messages)
+            try:
+                first = next(stream)
+            except StopIteration:
+                backend.record_success(time.perf_counter() - start)
+                return
+            except Exception as e:
+                if self._failed(backend, e, errors):
+                    continue
+                raise
+            backend.record_success(time.perf_counter() - start)
+            yield first
+            try:
+                yield from stream
+            except Exception as e:
+                # Part of the reply is already shown, so this one can't be retried elsewhere
+                backend.record_failure(e)
+                raise
+            return
+        raise errors[-1]
+
+    async def astream_completion(self, model_name: str, messages: list) -> AsyncIterator[str]:
+        errors = []
+        for backend in self.ranked():
+            start = time.perf_counter()
+            stream = backend.provider.astream_completion(backend.model_for(model_name), messages)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                backend.record_success(time.perf_counter() - start)
+                return
+            except Exception as e:
+                if self._failed(backend, e, errors):
+                    continue
+                raise
+            backend.record_success(time.perf_counter() - start)
+            yield first
+            try:
+                async for token in stream:
+                    yield token
+            except Exception as e:
+                backend.record_failure(e)
+                raise
+            return
+        raise errors[-1]
+
+    def _call(self, method: str, *args, model_name: str = None):
+        errors = []
+        for backend in self.ranked():
+            call = getattr(backend.provider, method)
+            try:
+                result = call(backend.model_for(model_name), *args) if model_name else call(*args)
+            except Exception as e:
+                if self._failed(backend, e, errors):
+                    continue
+                raise
+            backend.record_success()
+            return result
+        raise errors[-1]
+
+    async def _acall(self, method: str, *args, model_name: str = None):
+        errors = []
+        for backend in self.ranked():
+            call = getattr(backend.provider, method)
+            try:
+                result = await (call(backend.model_for(model_name), *args) if model_name else call(*args))
+            except Exception as e:
+                if self._failed(backend, e, errors):
+                    continue
+                raise
+            backend.record_success()
+            return result
+        raise errors[-1]
+
+    def get_completion(self, model_name: str, prompt: str) -> str:
+        return self._call("get_completion", prompt, model_name=model_name)
+
+    async def aget_completion(self, model_name: str, prompt: str) -> str:
+        return await self._acall("aget_completion", prompt, model_name=model_name)
+
+    def send_non_streaming_request(self, messages: list) -> str:
+        return self._call("send_non_streaming_request", messages)
+
+    async def asend_non_streaming_request(self, messages: list) -> str:
+        return await self._acall("asend_non_streaming_request", messages)
+
+    def format_transcript_text(self, text: str, context: str = None) -> str:
+        return self._call("format_transcript_text", text, context)
+
+    async def aformat_transcript_text(self, text: str, context: str = None) -> str:
+        return await self._acall("aformat_transcript_text", text, context)
+
+    def format_transcription(self, file_path: str) -> str:
+        return self._call("format_transcription", file_path)
+
+    async def aformat_transcription(self, file_path: str) -> str:
+        return await self._acall("aformat_transcription", file_path)
+
+    def stats(self) -> list:
+        """One dict per backend, in routing order."""
+        now = time.monotonic()
+        return [{
+            "name": backend.name,
+            "model": backend.model,
+            "requests": backend.requests,
+            "failures": backend.failures,
+            "median_ttft": backend.median_ttft,
+            "error_rate": backend.error_rate,
+            "cooldown": max(0.0, backend.cooldown_until - now),
+            "last_error": backend.last_error,
+        } for backend in self.ranked()]
+
+
+def print_router_stats(provider):
+    from rich.table import Table
+    from ultra.utils import console
+
+    if not isinstance(provider, RoutingProvider):
+        console.print(f"[dim]Not routing: every request goes to {provider.short_name()}. "
+                      f"Set \"provider\": \"router\" in config.json to route across backends.[/dim]")
+        return
+    table = Table(title="Router backends (in routing order)")
+    table.add_column("Backend")
+    table.add_column("Requests", justify="right")
+    table.add_column("Failures", justify="right")
+    table.add_column("Median TTFT", justify="right")
+    table.add_column("Error rate", justify="right")
+    table.add_column("Cooldown", justify="right")
+    for row in provider.stats():
+        name = f"{row['name']} ({row['model']})" if row["model"] else row["name"]
+        ttft = f"{row['median_ttft'] * 1000:.0f} ms" if row["median_ttft"] is not None else "-"
+        cooldown = f"{row['cooldown']:.0f}s" if row["cooldown"] else "-"
+        table.add_row(name, str(row["requests"]), str(row["failures"]), ttft,
+                      f"{row['error_rate']:.0%}", cooldown)
+    console.print(table)
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import List, Dict, Iterable
+from ultra.config import APP_WORKING_DIR
+
+logger = logging.getLogger(__name__)
+
+# Full-text index of every session's messages (kept next to the session journals)
+SEARCH_INDEX_FILE = os.path.join(APP_WORKING_DIR, "sessions", "search.db")
+
+DEFAULT_SEARCH_LIMIT = 20
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over the messages of all sessions.
+
+    Messages are indexed as their journal records are written, so the index
+    only ever grows by what was just said. Each hit carries the session name,
+    the message's offset in the session's context when it was added, and the
+    journal seq of the record that added it. Rows are kept when compaction or
+    /clear later removes the message from the live context, so the whole
+    history stays searchable.
+    """
+
+    def __init__(self, path: str = SEARCH_INDEX_FILE):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            # WAL lets several ultra processes index and search at the same time
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+            seen_columns = [row[1] for row in conn.execute("PRAGMA table_info(seen)")]
+            if columns and ("offset" not in columns or "offset" not in seen_columns):
+                # Built before hits and seen hashes carried message offsets; start over
+                # (see `ultra search --reindex`)
+                logger.warning(f"Rebuilding the search index in {self.path}; "
+                               f"run `ultra search --reindex` to index existing sessions again")
+                with conn:
+                    conn.execute("DROP TABLE messages")
+                    conn.execute("DROP TABLE IF EXISTS sessions")
+                    conn.execute("DROP TABLE IF EXISTS seen")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                         "content, role UNINDEXED, session UNINDEXED, seq UNINDEXED, offset UNINDEXED, "
+                         "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+            # Last journal seq indexed per session, and the context length after it, so
+            # re-indexing is incremental and offsets carry on where the last batch ended
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (name TEXT PRIMARY KEY, seq INTEGER NOT NULL, "
+                         "length INTEGER NOT NULL DEFAULT 0)")
+            # Hash of each indexed message at its offset, so snapshots and edits don't index it
+            # twice, while the same message said again later is indexed where it was said
+            conn.execute("CREATE TABLE IF NOT EXISTS seen (session TEXT, offset INTEGER, hash BLOB, "
+                         "PRIMARY KEY (session, offset, hash)) WITHOUT ROWID")
+            self._conn = conn
+        return self._conn
+
+    def index_events(self, session: str, events: Iterable[dict]):
+        """Indexes the messages added by a batch of context change events."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                indexed = conn.execute("SELECT seq, length FROM sessions WHERE name = ?", (session,)).fetchone()
+                indexed_seq, length = indexed or (0, 0)
+                # Replay the events after the last indexed one, tracking where each message lands
+                rows = []
+                last_seq = None
+                for event in events:
+                    if event["seq"] <= indexed_seq:
+                        continue
+                    last_seq = event["seq"]
+                    op = event["op"]
+                    if op == "append":
+                        added = [(length, event["message"])]
+                        length += 1
+                    elif op == "replace":
+                        added = list(enumerate(event["messages"], event["start"]))
+                        length += len(event["messages"]) - (event["end"] - event["start"])
+                    elif op == "snapshot":
+                        added = list(enumerate(event["messages"]))
+                        length = len(event["messages"])
+                    else:
+                        if op == "clear":
+                            length = 0
+                        continue
+                    for offset, message in added:
+                        content = _message_text(message)
+                        if content:
+                            rows.append((content, message.get("role", ""), session, event["seq"], offset))
+                if last_seq is None:
+                    return
+
+                for row in rows:
+                    digest = hashlib.blake2b(f"{row[1]}\0{row[0]}".encode("utf-8"), digest_size=16).digest()
+                    if conn.execute("INSERT OR IGNORE INTO seen (session, offset, hash) VALUES (?, ?, ?)",
+                                    (session, row[4], digest)).rowcount:
+                        conn.execute("INSERT INTO messages (content, role, session, seq, offset) "
+                                     "VALUES (?, ?, ?, ?, ?)", row)
+                conn.execute("INSERT INTO sessions (name, seq, length) VALUES (?, ?, ?) "
+                             "ON CONFLICT(name) DO UPDATE SET seq = excluded.seq, length = excluded.length",
+                             (session, last_seq, length))
+
+    def index_session_file(self, path: str):
+        """
+        Indexes a session journal (.jsonl) or a session saved in the old .json
+        format, skipping what is already indexed.
+        """
+        name = os.path.basename(path)
+        if name.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                events = []
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        continue  # Half-written last record
+            self.index_events(name[:-len(".jsonl")], events)
+        elif name.endswith(".json") and not name.endswith(".snapshot.json"):
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+            self.index_events(name[:-len(".json")], [{"op": "snapshot", "seq": 1, "messages": messages}])
+
+    def reindex(self, session_dir: str) -> int:
+        """
+        Brings the index up to date with every session file in session_dir.
+        Returns how many sessions were read.
+        """
+        count = 0
+        for name in sorted(os.listdir(session_dir)):
+            if not (name.endswith(".jsonl") or name.endswith(".json")) or name.endswith(".snapshot.json"):
+                continue
+            path = os.path.join(session_dir, name)
+            try:
+                self.index_session_file(path)
+                count += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not index {path}: {e}")
+        return count
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        Returns the best matches for query, best first. Plain words are
+        matched as terms; FTS5 syntax (quotes, OR, NEAR, prefix*) also works.
+        """
+        with self._lock:
+            conn = self._connect()
+            sql = ("SELECT session, offset, seq, role, snippet(messages, 0, char(2), char(3), '…', 12), "
+                   "bm25(messages) FROM messages WHERE messages MATCH ? ORDER BY bm25(messages) LIMIT ?")
+            try:
+                rows = conn.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax: search for the words literally
+                terms = re.findall(r"\w+", query)
+                if not terms:
+                    return []
+                rows = conn.execute(sql, (" ".join(f'"{term}"' for term in terms), limit)).fetchall()
+        return [{"session": session, "offset": offset, "seq": seq, "role": role, "snippet": snippet,
+                 "score": -score}
+                for session, offset, seq, role, snippet, score in rows]
+
+    @staticmethod
+    def format_hit(hit: dict) -> str:
+        """One hit as Rich markup, with the matched terms highlighted."""
+        from rich.markup import escape
+        snippet = escape(hit["snippet"].replace("\n", " "))
+        snippet = snippet.replace("\x02", "[bold yellow]").replace("\x03", "[/bold yellow]")
+        return f"[cyan]{escape(hit['session'])}[/cyan] [dim]#{hit['offset']} {hit['role']}[/dim]  {snippet}"
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import atexit
+import threading
+import logging
+from typing import List, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Journal defaults (overridable in the "session_journal" section of config.json)
+DEFAULT_FLUSH_INTERVAL = 1.0   # seconds between batched fsyncs
+DEFAULT_SNAPSHOT_EVERY = 500   # records between snapshots
+
+
+class SessionJournal:
+    """
+    Append-only record of a session's context changes.
+
+    Every ContextManager change event (append / replace / clear / snapshot) is
+    written as one JSON line to <session>.jsonl. Writes are batched by a
+    background thread and fsynced at most once per flush interval, so the chat
+    never waits on the disk.
+
+    Every snapshot_every records the whole context is written to
+    <session>.snapshot.json together with the journal offset it covers, so a
+    resume only replays the records written after the last snapshot.
+
+    If a search index is given, each batch is indexed once it is on disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 snapshot_every: int = DEFAULT_SNAPSHOT_EVERY, search_index=None):
+        self.path = path
+        self.session_name = os.path.splitext(os.path.basename(path))[0]
+        self.search_index = search_index
+        self.snapshot_path = self.snapshot_path_for(path)
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.context_manager = None
+        self._pending = []  # Events, or ("snapshot", seq, messages) markers
+        self._since_snapshot = 0
+        self._flush_requested = False
+        self._flushed = 0  # Count of flushes done, for flush(wait=True)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        _truncate_partial_record(path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def snapshot_path_for(path: str) -> str:
+        return os.path.splitext(path)[0] + ".snapshot.json"
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[List[Dict], int]:
+        """
+        Rebuilds a session's context from its journal.
+        Returns (messages, seq of the last change applied).
+        """
+        messages, seq, offset = [], 0, 0
+        try:
+            with open(cls.snapshot_path_for(path), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            messages, seq, offset = snapshot["messages"], snapshot["seq"], snapshot["offset"]
+        except (OSError, ValueError, KeyError):
+            pass  # No usable snapshot: replay from the start
+
+        if not os.path.exists(path):
+            return messages, seq
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable journal record in {path}")
+                    continue
+                if event["seq"] <= seq:
+                    continue
+                seq = event["seq"]
+                op = event["op"]
+                if op == "append":
+                    messages.append(event["message"])
+                elif op == "replace":
+                    messages[event["start"]:event["end"]] = event["messages"]
+                elif op == "clear":
+                    messages = []
+                elif op == "snapshot":
+                    messages = list(event["messages"])
+        return messages, seq
+
+    def attach(self, context_manager):
+        """Starts recording context_manager's changes."""
+        self.context_manager = context_manager
+        context_manager.subscribe(self.on_event)
+
+    def on_event(self, event: dict):
+        # Runs under the context manager's lock: queue it and return
+        with self._cond:
+            self._pending.append(event)
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_every:
+                self._queue_snapshot()
+            self._cond.notify()
+
+    def _queue_snapshot(self):
+        # Messages are never mutated in place, so a shallow copy is a stable view
+        self._pending.append(("snapshot", self.context_manager.seq, list(self.context_manager.context)))
+        self._since_snapshot = 0
+
+    def flush(self, snapshot: bool = False, wait: bool = True):
+        """
+        Writes and fsyncs everything queued so far, optionally with a snapshot.
+        With wait, returns once it is on disk.
+        """
+        if snapshot and self.context_manager is not None:
+            with self.context_manager._lock, self._cond:
+                self._queue_snapshot()
+        with self._cond:
+            if self._closed:
+                return
+            target = self._flushed + 1
+            self._flush_requested = True
+            self._cond.notify()
+            while wait and self._flushed < target and self._thread.is_alive():
+                self._cond.wait(timeout=1)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._flush_requested and not self._closed:
+                    self._cond.wait()
+                if not self._flush_requested and not self._closed:
+                    # Let more records gather so a burst costs one fsync
+                    self._cond.wait(timeout=self.flush_interval)
+                batch, self._pending = self._pending, []
+                self._flush_requested = False
+                closing = self._closed
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Could not write session journal {self.path}: {e}")
+            if self.search_index is not None:
+                try:
+                    self.search_index.index_events(
+                        self.session_name, [item for item in batch if not isinstance(item, tuple)])
+                except Exception as e:
+                    logger.error(f"Could not update the search index for {self.session_name}: {e}")
+
+            with self._cond:
+                self._flushed += 1
+                self._cond.notify_all()
+            if closing:
+                return
+
+    def _write_batch(self, batch):
+        for item in batch:
+            if isinstance(item, tuple):
+                # Everything before the snapshot marker must be on disk first
+                self._sync()
+                _, seq, messages = item
+                self._write_snapshot(seq, messages, self._file.tell())
+            else:
+                self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_snapshot(self, seq: int, messages: List[Dict], offset: int):
+        # Write then rename so a crash never leaves a partial snapshot
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "offset": offset, "saved_at": time.time(), "messages": messages},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def close(self):
+        """Writes anything still queued and stops recording."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self.context_manager is not None:
+            self.context_manager.unsubscribe(self.on_event)
+        self._thread.join(timeout=5)
+        self._file.close()
+        atexit.unregister(self.close)
+
+
+def _truncate_partial_record(path: str):
+    """Drops a half-written last line left by a crash, so new records start on a fresh line."""
+    try:
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Scan back to the last complete record
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    return
+            f.truncate(0)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import logging
+from ultra.config import CONFIG_DIR, load_config
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_DIR = os.path.join(CONFIG_DIR, "cache")
+
+# Total size the cache may grow to (overridable with "stage_cache": {"max_mb": ...} in config.json)
+DEFAULT_STAGE_CACHE_MB = 5 * 1024
+
+
+def fingerprint(*parts) -> str:
+    """Short stable hash of JSON-serializable values (e.g. a prompt template)."""
+    data = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class StageCache:
+    """
+    Size-capped cache of /transcribe stage outputs (audio, raw transcript,
+    sentences, formatted text, metadata), stored as files under ~/.ultra/cache.
+
+    Each entry is keyed by the stage, the video id and the parameters the
+    stage's output depends on (model size, prompt template hash, provider
+    model, the keys of the stages it was built from...), so a repeat request
+    only re-runs the stages whose inputs changed. Least recently used entries
+    are deleted once the total size passes max_mb.
+    """
+
+    def __init__(self, root: str = STAGE_CACHE_DIR, max_mb: float = None):
+        self.root = root
+        if max_mb is None:
+            max_mb = load_config().get("stage_cache", {}).get("max_mb", DEFAULT_STAGE_CACHE_MB)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                               "key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+                               "last_used REAL NOT NULL)")
+
+    @staticmethod
+    def key(stage: str, video_id: str, **params) -> str:
+        return f"{stage}/{video_id}/{fingerprint(params)}"
+
+    def _path_for(self, key: str, ext: str) -> str:
+        stage, video_id, digest = key.split("/")
+        return os.path.join(self.root, stage, f"{video_id}-{digest}{ext}")
+
+    def get(self, key: str):
+        """Path of the cached file for key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                with self._conn:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, source_path: str, move: bool = False) -> str:
+        """Stores a copy of source_path (or moves it) under key and returns the cached path."""
+        path = self._path_for(key, os.path.splitext(source_path)[1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if move:
+            shutil.move(source_path, tmp_path)
+        else:
+            shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO entries (key, path, size, last_used) "
+                                   "VALUES (?, ?, ?, ?)", (key, path, os.path.getsize(path), time.time()))
+            self._evict(keep=key)
+        return path
+
+    def get_text(self, key: str):
+        path = self.get(key)
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put_text(self, key: str, text: str, ext: str = ".txt") -> str:
+        path = self._path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.new{ext}"
+        with open(staging, "w", encoding="utf-8") as f:
+            f.write(text)
+        return self.put(key, staging, move=True)
+
+    def _evict(self, keep: str = None):
+        # Caller holds self._lock
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, path, size FROM entries ORDER BY last_used").fetchall()
+        with self._conn:
+            for key, path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                logger.info(f"Evicted {key} from the stage cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
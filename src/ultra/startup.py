@@ -0,0 +1,126 @@
+"""
+Startup-time helpers: warming the heavy modules after the first prompt is
+shown, and measuring how long `ultra` takes to get there.
+
+    ultra --profile-startup          # per-module import times up to the first prompt
+"""
+import os
+import sys
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# When set, the chat loop exits as soon as the first prompt is printed
+STARTUP_PROBE_ENV = "ULTRA_STARTUP_PROBE"
+
+# Loaded in the background once the prompt is up, so the first reply doesn't wait on them
+WARM_MODULES = ("openai", "httpx", "rich.markdown", "ultra.markdown_stream")
+
+# Must not be imported before the first prompt (checked by benchmarks/bench_startup.py)
+DEFERRED_MODULES = ("openai", "httpx", "rich.markdown", "rich.live", "pygments", "markdown_it")
+
+# The startup path run by the probe: `ultra` with no arguments
+STARTUP_COMMAND = "import sys; from ultra.cli import main; sys.argv = ['ultra']; main()"
+
+
+def probe_requested() -> bool:
+    return bool(os.environ.get(STARTUP_PROBE_ENV))
+
+
+def warm_up(provider=None) -> threading.Thread:
+    """Imports WARM_MODULES and opens the provider's client on a daemon thread."""
+    def run():
+        import importlib
+        start = time.perf_counter()
+        try:
+            for name in WARM_MODULES:
+                importlib.import_module(name)
+            if provider is not None and hasattr(provider, "warm"):
+                provider.warm()
+        except Exception as e:
+            # The same import will be retried (and fail visibly) on first use
+            logger.debug(f"Warm-up failed: {e}")
+            return
+        logger.debug(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+    thread = threading.Thread(target=run, name="ultra-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parses `python -X importtime` output into (module, self_us, cumulative_us, depth) in import order."""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+
+def measure_startup(importtime: bool = False, timeout: float = 60.0) -> dict:
+    """
+    Runs `ultra` in a child process up to its first prompt and returns the
+    wall time in seconds, plus import records when importtime is set. The
+    child gets a throwaway working directory, so no session is left behind.
+    """
+    import tempfile
+    import subprocess
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        env = dict(os.environ)
+        env[STARTUP_PROBE_ENV] = "1"
+        env["ULTRA_WORKING_DIR"] = working_dir
+        env.setdefault("OPENAI_API_KEY", "startup-probe")  # Never prompt for a key
+        command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", STARTUP_COMMAND]
+        start = time.perf_counter()
+        result = subprocess.run(command, env=env, stdin=subprocess.DEVNULL, capture_output=True,
+                                text=True, timeout=timeout)
+        elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"ultra exited with {result.returncode}: {result.stderr.strip()[-2000:]}")
+    return {"seconds": elapsed, "imports": parse_importtime(result.stderr) if importtime else []}
+
+
+def profile_startup(top: int = 20):
+    """Prints time to first prompt and where the import time went."""
+    from rich.table import Table
+    from ultra.utils import console
+
+    wall = min(measure_startup()["seconds"] for _ in range(3))
+    imports = measure_startup(importtime=True)["imports"]
+    total_us = sum(self_us for _, self_us, _, _ in imports)
+
+    console.print(f"\n[bold]Time to first prompt:[/bold] {wall * 1000:.0f} ms "
+                  f"[dim](best of 3; {len(imports)} modules, {total_us / 1000:.0f} ms importing)[/dim]\n")
+
+    packages = {}
+    for name, self_us, _, _ in imports:
+        package = name.split(".")[0]
+        count, spent = packages.get(package, (0, 0))
+        packages[package] = (count + 1, spent + self_us)
+    table = Table(title="By package (self time)")
+    table.add_column("Package")
+    table.add_column("Modules", justify="right")
+    table.add_column("ms", justify="right")
+    for package, (count, spent) in sorted(packages.items(), key=lambda item: -item[1][1])[:top]:
+        table.add_row(package, str(count), f"{spent / 1000:.1f}")
+    console.print(table)
+
+    table = Table(title="Top-level imports (cumulative)")
+    table.add_column("Module")
+    table.add_column("Self ms", justify="right")
+    table.add_column("Cumulative ms", justify="right")
+    top_level = [record for record in imports if record[3] == 0]
+    for name, self_us, cumulative_us, _ in sorted(top_level, key=lambda record: -record[2])[:top]:
+        table.add_row(name, f"{self_us / 1000:.1f}", f"{cumulative_us / 1000:.1f}")
+    console.print(table)
+
+    loaded = {name for name, _, _, _ in imports}
+    early = [name for name in DEFERRED_MODULES if name in loaded]
+    if early:
+        console.print(f"[yellow]Loaded before the prompt (expected to be deferred): {', '.join(early)}[/yellow]")
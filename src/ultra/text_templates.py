@@ -103,4 +103,16 @@ Your goal is to make this transcription more readable while preserving the exact
 
 Do not include an introduction, summary, or any explanatory text. Do not add extra spacing lines between speakers - 
 just start each new speaker on a new line with their identifier.
-"""
\ No newline at end of file
+"""
+
+# Framing for one chunk of a long transcript formatted in pieces (see transcript_format.py)
+TRANSCRIPT_CONTEXT_HEADER = """\
+The following is the END OF THE PREVIOUS PART of the transcription. It is context only: do NOT include it 
+in your output.
+
+"""
+
+TRANSCRIPT_CONTINUE_HEADER = """\
+The part to format follows. It continues directly from the context above, so if the same person is still 
+speaking, do not start with a speaker label.
+"""
@@ -0,0 +1,84 @@
+"""
+Token counting helpers used to keep the chat context inside a model's window.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+# Used when tiktoken (or its encoding files) is unavailable: ~4 characters per token
+APPROX_ENCODING = "approx"
+
+# Tokens added by the chat format around every message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context window sizes in tokens; the longest matching model-name prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+_encodings = {}
+
+
+def context_window_for_model(model_name: str) -> int:
+    """Returns the context window size for a model, in tokens."""
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if (model_name or "").startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def encoding_name_for_model(model_name: str) -> str:
+    """Returns the name of the tokenizer encoding a model uses."""
+    if tiktoken is None:
+        return APPROX_ENCODING
+    try:
+        return tiktoken.encoding_for_model(model_name).name
+    except Exception:
+        return "o200k_base" if (model_name or "").startswith(("gpt-4o", "gpt-4.1", "o1", "o3", "o4")) else "cl100k_base"
+
+
+def _get_encoding(encoding_name: str):
+    if encoding_name not in _encodings:
+        try:
+            _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # Encoding files are downloaded on first use; estimate if that fails
+            logger.warning(f"Could not load tokenizer {encoding_name}, estimating instead: {e}")
+            _encodings[encoding_name] = None
+    return _encodings[encoding_name]
+
+
+def count_text_tokens(text: str, encoding_name: str) -> int:
+    if not text:
+        return 0
+    encoding = None if encoding_name == APPROX_ENCODING else _get_encoding(encoding_name)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: dict, encoding_name: str) -> int:
+    """Counts the tokens one chat message costs, including the per-message overhead."""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Multi-part content: only text parts are counted
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return (MESSAGE_OVERHEAD_TOKENS
+            + count_text_tokens(message.get("role", ""), encoding_name)
+            + count_text_tokens(content, encoding_name))
@@ -5,27 +5,103 @@ import logging
 from ultra.logging_config import redirect_nested_logs
 
 # Only import non-heavy modules at the top level
-from ultra.audio import download_youtube_audio
-from ultra.config import get_api_key
+from ultra.audio import video_id_from_url
+from ultra.config import get_default_provider, load_config
 
 logger = logging.getLogger(__name__)
 
+WHISPER_MODEL = "base"
+WHISPER_DEVICE = "cpu"
+WHISPER_DOWNLOAD_ROOT = "./models"
 
+# Length of the pieces audio is transcribed in when streaming; the first text
+# shows up once the first piece is done
+STREAM_CHUNK_SECONDS = 30.0
 
-def transcribe_video(url: str) -> str:
-    # ----------------------
-    # Download Audio
-    # ----------------------
-    title = download_youtube_audio(url)
-    
-    # Create transcript directory if it doesn't exist
-    if not os.path.exists("transcript"):
-        os.makedirs("transcript")
-        logger.info("Created directory: transcript")
-    
-    # ----------------------
-    # NLTK Setup - Lazy import
-    # ----------------------
+# Characters of the previous piece's text given to Whisper as the prompt for the next
+PROMPT_CONTEXT_CHARS = 200
+
+# Models loaded in this process, for when no Whisper server is running
+_local_models = {}
+
+
+def run_whisper(audio_file, model_name: str = WHISPER_MODEL, device: str = WHISPER_DEVICE, **options) -> dict:
+    """
+    Transcribes audio_file (a path or 16 kHz samples) with Whisper. Uses the Whisper server when one is
+    running (see ultra.whisper_server), otherwise loads the model here once.
+    """
+    from ultra.whisper_server import transcribe_with_server
+    try:
+        result = transcribe_with_server(audio_file, model_name, device, WHISPER_DOWNLOAD_ROOT, **options)
+    except (OSError, EOFError) as e:
+        logger.warning(f"Whisper server unavailable, transcribing locally: {e}")
+        result = None
+    if result is not None:
+        logger.info("Transcribed with the Whisper server")
+        return result
+
+    key = (model_name, device)
+    if key not in _local_models:
+        logger.info("Loading speech recognition model...")
+        import whisper
+        _local_models[key] = redirect_nested_logs(whisper.load_model, model_name, device,
+                                                  download_root=WHISPER_DOWNLOAD_ROOT)
+    return redirect_nested_logs(_local_models[key].transcribe, audio_file, **options)
+
+
+def stream_segments(audio_file: str, workers: int = 1, **options):
+    """
+    Yields transcript segments (whisper-style dicts, times in seconds from the
+    start of the file) as they are decoded, instead of after the whole file.
+    """
+    if workers > 1:
+        from ultra.parallel_transcribe import iter_parallel_segments
+        yield from iter_parallel_segments(audio_file, workers, WHISPER_MODEL, WHISPER_DEVICE,
+                                          WHISPER_DOWNLOAD_ROOT, **options)
+        return
+
+    from ultra.parallel_transcribe import find_cut_points, load_audio, plan_chunks, stitch_chunk
+
+    # Decoded without importing whisper; it is only loaded if no Whisper server is running
+    audio = load_audio(audio_file)
+    chunks = plan_chunks(len(audio), find_cut_points(audio, STREAM_CHUNK_SECONDS))
+    options = dict(options, verbose=None)
+    previous = None
+    text = ""
+    for chunk in chunks:
+        # Carry the previous text over as the prompt, as a whole-file transcription would
+        prompt = text[-PROMPT_CONTEXT_CHARS:] or None
+        result = run_whisper(audio[chunk[0]:chunk[1]], initial_prompt=prompt, **options)
+        for segment in stitch_chunk(chunk, result["segments"], previous):
+            previous = segment
+            text += segment["text"]
+            yield segment
+
+
+def split_sentences(texts, tokenizer):
+    """
+    Incremental Punkt sentence splitting: takes an iterable of text pieces and
+    yields each sentence once the text after it shows it is complete.
+    """
+    buffer = ""
+    for text in texts:
+        buffer += text
+        spans = list(tokenizer.span_tokenize(buffer))
+        # The last sentence may still be continued by the next piece
+        for start, end in spans[:-1]:
+            yield buffer[start:end]
+        if len(spans) > 1:
+            buffer = buffer[spans[-1][0]:]
+    for sentence in tokenizer.tokenize(buffer):
+        yield sentence
+
+
+def transcription_workers() -> int:
+    """Worker processes for a transcription ("transcription.workers" in config.json, default 1)."""
+    return load_config().get("transcription", {}).get("workers", 1)
+
+
+def load_sentence_tokenizer():
     logger.info("Loading NLP libraries...")
     import nltk
     from nltk.tokenize.punkt import PunktSentenceTokenizer
@@ -35,60 +111,195 @@ def transcribe_video(url: str) -> str:
     redirect_nested_logs(nltk.download, 'punkt', download_dir=nltk_data_dir, quiet=True)
     tokenizer = PunktSentenceTokenizer()
     logger.info("Tokenizer loaded successfully!")
-    
-    # ----------------------
-    # Load Whisper Model - Lazy import
-    # ----------------------
-    logger.info("Loading speech recognition model...")
-    import whisper
-    
-    model = redirect_nested_logs(whisper.load_model, "base", "cpu", download_root="./models")
+    return tokenizer
+
+
+def video_id_for(url: str) -> str:
+    from ultra.stage_cache import fingerprint
+    return video_id_from_url(url) or f"url-{fingerprint(url)}"
+
+
+def _raw_key(cache, video_id: str, workers: int) -> str:
+    # A video's content never changes, so the transcript depends only on how it was transcribed
+    return cache.key("raw", video_id, model=WHISPER_MODEL, device=WHISPER_DEVICE,
+                     mode="parallel" if workers > 1 else "stream")
+
+
+def _sentences_key(cache, video_id: str, raw: str) -> str:
+    from ultra.stage_cache import fingerprint
+    return cache.key("sentences", video_id, raw=fingerprint(raw), tokenizer="punkt")
+
+
+def cached_sentences(cache, video_id: str, workers: int = 1):
+    """
+    Returns the sentence-split transcript from the stage cache (splitting a
+    cached raw transcript if needed), or None if the video must be transcribed.
+    """
+    raw = cache.get_text(_raw_key(cache, video_id, workers))
+    if raw is None:
+        return None
+    sentences_key = _sentences_key(cache, video_id, raw)
+    sentences = cache.get_text(sentences_key)
+    if sentences is not None:
+        logger.info(f"Using cached transcript for {video_id}")
+        return sentences
+
+    logger.info(f"Using cached raw transcript for {video_id}")
+    sentences = "\n".join(split_sentences([raw], load_sentence_tokenizer()))
+    cache.put_text(sentences_key, sentences)
+    return sentences
+
+
+def fetch_audio(url: str, video_id: str, cache, fetch=None) -> str:
+    """Returns the path of the video's audio, downloading it unless it is cached."""
+    from ultra.fetch import VideoFetch
+    audio_key = cache.key("audio", video_id)
+    audio_file = cache.get(audio_key)
+    if audio_file is None:
+        audio_file = cache.put(audio_key, (fetch or VideoFetch(url)).audio_path())
+    return audio_file
 
+
+def transcribe_audio(audio_file: str, video_id: str, cache, workers: int = 1, on_text=None) -> str:
+    """
+    Transcribes audio_file, streaming segments to transcript/<id>-raw.txt and
+    sentences to on_text as they are decoded. Returns the sentence-split text
+    and stores both in the stage cache.
+    """
+    # Create transcript directory if it doesn't exist
+    if not os.path.exists("transcript"):
+        os.makedirs("transcript")
+        logger.info("Created directory: transcript")
+
+    tokenizer = load_sentence_tokenizer()
+    
     # ----------------------
-    # Transcribe Audio
+    # Transcribe Audio (on the Whisper server if it is running)
     # ----------------------
-    audio_file = f"audio/{title}.mp3"
-    
     logger.info(f"Transcribing audio file: {audio_file}...")
-    transcription = redirect_nested_logs(model.transcribe, audio_file, fp16=False, verbose=False)
-    
+
     # ----------------------
-    # Process Transcription
+    # Stream segments -> raw text -> sentences, writing each as it arrives
     # ----------------------
-    logger.info("Formatting transcription...")
-    
-    with open(f"transcript/{title}-raw.txt", "w") as file:
-        file.write(transcription["text"].strip())
-    
-    with open(f"transcript/{title}-raw.txt", "r") as input_file:
-        text = input_file.read()
-    
-    sentences = tokenizer.tokenize(text)
-    output_text = "\n".join(sentences)
-    
-    with open(f"transcript/{title}-sentences.txt", "w") as output_file:
-        output_file.write(output_text)
-    
-    # Lazy import PDF module
-    logger.info("Converting to PDF...")
-    from ultra.pdf import text_to_pdf
-    text_to_pdf(title)
-    
-    # Lazy import OpenAI provider
-    logger.info("Formatting with AI...")
-    from ultra.providers import OpenAIProvider
-    chatgpt = OpenAIProvider(get_api_key("openai"))
-    formatted_text = chatgpt.format_transcription(f"transcript/{title}-final.pdf")
+    with open(f"transcript/{video_id}-raw.txt", "w") as raw_file, \
+            open(f"transcript/{video_id}-sentences.txt", "w") as sentences_file:
+        def raw_text():
+            for segment in stream_segments(audio_file, workers, fp16=False):
+                # The first segment's leading space is dropped, as strip() did before
+                text = segment["text"] if raw_file.tell() else segment["text"].lstrip()
+                raw_file.write(text)
+                raw_file.flush()
+                yield text
+
+        for index, sentence in enumerate(split_sentences(raw_text(), tokenizer)):
+            sentences_file.write(("\n" if index else "") + sentence)
+            sentences_file.flush()
+            if on_text is not None:
+                on_text(sentence)
+
+    raw_path = cache.put(_raw_key(cache, video_id, workers), f"transcript/{video_id}-raw.txt", move=True)
+    with open(raw_path, "r") as raw_file:
+        raw = raw_file.read()
+    sentences_path = cache.put(_sentences_key(cache, video_id, raw), f"transcript/{video_id}-sentences.txt",
+                               move=True)
+    with open(sentences_path, "r") as sentences_file:
+        return sentences_file.read()
+
+
+def format_input_default() -> str:
+    """How transcripts reach the LLM ("transcription.format_input" in config.json): "text" or "pdf"."""
+    return load_config().get("transcription", {}).get("format_input", "text")
+
+
+def format_sentences(video_id: str, sentences: str, cache, provider=None, format_input: str = None) -> str:
+    """
+    Formats the transcript with the LLM (unless cached) and writes
+    transcript/<id>-final.txt. Returns the formatted text.
+
+    format_input "text" sends the sentences inline as message content, in
+    chunks formatted concurrently (see transcript_format.py); "pdf" renders
+    them to a PDF and uploads it in one request, as earlier versions did.
+    """
+    from ultra.stage_cache import fingerprint
+    from ultra.text_templates import TRANSCRIBE_SPEAKERS_V3
+
+    if provider is None:
+        from ultra.provider_registry import create_provider
+        provider = create_provider(get_default_provider())
+    if format_input is None:
+        format_input = format_input_default()
+    if format_input not in ("text", "pdf"):
+        raise ValueError(f"Unknown transcription format_input: {format_input}")
+    params = {"input": format_input}
+    if format_input == "text":
+        from ultra.transcript_format import format_settings, format_transcript
+        settings = format_settings()
+        # How the transcript is chunked changes the output; concurrency and retries don't
+        params["chunking"] = fingerprint(settings["chunk_tokens"], settings["overlap_sentences"])
+    formatted_key = cache.key("formatted", video_id, sentences=fingerprint(sentences),
+                              prompt=fingerprint(TRANSCRIBE_SPEAKERS_V3), model=provider.get_cheapest_model(),
+                              **params)
+    formatted_text = cache.get_text(formatted_key)
+    os.makedirs("transcript", exist_ok=True)
+
+    if formatted_text is None:
+        logger.info("Formatting transcription...")
+        if format_input == "text":
+            logger.info("Formatting with AI...")
+            formatted_text = format_transcript(provider, sentences, **settings)
+        else:
+            with open(f"transcript/{video_id}-sentences.txt", "w") as sentences_file:
+                sentences_file.write(sentences)
+
+            # Lazy import PDF module
+            logger.info("Converting to PDF...")
+            from ultra.pdf import text_to_pdf
+            text_to_pdf(video_id)
+
+            logger.info("Formatting with AI...")
+            try:
+                formatted_text = provider.format_transcription(f"transcript/{video_id}-final.pdf")
+            finally:
+                os.remove(f"transcript/{video_id}-sentences.txt")
+                os.remove(f"transcript/{video_id}-final.pdf")
+        cache.put_text(formatted_key, formatted_text)
+    else:
+        logger.info(f"Using cached formatted transcript for {video_id}")
     
-    with open(f"transcript/{title}-final.txt", "w") as output_file:
+    with open(f"transcript/{video_id}-final.txt", "w") as output_file:
         output_file.write(formatted_text)
     
-    os.remove(f"transcript/{title}-raw.txt")
-    os.remove(f"transcript/{title}-sentences.txt")
-    os.remove(f"transcript/{title}-final.pdf")
-    
-    logger.info(f"Transcription complete! Saved to transcript/{title}-final.txt")
-    
+    logger.info(f"Transcription complete! Saved to transcript/{video_id}-final.txt")
+    return formatted_text
+
+
+def transcribe_video(url: str, workers: int = None, on_text=None, fetch=None) -> str:
+    """
+    Downloads, transcribes and formats a video. With workers > 1 the audio is
+    split into chunks transcribed in parallel processes.
+
+    Transcript text is written to transcript/<id>-raw.txt as it is decoded,
+    and each completed sentence is passed to on_text(sentence) if given.
+
+    Every stage's output is kept in the stage cache, so running it again for
+    the same video skips the stages whose inputs have not changed.
+
+    fetch is an ultra.fetch.VideoFetch to share with the metadata stage, so
+    yt-dlp runs once for both.
+    """
+    from ultra.stage_cache import StageCache
+
+    if workers is None:
+        workers = transcription_workers()
+    cache = StageCache()
+    video_id = video_id_for(url)
+
+    sentences = cached_sentences(cache, video_id, workers)
+    if sentences is None:
+        audio_file = fetch_audio(url, video_id, cache, fetch)
+        sentences = transcribe_audio(audio_file, video_id, cache, workers, on_text)
+
+    format_sentences(video_id, sentences, cache)
     return url
     
     '''
@@ -102,8 +313,14 @@ def transcribe_video(url: str) -> str:
     '''
     
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python transcribe.py <youtube_url>")
-        sys.exit(1)
-    url = sys.argv[1]
-    transcribe_video(url)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Transcribe a YouTube video")
+    parser.add_argument("url", help="YouTube video URL")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Transcribe chunks of the audio in this many processes")
+    parser.add_argument("--no-video", action="store_true", help="Download only the audio")
+    args = parser.parse_args()
+    from ultra.fetch import VideoFetch
+    fetch = VideoFetch(args.url, download_video=False) if args.no_video else None
+    transcribe_video(args.url, workers=args.workers, on_text=lambda sentence: print(sentence, flush=True),
+                     fetch=fetch)
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Map-reduce formatting of long transcripts.
+
+A whole transcript in one request runs into the model's output limit and
+waits on one long serial generation. Instead the sentences are split into
+chunks sized to the model, each chunk is formatted in its own request (up to
+`concurrency` at once; failed requests are retried by the provider), and the
+results are joined in order.
+
+Each chunk request also carries the last few sentences of the chunk before
+it as context that is not to be formatted, so the model can tell whether the
+same person is still speaking. When a chunk still opens with the label the
+previous chunk ended on, the repeated label is dropped while merging.
+"""
+import re
+import asyncio
+import logging
+from ultra.config import load_config
+from ultra.tokens import context_window_for_model, encoding_name_for_model, count_text_tokens
+
+logger = logging.getLogger(__name__)
+
+# Overridable in the "transcript_format" section of config.json
+DEFAULT_CHUNK_TOKENS = 3000      # transcript tokens per request; the reply is about as long
+DEFAULT_OVERLAP_SENTENCES = 3    # sentences of the previous chunk sent as context
+DEFAULT_CONCURRENCY = 4          # chunk requests in flight at once
+
+# Settings from before retries moved into the provider; ignored if still configured
+RETIRED_SETTINGS = ("max_retries", "backoff_seconds")
+
+# Room left in the context window for the prompt and the reply
+PROMPT_RESERVE_TOKENS = 2000
+
+# "Speaker 1: ..." / "John Smith: ..." at the start of a line
+SPEAKER_LABEL = re.compile(r"^([A-Z][\w.'\- ]{0,40}):\s*", re.MULTILINE)
+
+
+def format_settings() -> dict:
+    settings = {
+        "chunk_tokens": DEFAULT_CHUNK_TOKENS,
+        "overlap_sentences": DEFAULT_OVERLAP_SENTENCES,
+        "concurrency": DEFAULT_CONCURRENCY,
+    }
+    settings.update(load_config().get("transcript_format", {}))
+    for name in RETIRED_SETTINGS:
+        if settings.pop(name, None) is not None:
+            logger.warning(f"transcript_format.{name} is no longer used; "
+                           f"set {name} in the provider's section of config.json instead")
+    return settings
+
+
+def chunk_token_limit(model_name: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> int:
+    # The formatted reply is about as long as its input, so both must fit in the window
+    window = context_window_for_model(model_name)
+    return max(1, min(chunk_tokens, (window - PROMPT_RESERVE_TOKENS) // 2))
+
+
+def plan_chunks(token_counts: list, max_tokens: int, overlap: int) -> list:
+    """
+    Groups consecutive sentences into chunks of at most max_tokens (a longer
+    sentence gets a chunk of its own). Returns (context_start, start, end)
+    sentence indexes: a chunk formats [start, end) and is shown
+    [context_start, start) as context.
+    """
+    chunks = []
+    start = 0
+    while start < len(token_counts):
+        end, size = start, 0
+        while end < len(token_counts) and (end == start or size + token_counts[end] <= max_tokens):
+            size += token_counts[end]
+            end += 1
+        chunks.append((max(0, start - overlap), start, end))
+        start = end
+    return chunks
+
+
+def merge_chunks(outputs: list) -> str:
+    """Joins formatted chunks in order, dropping a speaker label that only repeats the previous one."""
+    merged = []
+    last_label = None
+    for text in outputs:
+        text = text.strip()
+        if not text:
+            continue
+        match = SPEAKER_LABEL.match(text)
+        if merged and match and match.group(1) == last_label:
+            text = text[match.end():]
+        merged.append(text)
+        labels = SPEAKER_LABEL.findall(text)
+        if labels:
+            last_label = labels[-1]
+    return "\n".join(merged)
+
+
+async def _format_chunk(provider, index: int, text: str, context: str, semaphore: asyncio.Semaphore) -> str:
+    # Retries and backoff happen in the provider (see ultra/resilience.py)
+    async with semaphore:
+        try:
+            return await provider.aformat_transcript_text(text, context)
+        except Exception as e:
+            logger.warning(f"Formatting chunk {index} failed: {type(e).__name__}: {e}")
+            raise
+
+
+async def aformat_transcript(provider, sentences: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                             overlap_sentences: int = DEFAULT_OVERLAP_SENTENCES,
+                             concurrency: int = DEFAULT_CONCURRENCY) -> str:
+    """Formats newline-separated sentences chunk by chunk and returns the merged text."""
+    model_name = provider.get_cheapest_model()
+    lines = [line for line in sentences.splitlines() if line.strip()]
+    encoding_name = encoding_name_for_model(model_name)
+    token_counts = [count_text_tokens(line, encoding_name) + 1 for line in lines]
+    chunks = plan_chunks(token_counts, chunk_token_limit(model_name, chunk_tokens), overlap_sentences)
+    logger.info(f"Formatting {len(lines)} sentences in {len(chunks)} chunks, {concurrency} at a time")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        _format_chunk(provider, index, "\n".join(lines[start:end]),
+                      "\n".join(lines[context_start:start]) or None,
+                      semaphore)
+        for index, (context_start, start, end) in enumerate(chunks)
+    ]
+    try:
+        outputs = await asyncio.gather(*tasks)
+    finally:
+        await provider.aclose()
+    return merge_chunks(outputs)
+
+
+def format_transcript(provider, sentences: str, **settings) -> str:
+    """Synchronous wrapper around aformat_transcript; settings default to format_settings()."""
+    settings = {**format_settings(), **settings}
+    return asyncio.run(aformat_transcript(provider, sentences, **settings))
@@ -1,6 +1,4 @@
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.live import Live
 import os
 import glob
 import logging
@@ -40,20 +38,18 @@ def rich_streaming_markdown(provider, model_name, messages) -> str:
     """
     Streams markdown content token by token and updates a live Markdown display.
     """
-    full_response = ""
-    # Live display will continuously update the rendered markdown.
-    with Live(Markdown(""), refresh_per_second=20) as live:
+    from ultra.markdown_stream import StreamingMarkdown
+
+    with StreamingMarkdown(console) as stream:
         for token in provider.stream_completion(model_name, messages):
-            chunk = "".join(token)
-            full_response += chunk
-            # Restrict how much text you feed to live.update
-            display_text = "\n".join(full_response.splitlines()[-100:])
-            live.update(Markdown(display_text))
-    return full_response
+            stream.feed(token)
+    return stream.text
 
 def print_markdown(md_text: str):
     """
     Print multi-line text as markdown (code highlighting, etc.) using Rich.
     """
+    # rich.markdown pulls in the markdown parser and pygments; keep it off the startup path
+    from rich.markdown import Markdown
     markdown_obj = Markdown(md_text)
     console.print(markdown_obj)
\ No newline at end of file
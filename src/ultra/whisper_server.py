@@ -0,0 +1,312 @@
+"""
+Long-lived Whisper worker that keeps models loaded between transcriptions.
+
+Start it once and every /transcribe (or python -m ultra.transcribe) in any
+process uses it instead of loading a model itself:
+
+    ultra whisper-server            # or: python -m ultra.whisper_server
+    ultra whisper-server --status
+    ultra whisper-server --stop
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import logging
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from ultra.config import CONFIG_DIR, ensure_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+WHISPER_SOCKET = os.path.join(CONFIG_DIR, "whisper.sock")
+
+# Model cache limits (overridable in the "whisper_server" section of config.json)
+DEFAULT_MAX_MODELS = 2          # models kept loaded at once
+DEFAULT_MAX_MEMORY_MB = None    # cap on the parameter memory of loaded models
+DEFAULT_IDLE_TIMEOUT = 30 * 60  # seconds a model may sit unused before it is unloaded
+
+
+class WhisperServer:
+    """
+    Serves transcription requests over a Unix socket, loading each
+    (model, device, download_root) once and keeping it warm.
+
+    Loaded models are kept in LRU order. The least recently used one is
+    unloaded when there are more than max_models, when their combined size
+    exceeds max_memory_mb, or when it has been idle for idle_timeout seconds.
+
+    Requests are pickled, so only clients holding the server's authkey may
+    connect. A fresh key is written next to the socket (see authkey_path) each
+    time the server starts, readable only by the owner.
+    """
+
+    def __init__(self, address: str = WHISPER_SOCKET, max_models: int = DEFAULT_MAX_MODELS,
+                 max_memory_mb: float = DEFAULT_MAX_MEMORY_MB, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.address = address
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+        self.idle_timeout = idle_timeout
+        self.models = OrderedDict()  # key -> {"model", "lock", "size_mb", "last_used"}
+        self._loading = {}  # key -> lock held while that model loads, outside self._lock
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.listener = None
+
+    @classmethod
+    def from_config(cls, address: str = WHISPER_SOCKET) -> "WhisperServer":
+        return cls(address, **load_config().get("whisper_server", {}))
+
+    def serve_forever(self):
+        ensure_config_dir()
+        if os.path.exists(self.address):
+            if server_running(self.address):
+                raise RuntimeError(f"A Whisper server is already running on {self.address}")
+            os.remove(self.address)  # Left behind by a server that crashed
+
+        authkey = os.urandom(32)
+        _write_authkey(authkey_path(self.address), authkey)
+        # Bind under a restrictive umask so the socket is never reachable by others, not even briefly
+        umask = os.umask(0o177)
+        try:
+            self.listener = Listener(self.address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(umask)
+        threading.Thread(target=self._evict_idle_loop, daemon=True).start()
+        logger.info(f"Whisper server listening on {self.address}")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    break  # Listener closed by a shutdown request
+                except (AuthenticationError, EOFError) as e:
+                    logger.warning(f"Rejected a Whisper server connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+            except (OSError, EOFError):
+                return
+            try:
+                conn.send({"ok": True, "result": self._dispatch(request)})
+            except Exception as e:
+                logger.exception("Whisper server request failed")
+                try:
+                    conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+                except OSError:
+                    pass
+
+    def _dispatch(self, request: dict):
+        op = request.get("op")
+        if op == "transcribe":
+            return self.transcribe(request["audio"], request.get("model", "base"),
+                                   request.get("device", "cpu"), request.get("download_root"),
+                                   **request.get("options", {}))
+        if op == "status":
+            with self._lock:
+                return {"pid": os.getpid(),
+                        "models": [{"model": key[0], "device": key[1], "size_mb": round(entry["size_mb"], 1),
+                                    "idle_seconds": round(time.time() - entry["last_used"])}
+                                   for key, entry in self.models.items()]}
+        if op == "shutdown":
+            self._stopping.set()
+            self.listener.close()
+            return None
+        raise ValueError(f"Unknown request: {op}")
+
+    def transcribe(self, audio, model_name: str = "base", device: str = "cpu",
+                   download_root: str = None, **options) -> dict:
+        entry = self._get_model(model_name, device, download_root)
+        # A model is not safe to run from two threads at once
+        with entry["lock"]:
+            result = entry["model"].transcribe(audio, **options)
+        entry["last_used"] = time.time()
+        return result
+
+    def _get_model(self, model_name: str, device: str, download_root: str) -> dict:
+        key = (model_name, device, download_root)
+        with self._lock:
+            entry = self.models.get(key)
+            if entry is None:
+                loading = self._loading.setdefault(key, threading.Lock())
+        if entry is None:
+            # Loading can take minutes; only requests for this same model wait for it
+            with loading:
+                with self._lock:
+                    entry = self.models.get(key)
+                if entry is None:
+                    try:
+                        import whisper
+                        logger.info(f"Loading Whisper model {model_name} on {device}")
+                        model = whisper.load_model(model_name, device, download_root=download_root)
+                        entry = {"model": model, "lock": threading.Lock(), "size_mb": _model_size_mb(model),
+                                 "last_used": time.time()}
+                        with self._lock:
+                            # In self.models before the key leaves _loading, so no request loads it again
+                            self.models[key] = entry
+                    finally:
+                        with self._lock:
+                            self._loading.pop(key, None)
+        with self._lock:
+            # Put back if another request's eviction dropped it meanwhile
+            self.models[key] = entry
+            self.models.move_to_end(key)
+            entry["last_used"] = time.time()
+            self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep=None):
+        # Caller holds self._lock
+        def over_limit():
+            if len(self.models) > self.max_models:
+                return True
+            if self.max_memory_mb is not None:
+                return sum(entry["size_mb"] for entry in self.models.values()) > self.max_memory_mb
+            return False
+
+        for key in list(self.models):
+            if not over_limit():
+                break
+            if key != keep and not self.models[key]["lock"].locked():
+                self._unload(key)
+
+    def _evict_idle_loop(self):
+        while not self._stopping.wait(min(60, self.idle_timeout)):
+            with self._lock:
+                now = time.time()
+                for key, entry in list(self.models.items()):
+                    if now - entry["last_used"] > self.idle_timeout and not entry["lock"].locked():
+                        self._unload(key)
+
+    def _unload(self, key):
+        logger.info(f"Unloading Whisper model {key[0]} on {key[1]}")
+        del self.models[key]
+        import gc
+        gc.collect()
+        if key[1].startswith("cuda"):
+            import torch
+            torch.cuda.empty_cache()
+
+    def close(self):
+        self._stopping.set()
+        try:
+            if self.listener is not None:
+                self.listener.close()
+        except OSError:
+            pass
+        for path in (self.address, authkey_path(self.address)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def authkey_path(address: str = WHISPER_SOCKET) -> str:
+    """The file holding the authkey of the server listening on address."""
+    return address + ".key"
+
+
+def _write_authkey(path: str, authkey: bytes):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        os.fchmod(f.fileno(), 0o600)  # In case the file was left behind with wider permissions
+        f.write(authkey)
+
+
+def _read_authkey(path: str):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _model_size_mb(model) -> float:
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024)
+
+
+def server_running(address: str = WHISPER_SOCKET) -> bool:
+    return request_server({"op": "status"}, address) is not None
+
+
+def request_server(request: dict, address: str = WHISPER_SOCKET):
+    """
+    Sends one request to the Whisper server and returns its result, or None if
+    no server is running. Errors raised by the server are re-raised here.
+    """
+    authkey = _read_authkey(authkey_path(address))
+    if not os.path.exists(address) or authkey is None:
+        return None
+    try:
+        conn = Client(address, family="AF_UNIX", authkey=authkey)
+    except (OSError, EOFError):
+        return None
+    except AuthenticationError:
+        logger.warning(f"The Whisper server on {address} rejected the key in {authkey_path(address)}")
+        return None
+    with conn:
+        conn.send(request)
+        response = conn.recv()
+    if not response["ok"]:
+        raise RuntimeError(f"Whisper server: {response['error']}")
+    return response["result"]
+
+
+def transcribe_with_server(audio, model_name: str = "base", device: str = "cpu",
+                           download_root: str = None, address: str = WHISPER_SOCKET, **options):
+    """
+    Transcribes audio (a file path or 16 kHz samples) on the running Whisper
+    server. Returns None if there is no server, so the caller can load the
+    model itself.
+    """
+    return request_server({
+        "op": "transcribe",
+        # The server has its own working directory
+        "audio": os.path.abspath(audio) if isinstance(audio, str) else audio,
+        "model": model_name,
+        "device": device,
+        "download_root": os.path.abspath(download_root) if download_root else None,
+        "options": options,
+    }, address)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep Whisper models loaded for ultra transcriptions")
+    parser.add_argument("--status", action="store_true", help="Show the running server's loaded models")
+    parser.add_argument("--stop", action="store_true", help="Stop the running server")
+    parser.add_argument("--address", default=WHISPER_SOCKET, help="Unix socket path")
+    args = parser.parse_args(argv)
+
+    if args.status or args.stop:
+        status = request_server({"op": "status"}, args.address)
+        if status is None:
+            print("Whisper server is not running")
+        elif args.stop:
+            request_server({"op": "shutdown"}, args.address)
+            print(f"Whisper server stopped (pid {status['pid']})")
+        else:
+            print(f"Whisper server running (pid {status['pid']})")
+            for model in status["models"]:
+                print(f"  {model['model']} on {model['device']}: {model['size_mb']} MB, "
+                      f"idle {model['idle_seconds']}s")
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(message)s")
+    server = WhisperServer.from_config(args.address)
+    print(f"Whisper server listening on {args.address} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())